@@ -1,349 +1,1344 @@
-import csv
-import os
-from collections import defaultdict
-from typing import List, Dict, Iterable, Optional, Set, Union, DefaultDict
-
-import openpyxl as xl
-
-from form_data import Person, Registration
-from datetime import datetime
-
-
-def _normalise(field: str) -> str:
-    return field.lower().strip()
-
-
-def read_registrations(file_path: str) -> List[Registration]:
-    with open(file_path, encoding="utf-8") as registration_file:
-        next(reader := csv.reader(registration_file))  # assign reader and skip headers
-        return [
-            Registration(
-                _normalise(name),
-                _normalise(mail),
-                datetime.strptime(timestamp, '%d/%m/%Y %H:%M:%S'),
-                [timeslot.replace(' ', '') for timeslot in timeslots.split(',')])
-            for timestamp, mail, name, timeslots, *_ in reader
-        ]
-
-
-def read_people_table(file_path: str, name_column: int, email_column: int, allow_failure: bool = True) -> List[Person]:
-    try:
-        with open(file_path, encoding="utf-8") as person_table_file:
-            next(table_reader := csv.reader(person_table_file))  # skip headers and assign to table_reader
-            return [Person(_normalise(row[name_column]), _normalise(row[email_column])) for row in table_reader]
-    except FileNotFoundError as file_not_found_error:
-        if allow_failure:
-            return []
-        raise file_not_found_error
-
-
-class Timeslot:
-    spots: List[Person]
-    disallowed: Set[Person]  # The people who are not allowed to attend this timeslot
-
-    def __init__(self, disallowed: Optional[Set[Person]] = None):
-        self.spots = []
-        self.disallowed = disallowed or set()
-
-    @property
-    def spots_taken(self):
-        return len(self.spots)
-
-    def __str__(self):
-        content = ', '.join(f"{k}: {str(v)}" for k, v in self.__dict__.items())
-        return f"Timeslot({content})"
-
-    def __repr__(self):
-        content = ', '.join(f"{k}: {str(v)}" for k, v in self.__dict__.items())
-        return f"Timeslot({content})"
-
-    def admit(self, person: Person) -> bool:
-        if person in self.disallowed:
-            return False
-        self.spots.append(person)
-        return True
-
-    def remove(self, person: Person) -> bool:
-        try:
-            self.spots.remove(person)
-            return True
-        except ValueError:
-            return False
-
-
-class LimitedTimeslot(Timeslot):
-    capacity: int
-
-    def __init__(self, capacity: int):
-        super().__init__()
-        self.capacity = capacity
-
-    @property
-    def spots_available(self):
-        return self.capacity - self.spots_taken
-
-    def admit(self, person: Person) -> bool:
-        if person in self.disallowed:
-            return False
-        if self.spots_available > 0:
-            self.spots.append(person)
-            return True
-        return False
-
-
-class OpeningAdmittance:
-    timeslots: Dict[str, Timeslot]
-    processed: Dict[Person, Registration]
-    cancelled: Set[Person]
-    banned: Set[Person]
-    marked: DefaultDict[Person, List[str]]
-    confirmed_duplicates: Set[Person]
-
-    def __init__(self, timeslots: Optional[Dict[str, Timeslot]] = None):
-        self.timeslots = timeslots if timeslots else {}
-        self.waiting_list = []
-        self.cancelled = set()
-        self.banned = set()
-        self.marked = defaultdict(list)
-        self.confirmed_duplicates = set()
-
-    def clear(self):
-        for timeslot in self.timeslots.values():
-            timeslot.spots.clear()
-        self.processed.clear()
-        self.cancelled.clear()
-        self.banned.clear()
-        self.marked.clear()
-
-    def _preprocess_and_mark(self, registrations: Iterable[Registration]):
-        """
-        Look through all regisstrations beforehand to mark individuals for manual checking if needed
-        and overwrite duplicate registrations by the latest entry from said person if the latest entry makes changes
-        to their preferences in timeslot
-        :param registrations: All entries from the registration form
-        :return: registrations without duplicate entries (NOTE: suspected duplicates are only marked for manual check
-                 and will remain as separate registrations)
-        """
-        bad_email_endings = [".con", "@ntnu.no"]
-
-        proccessed_for_admission = {}
-        for registration in registrations:
-
-            # Evaluate if peron is banned
-            if registration.person in self.banned:
-                self.marked[registration.person].append("Banned from attending, see ban list!")
-                continue
-            else:
-                confirmed_duplicate = False
-                for banned_person in self.banned:
-                    if banned_person.similar(registration.person):
-                        if confirmed_duplicate := registration.person in self.confirmed_duplicates:
-                            self.marked[registration.person].append(f"Confirmed ban, see ban list for {banned_person}!")
-                            self.banned.add(registration.person)
-                            break
-                        else:
-                            self.marked[registration.person].append(f"Suspected ban: {registration.person} might be!, "
-                                                                    f"{banned_person} from banlist!")
-                            break
-                if confirmed_duplicate:
-                    continue  # skip this person, go on to the next!
-
-            # Evaluate if person has a bad email ending
-
-            for ending in bad_email_endings:
-                if registration.person.email.endswith(ending):
-                    self.marked[registration.person].append(f"Likely a non-working email! It ends with '{ending}'.")
-
-            # Evaluate if person has not been given a timeslot because of attending previous "premium" timeslots in
-            # earlier opening
-
-            if all(registration.person in timeslot.disallowed for timeslot in self.timeslots.values()):
-                self.marked[registration.person].append(
-                    "Down prioritised from attending the timeslot(s) they signed up for, "
-                    "attended previous opening in the early slot(s)!"
-                )
-                continue  # go on to the next person!
-
-            for timeslot_name, timeslot in self.timeslots.items():
-                if timeslot_name not in registration.timeslots:  # we only care if they signed this timeslot
-                    continue
-                if registration.person in timeslot.disallowed:
-                    self.marked[registration.person].append(
-                        f"Down prioritised from attending {timeslot_name} because they "
-                        f"attended previous opening in the early slot(s)!"
-                    )
-                    break
-                else:
-                    # confirmed_duplicate = False
-                    for downprioritised_person in timeslot.disallowed:
-                        if downprioritised_person.similar(registration.person):
-                            if confirmed_duplicate := registration.person in self.confirmed_duplicates:
-                                self.marked[registration.person].append(
-                                    f"Down prioritised from attending {timeslot_name} because they "
-                                    "attended previous opening in the early slot(s)!. confirmed suspected duplicate"
-                                    f" of: {downprioritised_person} from downprioritised list!"
-                                )
-                                timeslot.disallowed.add(registration.person)
-                                break
-                            else:
-                                self.marked[registration.person].append(
-                                    f"Subject to being down prioritised from {timeslot_name}, "
-                                    f"suspecting {registration.person} might be the"
-                                    f"same as {downprioritised_person} from the down prioritised list!"
-                                )
-                                break
-                    # if confirmed_duplicate:
-                    #     continue  # skip this person, go on to the next!
-
-            # Evaluate if person is already in the system
-            if (person := registration.person) in proccessed_for_admission.keys():
-                # only overwrite entry if change in timeslots
-                if set(registration.timeslots) != set(proccessed_for_admission[person].timeslots):
-                    # NOTE: changing your timeslots has its drawback - you're now later in the queue
-                    reason = f"Duplicate Entry for {person}:\noverwriting {proccessed_for_admission[person]}...\n" \
-                             f"timestamp changed from {proccessed_for_admission[person].timestamp} to {registration.timestamp}\n" \
-                             f"changed timeslots from {proccessed_for_admission[person].timeslots} to {registration.timeslots}"
-                    self.marked[person].append(reason)
-                else:
-                    # if no substantial change is made, don't reprocess the person. They did as intended the first
-                    # time around and should not be punished for trying to make sure they registered.
-                    continue
-            else:
-                for already_processed_person, already_processed_registration in proccessed_for_admission.copy().items():
-                    if registration.person.similar(already_processed_person):
-                        if confirmed_duplicate := registration.person in self.confirmed_duplicates:
-                            # only overwrite entry if change in timeslots
-                            self.marked[already_processed_person].append(
-                                f"Confirmed suspected duplicate! {registration.person} is the same as {already_processed_person}!"
-                                f"\nOverwriting {already_processed_registration} with {registration}...\n"
-                            )
-                            del proccessed_for_admission[already_processed_person]
-                        else:
-                            self.marked[already_processed_person].append(f"Suspected duplicate of {registration}")
-                            self.marked[registration.person].append(
-                                f"Suspected duplicate of {already_processed_registration}")
-                            break
-
-            proccessed_for_admission[person] = registration
-        return proccessed_for_admission
-
-    def auto_admit(self, registrations: Iterable[Registration]):
-        self.processed = self._preprocess_and_mark(registrations)
-        for registration in self.processed.values():
-            if not any(self.timeslots[wanted_slot].admit(registration) for wanted_slot in registration.timeslots if
-                       wanted_slot in self.timeslots):
-                self.waiting_list.append(registration)
-
-    # def cancel(self, cancelled: Union[Iterable[Person], Person]):
-    #     if isinstance(cancelled, Person):
-    #         cancelled = (cancelled,)  # make iterable
-    #     for person in cancelled:
-    #         removed = False
-    #         for timeslot in self.timeslots.values():
-    #             for other in timeslot.spots.copy():
-    #                 if person == other:
-    #                     removed = timeslot.remove(person)
-    #                     self.cancelled.add(person)
-    #                 elif person.similar(other):
-    #                     self.marked[other] = f"{self.marked.get(other, '')} Might have cancelled! " \
-    #                                           f"{person} cancelled, and {other} might be the same person."
-    #         if not removed:
-    #             warnings.warn(f"Unable to cancel for {person}! They were not found in timeslots!")
-    #         # TODO: also look in waiting lists, they should be removed from it too!
-    #
-    # def ban(self, banned: Union[Iterable[Person], Person]):
-    #     if isinstance(banned, Person):
-    #         banned = (banned,)  # make iterable
-    #     for person in banned:
-    #         removed = False
-    #         for timeslot in self.timeslots.values():
-    #             for other in timeslot.spots.copy():
-    #                 if person == other:
-    #                     removed = timeslot.remove(person)
-    #                     self.banned.add(person)
-    #                 else:
-    #                     if person.similar(other):
-    #                         self.marked[other] = f"{self.marked.get(other, '')} Might have been banned! " \
-    #                                               f"{person} is banned, and {other} might be the same person."
-    #         if not removed:
-    #             warnings.warn(f"Unable to ban {person}! They were not found in timeslots!")
-    #         # TODO: also look in waiting lists, they should be banned from it too!
-
-    def write_to_spreadsheets(self, destination: str):
-        workbook = xl.Workbook()
-        for i, (timeslot_name, timeslot) in enumerate(self.timeslots.items()):
-            timeslot_name = timeslot_name.replace(':', '_')
-            sheet = workbook.create_sheet(timeslot_name, i)
-            sheet.append(["Timestamp", "Name", "Email", "Wanted Timeslots", "Remarks"])
-            for j, registration in enumerate(self.processed[person] for person in timeslot.spots):
-                sheet.append([
-                    registration.timestamp,
-                    registration.person.name,
-                    registration.person.email,
-                    ", ".join(registration.timeslots),
-                    '\n'.join(self.marked.get(registration.person, []))
-                ])
-
-        waiting_list_sheet = workbook.create_sheet("Waiting List", len(self.timeslots))
-        waiting_list_sheet.append(["Timestamp", "Name", "Email", "Wanted Timeslots", "Remarks"])
-        for j, registration in enumerate(self.waiting_list):
-            waiting_list_sheet.append([
-                registration.timestamp,
-                registration.person.name,
-                registration.person.email,
-                ", ".join(registration.timeslots),
-                '\n'.join(self.marked.get(registration.person, []))
-            ])
-        cancelled_list_sheet = workbook.create_sheet("Cancelled", len(self.timeslots) + 1)
-        cancelled_list_sheet.append(["Name", "Email", "Remarks"])
-        for j, person in enumerate(self.cancelled):
-            cancelled_list_sheet.append([
-                person.name,
-                person.email,
-                '\n'.join(self.marked.get(person, []))
-            ])
-        banned_list_sheet = workbook.create_sheet("Banned", len(self.timeslots) + 2)
-        banned_list_sheet.append(["Name", "Email", "Remarks"])
-        for j, person in enumerate(self.banned):
-            banned_list_sheet.append([
-                person.name,
-                person.email,
-                '\n'.join(self.marked.get(person, []))
-            ])
-        marked_list_sheet = workbook.create_sheet("All Remarks", len(self.timeslots) + 3)
-        marked_list_sheet.append(["Name", "Email", "Remarks"])
-        for j, (person, remarks) in enumerate(self.marked.items()):
-            marked_list_sheet.append([
-                person.name,
-                person.email,
-                '\n'.join(remarks)
-            ])
-        workbook.remove(workbook["Sheet"])
-        workbook.save(destination + f"/output_{datetime.now().strftime('%Y%m%d__%H_%M_%S')}.xlsx")
-
-    def write_to_csv(self):
-        os.makedirs("./output/", exist_ok=True)
-        for name, timeslot in self.timeslots.items():
-            with open(f"./output/{name.replace(':', '')}.csv", 'w', newline='', encoding="utf-8") as file:
-                fields = timeslot.spots[0].__dict__.keys()
-                writer = csv.DictWriter(file, fields)
-                writer.writeheader()
-                for registration in timeslot.spots:
-                    writer.writerow({k: v for k, v in registration.__dict__.items() if k in fields})
-
-        with open(f"./output/waiting_list.csv", 'w', newline='', encoding="utf-8") as file:
-            fields = self.waiting_list[0].__dict__.keys()
-            writer = csv.DictWriter(file, fields)
-            writer.writeheader()
-            for registration in self.waiting_list:
-                writer.writerow({k: v for k, v in registration.__dict__.items() if k in fields})
-
-        with open(f"./output/marked.csv", 'w', newline='', encoding="utf-8") as file:
-            marked_list = [(reg.person, reason) for reg, reason in self.marked.items()]
-            fields = [*marked_list[0][0].__dict__.keys(), "marked reason"]
-            writer = csv.DictWriter(file, fields)
-            writer.writeheader()
-            for person, reason in marked_list:
-                entry = {k: v for k, v in person.__dict__.items() if k in fields}
-                entry["marked reason"] = reason
-                writer.writerow(entry)
+from __future__ import annotations
+import csv
+import heapq
+import io
+import os
+import pickle
+import tempfile
+import warnings
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from itertools import count, islice
+from operator import attrgetter
+from time import perf_counter
+from typing import BinaryIO, List, Dict, Iterable, Iterator, Optional, Set, Tuple, Union, DefaultDict, \
+    Callable, TYPE_CHECKING
+
+from allocation import Allocation
+from candidate_index import CandidateIndex, NGramIndex, ShortlistIndex, WatchlistIndex
+from form_data import FullRegistration, Person, Registration, RegistrationExtras, SimilarityStats, counting_similarity, \
+    identity_key
+from remarks import Remark, RemarkCode
+from similarity_cache import SimilarityCache
+from slots import SlotRegistry
+from util import Column, TableSchema, read_table
+from datetime import datetime, timedelta
+
+if TYPE_CHECKING:
+    from ngram_matrix import NGramMatrix  # needs numpy, only imported by those using it
+    from people_store import PeopleStore
+
+SNAPSHOT_VERSION = 2  # bump when the layout written by OpeningAdmittance.save changes
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_Comparison = Tuple[str, str, str, str, float]  # name, email, other name, other email, threshold
+
+
+def _normalise(field: str) -> str:
+    return field.lower().strip()
+
+
+def _parse_timestamp(timestamp: str) -> datetime:
+    """
+    Parses Google Forms timestamps, '%d/%m/%Y %H:%M:%S', a lot faster than datetime.strptime
+    """
+    try:
+        date, time = timestamp.split(' ')
+        day, month, year = date.split('/')
+        hour, minute, second = time.split(':')
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+    except ValueError:
+        raise ValueError(f"time data {timestamp!r} does not match format '%d/%m/%Y %H:%M:%S'") from None
+
+
+def _read_text(value) -> str:
+    # spreadsheets give numbers for cells that look like them
+    return _normalise(value if isinstance(value, str) else str(value))
+
+
+def _read_timestamp(value: Union[str, datetime]) -> datetime:
+    return value if isinstance(value, datetime) else _parse_timestamp(value)
+
+
+def _read_timeslots(timeslots: str) -> List[str]:
+    return [timeslot.replace(' ', '') for timeslot in timeslots.split(',')]
+
+
+# the columns of the form responses, timestamp, email, name and timeslots
+REGISTRATION_SCHEMA = TableSchema(
+    Registration, {"name": 2, "email": 1, "timestamp": 0, "timeslots": 3},
+    {"name": _read_text, "email": _read_text, "timestamp": _read_timestamp, "timeslots": _read_timeslots}
+)
+
+
+def person_schema(name_column: Column, email_column: Column) -> TableSchema:
+    """
+    :return: the schema of a table of people, with the columns of their names and emails given by header or index
+    """
+    return TableSchema(Person, {"name": name_column, "email": email_column}, {"name": _read_text, "email": _read_text})
+
+
+def read_entry(timestamp: str, mail: str, name: str, timeslots: str, *_) -> Registration:
+    return Registration(
+        _normalise(name),
+        _normalise(mail),
+        _parse_timestamp(timestamp),
+        _read_timeslots(timeslots))
+
+
+def iter_registrations(file_path: str, schema: TableSchema = REGISTRATION_SCHEMA) -> Iterator[Registration]:
+    """
+    Reads the registrations one at a time, in the order they are in the file, which may be a csv file or a
+    spreadsheet, see util.read_table
+    """
+    return read_table(file_path, schema)
+
+
+def read_registrations(file_path: str, schema: TableSchema = REGISTRATION_SCHEMA) -> List[Registration]:
+    return list(iter_registrations(file_path, schema))
+
+
+def _write_chunk(chunk: List[Registration], files: ExitStack) -> BinaryIO:
+    # pickled one by one, keeping the type and every field of the registrations whatever schema they were read with
+    chunk_file = files.enter_context(tempfile.TemporaryFile())
+    for registration in chunk:
+        pickle.dump(registration, chunk_file, pickle.HIGHEST_PROTOCOL)
+    chunk_file.seek(0)
+    return chunk_file
+
+
+def _read_chunk(chunk_file: BinaryIO) -> Iterator[Registration]:
+    while True:
+        try:
+            yield pickle.load(chunk_file)
+        except EOFError:
+            return
+
+
+def sorted_registrations(file_path: str, chunk_size: int = 100_000,
+                         schema: TableSchema = REGISTRATION_SCHEMA) -> Iterator[Registration]:
+    """
+    Reads the registrations ordered by timestamp, keeping about `chunk_size` of them in memory at once.
+    Larger files are sorted in chunks written to temporary files, which are then merged. Registrations with the same
+    timestamp keep the order they have in the file, same as sorting them all at once
+    """
+    with ExitStack() as files:
+        registrations = iter_registrations(file_path, schema)
+        first_chunk, chunk_files = None, []
+        while chunk := list(islice(registrations, chunk_size)):
+            chunk.sort(key=attrgetter("timestamp"))
+            if first_chunk is None and not chunk_files:
+                first_chunk = chunk  # the whole file might fit in a single chunk
+                continue
+            if first_chunk is not None:
+                chunk_files.append(_write_chunk(first_chunk, files))
+                first_chunk = None
+            chunk_files.append(_write_chunk(chunk, files))
+        if not chunk_files:
+            yield from first_chunk or ()
+            return
+        yield from heapq.merge(
+            *map(_read_chunk, chunk_files),
+            key=attrgetter("timestamp")
+        )
+
+
+class RegistrationFeed:
+    """
+    Reads the registrations appended to a registration file since the last read, keeping track of how far into the
+    file it has come. Meant for refreshing the admission while the registration form is still open, see
+    `OpeningAdmittance.auto_admit(..., incremental=True)`
+    """
+    file_path: str
+    offset: int  # bytes of the file read so far
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.offset = 0
+
+    def read_new(self) -> List[Registration]:
+        with open(self.file_path, 'rb') as registration_file:
+            registration_file.seek(self.offset)
+            content = registration_file.read()
+        text = content[:content.rfind(b'\n') + 1].decode("utf-8")
+        # leave a row still being written for the next read. Rows end at a line break outside quotes, where the quotes
+        # read so far are balanced, as quoted values may span lines
+        end = position = quotes = 0
+        for line in text.split('\n')[:-1]:
+            position += len(line) + 1
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                end = position
+        if end == 0:
+            return []
+        complete = text[:end]
+        reader = csv.reader(io.StringIO(complete, newline=''))
+        if self.offset == 0:
+            next(reader, None)  # skip headers
+        self.offset += len(complete.encode("utf-8"))
+        return [read_entry(*row) for row in reader if row]
+
+
+def read_people_table(file_path: str, name_column: Column, email_column: Column,
+                      allow_failure: bool = True) -> List[Person]:
+    """
+    :param name_column: the header or index of the column of names, same for `email_column`
+    :param allow_failure: give no one if the file is not found
+    """
+    try:
+        return list(read_table(file_path, person_schema(name_column, email_column)))
+    except FileNotFoundError as file_not_found_error:
+        if allow_failure:
+            return []
+        raise file_not_found_error
+
+
+class Spots:
+    """
+    The people admitted to a timeslot, in the order they were admitted. Looking someone up and removing them is O(1)
+    """
+    _spots: Dict[Person, Person]
+
+    def __init__(self, spots: Iterable[Person] = ()):
+        self._spots = {}
+        for person in spots:
+            self.append(person)
+
+    def __contains__(self, person: Person):
+        return person in self._spots
+
+    def __iter__(self) -> Iterator[Person]:
+        return iter(self._spots.values())
+
+    def __len__(self):
+        return len(self._spots)
+
+    def __eq__(self, other: Union[Spots, List[Person]]):
+        # same people admitted in the same order
+        if isinstance(other, (Spots, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __str__(self):
+        return str(list(self._spots.values()))
+
+    def __repr__(self):
+        return f"Spots({list(self._spots.values())!r})"
+
+    def append(self, person: Person):
+        self._spots.setdefault(person, person)
+
+    def remove(self, person: Person):
+        try:
+            del self._spots[person]
+        except KeyError:
+            raise ValueError(f"{person} is not in spots") from None
+
+    def clear(self):
+        self._spots.clear()
+
+
+class WaitingList:
+    """
+    The registrations waiting for a spot, in the order they were put on the list. Every wanted timeslot has a heap of
+    the registrations waiting for it ordered by timestamp, so the earliest one is found in O(log n)
+    """
+    _entries: Dict[Person, Tuple[int, Registration]]  # person: (sequence number, registration)
+    _heaps: DefaultDict[str, List[Tuple[datetime, int, Registration]]]  # timeslot name: heap of waiting registrations
+
+    def __init__(self, registrations: Iterable[Registration] = ()):
+        self._entries = {}
+        self._heaps = defaultdict(list)
+        self._sequence = count()
+        for registration in registrations:
+            self.append(registration)
+
+    def __contains__(self, person: Person):
+        return person in self._entries
+
+    def __iter__(self) -> Iterator[Registration]:
+        return (registration for _, registration in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __eq__(self, other: Union[WaitingList, List[Registration]]):
+        if isinstance(other, (WaitingList, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __str__(self):
+        return str(list(self))
+
+    def __repr__(self):
+        return f"WaitingList({list(self)!r})"
+
+    def append(self, registration: Registration):
+        if registration in self._entries:
+            return
+        sequence_number = next(self._sequence)
+        self._entries[registration.person] = (sequence_number, registration)
+        for timeslot_name in registration.timeslots:
+            heapq.heappush(self._heaps[timeslot_name], (registration.timestamp, sequence_number, registration))
+
+    def remove(self, person: Person):
+        # leaves the heap entries behind, they are skipped when popped
+        try:
+            del self._entries[person]
+        except KeyError:
+            raise ValueError(f"{person} is not in the waiting list") from None
+
+    def clear(self):
+        self._entries.clear()
+        self._heaps.clear()
+
+    def pop_earliest(self, timeslot_name: str, eligible: Callable[[Registration], bool] = lambda _: True) \
+            -> Optional[Registration]:
+        """
+        Takes the earliest registration waiting for `timeslot_name` off the list
+        :param timeslot_name: the timeslot with an available spot
+        :param eligible: whether a registration may be admitted to the timeslot. Those that may not are passed over
+                         for this timeslot from then on, but stay on the list
+        :return: the registration, or None if no one eligible is waiting for the timeslot
+        """
+        heap = self._heaps.get(timeslot_name, [])
+        while heap:
+            _, sequence_number, registration = heapq.heappop(heap)
+            if self._entries.get(registration, (None,))[0] != sequence_number:
+                continue  # removed from the list since
+            if eligible(registration):
+                del self._entries[registration]
+                return registration
+        return None
+
+
+class Timeslot:
+    spots: Spots
+    _disallowed: WatchlistIndex
+
+    def __init__(self, disallowed: Optional[Iterable[Person]] = None):
+        self.spots = Spots()
+        self.disallowed = disallowed if disallowed is not None else WatchlistIndex()
+
+    @property
+    def disallowed(self) -> WatchlistIndex:
+        """
+        The people who are not allowed to attend this timeslot. Assign the same WatchlistIndex to several timeslots
+        to have them share it
+        """
+        return self._disallowed
+
+    @disallowed.setter
+    def disallowed(self, people: Iterable[Person]):
+        self._disallowed = people if isinstance(people, WatchlistIndex) else WatchlistIndex(people)
+
+    @property
+    def spots_taken(self):
+        return len(self.spots)
+
+    def __str__(self):
+        content = ', '.join(f"{k}: {str(v)}" for k, v in self.__dict__.items())
+        return f"Timeslot({content})"
+
+    def __repr__(self):
+        content = ', '.join(f"{k}: {str(v)}" for k, v in self.__dict__.items())
+        return f"Timeslot({content})"
+
+    def admit(self, person: Person) -> bool:
+        if person in self.disallowed:
+            return False
+        self.spots.append(person)
+        return True
+
+    def remove(self, person: Person) -> bool:
+        try:
+            self.spots.remove(person)
+            return True
+        except ValueError:
+            return False
+
+
+class LimitedTimeslot(Timeslot):
+    capacity: int
+
+    def __init__(self, capacity: int):
+        super().__init__()
+        self.capacity = capacity
+
+    @property
+    def spots_available(self):
+        return self.capacity - self.spots_taken
+
+    def admit(self, person: Person) -> bool:
+        if person in self.disallowed:
+            return False
+        if self.spots_available > 0:
+            self.spots.append(person)
+            return True
+        return False
+
+
+def _similar_verdicts(comparisons: List[_Comparison]) -> List[bool]:
+    # runs in the worker processes of OpeningAdmittance._screen, people are sent as strings to keep the chunks small
+    return [
+        Person(name, email).similar(Person(other_name, other_email), similarity_threshold)
+        for name, email, other_name, other_email, similarity_threshold in comparisons
+    ]
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    # Snapshots only hold builtin containers, strings and numbers, so loading one never has to import anything
+    def find_class(self, module: str, name: str):
+        raise pickle.UnpicklingError(f"Snapshots can not refer to {module}.{name}")
+
+
+_timeslot_types = {"Timeslot": Timeslot, "LimitedTimeslot": LimitedTimeslot}
+
+
+@dataclass
+class AdmittanceStats:
+    """
+    What an OpeningAdmittance given these as `stats` spent its time on. Comparisons made in screening worker processes
+    are not counted in `similarity`
+    """
+    seconds: DefaultDict[str, float] = field(default_factory=lambda: defaultdict(float))  # wall time per phase
+    similarity: SimilarityStats = field(default_factory=SimilarityStats)
+    remarks: int = 0  # remarks added to `marked`
+
+    def lap(self, phase: str, since: float) -> float:
+        """
+        Adds the time since `since` to `phase`
+        :return: the time now, to lap the next phase from
+        """
+        now = perf_counter()
+        self.seconds[phase] += now - since
+        return now
+
+    def __str__(self):
+        lines = [f"{phase:>32}: {seconds:.3f}s" for phase, seconds in self.seconds.items()]
+        lines += [f"{name.replace('_', ' '):>32}: {count}" for name, count in vars(self.similarity).items()]
+        lines.append(f"{'remarks':>32}: {self.remarks}")
+        return '\n'.join(lines)
+
+
+class OpeningAdmittance:
+    timeslots: Dict[str, Timeslot]
+    slots: SlotRegistry  # indexes the timeslots, to parse the timeslots registrations signed up for into bitmasks
+    admitted: Dict[Person, str]  # the name of the timeslot each admitted person is admitted to
+    processed: Dict[Person, Registration]
+    waiting_list: WaitingList
+    cancelled: Set[Person]
+    _banned: WatchlistIndex
+    marked: DefaultDict[Person, List[Remark]]
+    confirmed_duplicates: Set[Person]
+    candidate_index: Callable[[], CandidateIndex]  # used to shortlist suspected duplicates, see candidate_index.py
+    similarity_cache: Optional[SimilarityCache]  # remembers Person.similar verdicts, possibly across runs
+    workers: int  # processes screening registrations before they are processed, see _screen
+    screening_chunk_size: int  # comparisons sent to a worker process at a time
+    screening_prefilter: Optional[NGramMatrix]  # shortlists who to compare registrations with in batches, see _prefilter
+    stats: Optional[AdmittanceStats]  # collects what time is spent on while set
+    allocation: Optional[Allocation]  # admits all registrations at once instead of one by one, see allocation.py
+    people_store: Optional[PeopleStore]  # the result is written back to after every change while set
+    opening: Optional[str]  # the name the result is written back to the people store under
+
+    def __init__(self, timeslots: Optional[Dict[str, Timeslot]] = None,
+                 candidate_index: Callable[[], CandidateIndex] = NGramIndex,
+                 similarity_cache: Optional[SimilarityCache] = None,
+                 workers: int = 1, screening_chunk_size: int = 2_000,
+                 screening_prefilter: Optional[NGramMatrix] = None, stats: Optional[AdmittanceStats] = None,
+                 allocation: Optional[Allocation] = None, people_store: Optional[PeopleStore] = None,
+                 opening: Optional[str] = None):
+        if people_store is not None and opening is None:
+            raise ValueError("An opening name is needed to write the result back to the people store")
+        self.timeslots = timeslots if timeslots else {}
+        self.slots = SlotRegistry(self.timeslots)
+        self.candidate_index = candidate_index
+        self.similarity_cache = similarity_cache
+        self.workers = workers
+        self.screening_chunk_size = screening_chunk_size
+        self.screening_prefilter = screening_prefilter
+        self.stats = stats
+        self.allocation = allocation
+        self.people_store = people_store
+        self.opening = opening
+        self._screened = None
+        self._shortlists = None
+        self.admitted = {}
+        self.processed = {}
+        self._duplicate_index = None
+        self._identities = {}
+        self._changed_processed = False
+        self.waiting_list = WaitingList()
+        self.cancelled = set()
+        self.banned = WatchlistIndex()
+        self.marked = defaultdict(list)
+        self.confirmed_duplicates = set()
+
+    @property
+    def banned(self) -> WatchlistIndex:
+        return self._banned
+
+    @banned.setter
+    def banned(self, people: Iterable[Person]):
+        self._banned = people if isinstance(people, WatchlistIndex) else WatchlistIndex(people)
+
+    @contextmanager
+    def _collecting_stats(self):
+        # counts the calls to Person.similar and the remarks added in the with block
+        if self.stats is None:
+            yield
+            return
+        remarks = sum(map(len, self.marked.values()))
+        try:
+            with counting_similarity(self.stats.similarity):
+                yield
+        finally:
+            self.stats.remarks += sum(map(len, self.marked.values())) - remarks
+
+    def _write_back(self):
+        if self.people_store is None:
+            return
+        lapped = perf_counter()
+        self.people_store.record(self.opening, self)
+        if self.stats is not None:
+            self.stats.lap("write back", lapped)
+
+    def remarks(self, *codes: RemarkCode) -> Iterator[Remark]:
+        """
+        :param codes: the kinds of remarks wanted, all of them if none are given
+        :return: the remarks on everyone, person by person
+        """
+        for person_remarks in self.marked.values():
+            for remark in person_remarks:
+                if not codes or remark.code in codes:
+                    yield remark
+
+    def _similar(self, person: Person, other: Person, similarity_threshold: float = 0.9) -> bool:
+        if self._screened is not None:
+            if (verdict := self._screened.get((person, other, similarity_threshold))) is not None:
+                return verdict
+        if self.similarity_cache is None:
+            return person.similar(other, similarity_threshold)
+        return self.similarity_cache.similar(person, other, similarity_threshold)
+
+    def _shortlist(self, watchlist: WatchlistIndex, person: Person) -> Optional[List[Person]]:
+        # the people on the list the screening_prefilter shortlisted for the person, None to ask the list instead
+        return None if self._shortlists is None else self._shortlists[id(watchlist)].get(person)
+
+    def clear(self):
+        # the people screening found to be someone on a down prioritised list were added to it, see
+        # _preprocess_and_mark. They are taken off again, so admitting again gives the result of a first admission
+        for remark in self.remarks(RemarkCode.SAME_AS_DOWN_PRIORITISED, RemarkCode.CONFIRMED_DOWN_PRIORITISED):
+            for timeslot_name, timeslot in self.timeslots.items():
+                if remark.person in timeslot.disallowed and (
+                        timeslot_name == remark.timeslot if remark.timeslot is not None
+                        else remark.other in timeslot.disallowed):
+                    timeslot.disallowed.discard(remark.person)
+        for timeslot in self.timeslots.values():
+            timeslot.spots.clear()
+        self.admitted.clear()
+        self.processed.clear()
+        self._duplicate_index = None
+        self._identities = {}
+        self.waiting_list.clear()
+        self.cancelled.clear()
+        self.banned.clear()
+        self.marked.clear()
+
+    def save(self, file_path: str):
+        """
+        Saves the whole state of the admittance to a snapshot `load` can restore without redoing any preprocessing.
+        Every person is stored once and referred to by index, as are the registrations and their lists of timeslots
+        """
+        people: Dict[Person, int] = {}
+        registrations: Dict[int, int] = {}  # id of a registration: index in registration_table
+        registration_table = []
+        timeslot_lists: Dict[Tuple[str, ...], int] = {}
+        watchlists: Dict[int, int] = {}  # id of a watchlist: index in watchlist_table
+        watchlist_table = []
+
+        def person_index(person: Person) -> int:
+            return people.setdefault(person, len(people))
+
+        def reference(record: Person) -> int:
+            # registrations are referred to by their index, people who are not registrations by the inverse of theirs
+            if not isinstance(record, Registration):
+                return ~person_index(record)
+            if (index := registrations.get(id(record))) is None:
+                index = registrations[id(record)] = len(registration_table)
+                registration_table.append((
+                    person_index(record),
+                    (record.timestamp - _EPOCH) // _MICROSECOND,
+                    timeslot_lists.setdefault(tuple(record.timeslots), len(timeslot_lists)),
+                    (record.student_type, record.erasmus, record.nationality, record.sit_residency)
+                    if isinstance(record, RegistrationExtras) else None
+                ))
+            return index
+
+        def watchlist_index(watchlist: WatchlistIndex) -> int:
+            # timeslots sharing a down prioritised list still share it when loaded
+            if (index := watchlists.get(id(watchlist))) is None:
+                index = watchlists[id(watchlist)] = len(watchlist_table)
+                watchlist_table.append((watchlist.similarity_threshold, [person_index(person) for person in watchlist]))
+            return index
+
+        for timeslot_name, timeslot in self.timeslots.items():
+            if _timeslot_types.get(type(timeslot).__name__) is not type(timeslot):
+                raise TypeError(f"Unable to save {timeslot_name}, snapshots can not hold a {type(timeslot).__name__}")
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "processed": [reference(registration) for registration in self.processed.values()],
+            "timeslots": [
+                (timeslot_name, type(timeslot).__name__, getattr(timeslot, "capacity", None),
+                 [reference(person) for person in timeslot.spots], watchlist_index(timeslot.disallowed))
+                for timeslot_name, timeslot in self.timeslots.items()
+            ],
+            "waiting_list": [reference(registration) for registration in self.waiting_list],
+            "cancelled": [person_index(person) for person in self.cancelled],
+            "banned": watchlist_index(self.banned),
+            "marked": [
+                (person_index(person), [
+                    (remark.code.name, reference(remark.person),
+                     None if remark.other is None else reference(remark.other), remark.timeslot,
+                     reference(remark.detail) if isinstance(remark.detail, Person) else remark.detail)
+                    for remark in remarks
+                ])
+                for person, remarks in self.marked.items()
+            ],
+            "confirmed_duplicates": [person_index(person) for person in self.confirmed_duplicates],
+            # the tables filled in while referring to the above
+            "watchlists": watchlist_table,
+            "registrations": registration_table,
+            "timeslot_lists": list(timeslot_lists),
+            "people": [(person.name, person.email) for person in people],
+        }
+        temporary_path = f"{file_path}.tmp"
+        with open(temporary_path, 'wb') as snapshot_file:
+            pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, file_path)  # don't leave a half written snapshot behind if interrupted
+
+    @classmethod
+    def load(cls, file_path: str, candidate_index: Callable[[], CandidateIndex] = NGramIndex,
+             similarity_cache: Optional[SimilarityCache] = None) -> OpeningAdmittance:
+        """
+        Restores an admittance saved by `save`
+        :raises ValueError: if the file is not a snapshot of this SNAPSHOT_VERSION
+        """
+        with open(file_path, 'rb') as snapshot_file:
+            try:
+                snapshot = _SnapshotUnpickler(snapshot_file).load()
+            except (pickle.UnpicklingError, EOFError) as error:
+                raise ValueError(f"{file_path} is not a snapshot") from error
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{file_path} is not a snapshot of version {SNAPSHOT_VERSION}")
+
+        person_table = snapshot["people"]
+        people: List[Optional[Person]] = [None] * len(person_table)
+        timeslot_lists = snapshot["timeslot_lists"]
+        registrations = []
+        for index, microseconds, timeslots_index, extras in snapshot["registrations"]:
+            name, email = person_table[index]
+            timestamp, timeslots = _EPOCH + timedelta(microseconds=microseconds), list(timeslot_lists[timeslots_index])
+            if extras is None:
+                registration = Registration(name, email, timestamp, timeslots)
+            else:
+                registration = FullRegistration(name, email, timestamp, timeslots, *extras)
+            registrations.append(registration)
+            if people[index] is None:
+                people[index] = registration.person  # shares the strings and hash of the registration
+        for index, person in enumerate(people):
+            if person is None:
+                people[index] = Person(*person_table[index])
+
+        def dereference(index: int) -> Person:
+            return registrations[index] if index >= 0 else people[~index]
+
+        watchlists = [
+            WatchlistIndex((people[index] for index in people_indices), similarity_threshold)
+            for similarity_threshold, people_indices in snapshot["watchlists"]
+        ]
+        admittance = cls(candidate_index=candidate_index, similarity_cache=similarity_cache)
+        for timeslot_name, timeslot_type, capacity, spots, watchlist in snapshot["timeslots"]:
+            timeslot = _timeslot_types[timeslot_type](*(() if capacity is None else (capacity,)))
+            timeslot.disallowed = watchlists[watchlist]
+            timeslot.spots = Spots(map(dereference, spots))
+            admittance.timeslots[timeslot_name] = timeslot
+            for person in timeslot.spots:
+                admittance.admitted[person.person] = timeslot_name
+
+        duplicate_index = admittance._duplicate_index = candidate_index()
+        for registration in map(dereference, snapshot["processed"]):
+            admittance.processed[registration.person] = registration
+            duplicate_index.add(registration.person)
+            admittance._identities[identity_key(registration.person)] = registration.person
+        admittance.waiting_list = WaitingList(map(dereference, snapshot["waiting_list"]))
+        admittance.cancelled = {people[index] for index in snapshot["cancelled"]}
+        admittance.banned = watchlists[snapshot["banned"]]
+        for index, remarks in snapshot["marked"]:
+            admittance.marked[people[index]] = [
+                Remark(RemarkCode[code], dereference(person), None if other is None else dereference(other), timeslot,
+                       dereference(detail) if isinstance(detail, int) else detail)
+                for code, person, other, timeslot, detail in remarks
+            ]
+        admittance.confirmed_duplicates = {people[index] for index in snapshot["confirmed_duplicates"]}
+        return admittance
+
+    def _indexed_comparisons(self, registrations: List[Registration], continued: bool,
+                             watchlists: List[WatchlistIndex]) -> Dict[Tuple[Person, Person, float], None]:
+        """
+        :return: the comparisons to screen, shortlisted one registration at a time by the candidate indices
+        """
+        comparisons = {}
+        duplicate_index = self.candidate_index()
+        identities = set()  # those with the same identity key as someone before them are not compared with anyone
+        if continued and self._duplicate_index is not None:
+            for person in self.processed:
+                duplicate_index.add(person)
+            identities.update(self._identities)
+        for registration in registrations:
+            person = registration.person
+            for watchlist in watchlists:
+                for listed_person in watchlist.candidates(person):
+                    comparisons[(listed_person, person, watchlist.similarity_threshold)] = None
+            if person not in duplicate_index and (key := identity_key(person)) not in identities:
+                identities.add(key)
+                # everyone processed before them is a candidate, even those later overwritten
+                for other in duplicate_index.candidates(person):
+                    comparisons[(person, other, 0.9)] = None
+                duplicate_index.add(person)
+        return comparisons
+
+    def _prefilter(self, registrations: List[Registration], continued: bool,
+                   watchlists: List[WatchlistIndex]) -> Dict[Optional[int], Dict[Person, List[Person]]]:
+        """
+        Shortlists everyone the registrations might be compared with for all of them at once by the
+        screening_prefilter, for _preprocess_and_mark to compare them with instead of asking the candidate indices
+        :return: for each watchlist by id, the people on it or registering that each registration might be, in the
+                 order they are or would be put on it, and by None those that each registration might be a duplicate
+                 of among the registrations and those processed before them
+        """
+        prefilter = self.screening_prefilter
+        registered = list(dict.fromkeys(registration.person for registration in registrations))
+        registered_vectors = prefilter.encode(registered)
+        # People are only put on a list while processing if they are someone on it already, which an empty list has
+        # none of. Otherwise anyone registering might be, and compared with those registering after them
+        thresholds = {0.9, *(watchlist.similarity_threshold for watchlist in watchlists if len(watchlist))}
+        within = {
+            threshold: list(prefilter.pairs(registered_vectors, registered_vectors, threshold))
+            for threshold in thresholds
+        }
+        shortlists = {}
+        for watchlist in watchlists:
+            listed_shortlists = shortlists[id(watchlist)] = {person: [] for person in registered}
+            if not len(watchlist):
+                continue
+            listed = prefilter.encode(watchlist)
+            for i, j in prefilter.pairs(listed, registered_vectors, watchlist.similarity_threshold):
+                listed_shortlists[registered[j]].append(listed.people[i])
+            for i, j in within[watchlist.similarity_threshold]:
+                if registered[i] not in watchlist:
+                    listed_shortlists[registered[j]].append(registered[i])
+
+        duplicate_shortlists = shortlists[None] = {person: [] for person in registered}
+        for i, j in within[0.9]:
+            if i != j:
+                duplicate_shortlists[registered[i]].append(registered[j])
+        if continued and self._duplicate_index is not None:
+            earlier = [person for person in self.processed if person not in duplicate_shortlists]
+            for i, j in prefilter.pairs(registered_vectors, prefilter.encode(earlier)):
+                duplicate_shortlists[registered[i]].append(earlier[j])
+        return shortlists
+
+    def _prefiltered_comparisons(self, registrations: List[Registration], continued: bool,
+                                 watchlists: List[WatchlistIndex]) -> Dict[Tuple[Person, Person, float], None]:
+        """
+        :return: the comparisons to screen, the ones _indexed_comparisons would find taken from the `_shortlists`
+        """
+        comparisons = {}
+        registered = list(dict.fromkeys(registration.person for registration in registrations))
+        for watchlist in watchlists:
+            listed_shortlists = self._shortlists[id(watchlist)]
+            for person in registered:
+                for listed_person in listed_shortlists[person]:
+                    if listed_person in watchlist:  # not those that might be put on it while processing
+                        comparisons[(listed_person, person, watchlist.similarity_threshold)] = None
+
+        continuing = continued and self._duplicate_index is not None
+        # those with the same identity key as someone before them are not compared with anyone
+        identities = set(self._identities) if continuing else set()
+        positions = {}
+        for person in registered:
+            if person not in self.processed and (key := identity_key(person)) not in identities:
+                identities.add(key)
+                positions[person] = len(positions)
+        for person, position in positions.items():
+            # everyone processed before them is a candidate, even those later overwritten
+            for other in self._shortlists[None][person]:
+                if (continuing and other in self.processed) or positions.get(other, position) < position:
+                    comparisons[(person, other, 0.9)] = None
+        return comparisons
+
+    def _screen(self, registrations: List[Registration], continued: bool = False):
+        """
+        Compares the registrations with everyone _preprocess_and_mark might compare them with, spread over `workers`
+        processes. Whether people are similar does not depend on the order they are processed in, so the verdicts are
+        looked up by _similar when the registrations are processed in order afterwards, marking them exactly as if
+        every comparison was made then and there. Comparisons not foreseen here, like with people put on a list while
+        processing, are still made as they come.
+        With a screening_prefilter the comparisons are shortlisted for all registrations at once, not one at a time,
+        and the registrations are only compared with those shortlisted for them when processed
+        """
+        # the distinct ban and down prioritised lists, timeslots may share them
+        watchlists = list({id(watchlist): watchlist for watchlist in (
+            self.banned, *(timeslot.disallowed for timeslot in self.timeslots.values())
+        )}.values())
+        if self.screening_prefilter is None:
+            comparisons = self._indexed_comparisons(registrations, continued, watchlists)
+        else:
+            self._shortlists = self._prefilter(registrations, continued, watchlists)
+            if self.workers == 1:
+                return  # the shortlisted are compared with while processing, as far as needed
+            comparisons = self._prefiltered_comparisons(registrations, continued, watchlists)
+
+        keys = list(comparisons)
+        if self.similarity_cache is not None:
+            keys = [key for key in keys if not self.similarity_cache.knows(*key)]
+        chunks = [
+            [(person.name, person.email, other.name, other.email, threshold)
+             for person, other, threshold in keys[start:start + self.screening_chunk_size]]
+            for start in range(0, len(keys), self.screening_chunk_size)
+        ]
+        self._screened = {}
+        with ExitStack() as stack:
+            if len(chunks) > 1 and self.workers > 1:
+                map_chunks = stack.enter_context(ProcessPoolExecutor(self.workers)).map
+            else:
+                map_chunks = map  # not worth starting the processes for, e.g. a few new registrations from a feed
+            verdicts = (verdict for chunk in map_chunks(_similar_verdicts, chunks) for verdict in chunk)
+            for key, verdict in zip(keys, verdicts):
+                self._screened[key] = verdict
+                if self.similarity_cache is not None:
+                    self.similarity_cache.remember(*key, verdict=verdict)
+
+    def _preprocess_and_mark(self, registrations: Iterable[Registration], continued: bool = False):
+        """
+        Look through all regisstrations beforehand to mark individuals for manual checking if needed
+        and overwrite duplicate registrations by the latest entry from said person if the latest entry makes changes
+        to their preferences in timeslot
+        :param registrations: All entries from the registration form
+        :param continued: continue from the registrations processed earlier, `registrations` are the ones that came
+                          after them. Sets `_changed_processed` if any of the earlier ones were overwritten
+        :return: registrations without duplicate entries (NOTE: suspected duplicates are only marked for manual check
+                 and will remain as separate registrations)
+        """
+        bad_email_endings = [".con", "@ntnu.no"]
+
+        stats = self.stats
+        if self.workers > 1 or self.screening_prefilter is not None:
+            registrations = list(registrations)
+            lapped = perf_counter()
+            self._screen(registrations, continued)
+            if stats is not None:
+                stats.lap("screening", lapped)
+
+        if continued and self._duplicate_index is not None:
+            proccessed_for_admission, duplicate_index = self.processed, self._duplicate_index
+            identities = self._identities
+        else:
+            proccessed_for_admission, duplicate_index, identities = {}, self.candidate_index(), {}
+        self._duplicate_index = duplicate_index
+        self._identities = identities  # identity key: the person processed with it
+        if self._shortlists is not None:
+            # compared with those the screening_prefilter shortlisted for them instead of asking the index
+            duplicate_index = ShortlistIndex(duplicate_index, self._shortlists[None], proccessed_for_admission)
+        self._changed_processed = False
+        added = set()  # the people first processed in this call
+        # the distinct down prioritised lists, timeslots may share them
+        down_prioritised = list({id(slot.disallowed): slot.disallowed for slot in self.timeslots.values()}.values())
+        timeslot_bits = [(1 << index, timeslot_name, timeslot) for index, timeslot_name, timeslot in self._indexed()]
+        preferences = self.slots.preferences
+        for registration in registrations:
+            if stats is not None:
+                lapped = perf_counter()
+
+            # Evaluate if peron is banned
+            if registration.person not in self.banned and \
+                    (banned_person := self.banned.identical(registration.person)) is not None:
+                # the same person written differently, no need to compare them
+                self.banned.add(registration.person)
+                self.marked[registration.person].append(
+                    Remark(RemarkCode.SAME_AS_BANNED, registration.person, banned_person)
+                )
+            if registration.person in self.banned:
+                self.marked[registration.person].append(Remark(RemarkCode.BANNED, registration.person))
+                if stats is not None:
+                    stats.lap("ban screening", lapped)
+                continue
+            else:
+                confirmed_duplicate = False
+                if (banned_person := self.banned.suspect(registration.person, self._similar,
+                                                         self._shortlist(self.banned, registration.person))) \
+                        is not None:
+                    if confirmed_duplicate := registration.person in self.confirmed_duplicates:
+                        self.marked[registration.person].append(
+                            Remark(RemarkCode.CONFIRMED_BAN, registration.person, banned_person)
+                        )
+                        self.banned.add(registration.person)
+                    else:
+                        self.marked[registration.person].append(
+                            Remark(RemarkCode.SUSPECTED_BAN, registration.person, banned_person)
+                        )
+                if stats is not None:
+                    lapped = stats.lap("ban screening", lapped)
+                if confirmed_duplicate:
+                    continue  # skip this person, go on to the next!
+
+            # Evaluate if person has a bad email ending
+
+            for ending in bad_email_endings:
+                if registration.person.email.endswith(ending):
+                    self.marked[registration.person].append(
+                        Remark(RemarkCode.BAD_EMAIL, registration.person, detail=ending)
+                    )
+
+            # Evaluate if person has not been given a timeslot because of attending previous "premium" timeslots in
+            # earlier opening
+
+            for disallowed in down_prioritised:
+                if registration.person not in disallowed and \
+                        (downprioritised_person := disallowed.identical(registration.person)) is not None:
+                    disallowed.add(registration.person)  # the same person written differently
+                    self.marked[registration.person].append(Remark(
+                        RemarkCode.SAME_AS_DOWN_PRIORITISED, registration.person, downprioritised_person
+                    ))
+
+            if all(registration.person in disallowed for disallowed in down_prioritised):
+                self.marked[registration.person].append(
+                    Remark(RemarkCode.DOWN_PRIORITISED_EVERYWHERE, registration.person)
+                )
+                if stats is not None:
+                    stats.lap("down prioritisation screening", lapped)
+                continue  # go on to the next person!
+
+            suspects = {}  # timeslots sharing the same down prioritised list only need to look it up once
+            wanted = preferences(registration.timeslots).mask
+            for bit, timeslot_name, timeslot in timeslot_bits:
+                if not wanted & bit:  # we only care if they signed this timeslot
+                    continue
+                if registration.person in timeslot.disallowed:
+                    self.marked[registration.person].append(
+                        Remark(RemarkCode.DOWN_PRIORITISED, registration.person, timeslot=timeslot_name)
+                    )
+                    break
+                else:
+                    if (disallowed_id := id(timeslot.disallowed)) not in suspects:
+                        suspects[disallowed_id] = timeslot.disallowed.suspect(
+                            registration.person, self._similar, self._shortlist(timeslot.disallowed, registration.person)
+                        )
+                    if (downprioritised_person := suspects[disallowed_id]) is not None:
+                        if registration.person in self.confirmed_duplicates:
+                            self.marked[registration.person].append(Remark(
+                                RemarkCode.CONFIRMED_DOWN_PRIORITISED, registration.person, downprioritised_person,
+                                timeslot_name
+                            ))
+                            timeslot.disallowed.add(registration.person)
+                        else:
+                            self.marked[registration.person].append(Remark(
+                                RemarkCode.SUSPECTED_DOWN_PRIORITISED, registration.person, downprioritised_person,
+                                timeslot_name
+                            ))
+            if stats is not None:
+                lapped = stats.lap("down prioritisation screening", lapped)
+
+            # Evaluate if person is already in the system
+            person = registration.person
+            if person not in proccessed_for_admission and \
+                    (same := identities.get(key := identity_key(person))) is not None:
+                # the same person written differently, taken as them registering again without comparing them
+                earlier_registration = proccessed_for_admission[same]
+                self.marked[same].append(Remark(RemarkCode.SAME_AS_REGISTERED, same, registration))
+                self.marked[person].append(Remark(RemarkCode.SAME_AS_REGISTERED, person, earlier_registration))
+                if set(registration.timeslots) == set(earlier_registration.timeslots):
+                    if stats is not None:
+                        stats.lap("duplicate screening", lapped)
+                    continue
+                self.marked[person].append(Remark(
+                    RemarkCode.CHANGED_TIMESLOTS, person, earlier_registration, detail=registration
+                ))
+                del proccessed_for_admission[same]
+                duplicate_index.remove(same)
+                if same in added:
+                    added.remove(same)
+                else:
+                    self._changed_processed = True
+                duplicate_index.add(person)
+                added.add(person)
+                identities[key] = person
+            elif person in proccessed_for_admission.keys():
+                # only overwrite entry if change in timeslots
+                if set(registration.timeslots) != set(proccessed_for_admission[person].timeslots):
+                    # NOTE: changing your timeslots has its drawback - you're now later in the queue
+                    self.marked[person].append(Remark(
+                        RemarkCode.CHANGED_TIMESLOTS, person, proccessed_for_admission[person], detail=registration
+                    ))
+                    self._changed_processed |= person not in added
+                else:
+                    # if no substantial change is made, don't reprocess the person. They did as intended the first
+                    # time around and should not be punished for trying to make sure they registered.
+                    if stats is not None:
+                        stats.lap("duplicate screening", lapped)
+                    continue
+            else:
+                for already_processed_person in duplicate_index.candidates(registration.person):
+                    already_processed_registration = proccessed_for_admission[already_processed_person]
+                    if self._similar(registration.person, already_processed_person):
+                        if confirmed_duplicate := registration.person in self.confirmed_duplicates:
+                            # only overwrite entry if change in timeslots
+                            self.marked[already_processed_person].append(Remark(
+                                RemarkCode.CONFIRMED_DUPLICATE, already_processed_person, registration,
+                                detail=already_processed_registration
+                            ))
+                            del proccessed_for_admission[already_processed_person]
+                            duplicate_index.remove(already_processed_person)
+                            if identities.get(already_processed_key := identity_key(already_processed_person)) \
+                                    == already_processed_person:
+                                del identities[already_processed_key]
+                            if already_processed_person in added:
+                                added.remove(already_processed_person)
+                            else:
+                                self._changed_processed = True
+                        else:
+                            self.marked[already_processed_person].append(
+                                Remark(RemarkCode.SUSPECTED_DUPLICATE, already_processed_person, registration)
+                            )
+                            self.marked[registration.person].append(Remark(
+                                RemarkCode.SUSPECTED_DUPLICATE, registration.person, already_processed_registration
+                            ))
+                            break
+                duplicate_index.add(person)
+                added.add(person)
+                identities[key] = person
+
+            proccessed_for_admission[person] = registration
+            if stats is not None:
+                stats.lap("duplicate screening", lapped)
+        self._screened = self._shortlists = None  # the verdicts and shortlists are only needed while processing
+        return proccessed_for_admission
+
+    def auto_admit(self, registrations: Iterable[Registration], incremental: bool = False):
+        """
+        Admit registrations to the first timeslot of their choice with available spots, in order, or put them on the
+        waiting list. With an `allocation` they are admitted all at once instead, e.g. to fill more spots
+        :param registrations: All entries from the registration form, ordered by timestamp
+        :param incremental: `registrations` are only the entries that came after the ones given earlier, e.g. read by
+                            a RegistrationFeed. Gives the same result as admitting all of them at once, but only
+                            reprocesses the new ones as long as they don't overwrite any of the earlier entries
+        """
+        with self._collecting_stats():
+            if not incremental:
+                self.processed = self._preprocess_and_mark(registrations)
+                to_admit = self.processed.values()
+            else:
+                already_processed = len(self.processed)
+                self.processed = self._preprocess_and_mark(registrations, continued=True)
+                if self._changed_processed:
+                    # someone already admitted changed their mind, let everyone in again in the order of the
+                    # registrations
+                    for timeslot in self.timeslots.values():
+                        timeslot.spots.clear()
+                    self.admitted.clear()
+                    self.waiting_list.clear()
+                    to_admit = self.processed.values()
+                else:
+                    to_admit = islice(self.processed.values(), already_processed, None)
+            self._allocate(to_admit)
+            self._write_back()
+
+    def preprocess(self, registrations: Iterable[Registration]):
+        """
+        Process the registrations like `auto_admit` without admitting anyone, see `admit_processed`
+        :param registrations: All entries from the registration form, ordered by timestamp
+        """
+        with self._collecting_stats():
+            self.processed = self._preprocess_and_mark(registrations)
+
+    def admit_processed(self):
+        """
+        Admit the registrations processed earlier from scratch, e.g. after changing the capacities of the timeslots
+        """
+        with self._collecting_stats():
+            for timeslot in self.timeslots.values():
+                timeslot.spots.clear()
+            self.admitted.clear()
+            self.waiting_list.clear()
+            self._allocate(self.processed.values())
+            self._write_back()
+
+    def _indexed(self) -> List[Tuple[int, str, Timeslot]]:
+        """
+        :return: the index in `slots`, name and timeslot of every timeslot, looked up once for many registrations
+        """
+        return [
+            (self.slots.index(timeslot_name), timeslot_name, timeslot)
+            for timeslot_name, timeslot in self.timeslots.items()
+        ]
+
+    def _by_index(self) -> List[Optional[Tuple[str, Timeslot]]]:
+        """
+        :return: the name and timeslot at each index of `slots`, None for timeslots since taken out of `timeslots`
+        """
+        indexed = self._indexed()
+        by_index: List[Optional[Tuple[str, Timeslot]]] = [None] * len(self.slots)
+        for index, timeslot_name, timeslot in indexed:
+            by_index[index] = (timeslot_name, timeslot)
+        return by_index
+
+    def _admit(self, registration: Registration, by_index: List[Optional[Tuple[str, Timeslot]]]) -> bool:
+        for index in self.slots.preferences(registration.timeslots).order:
+            if (entry := by_index[index]) is not None and entry[1].admit(registration):
+                self.admitted[registration.person] = entry[0]
+                return True
+        return False
+
+    def _allocate(self, registrations: Iterable[Registration]):
+        """
+        Admits the registrations to the spots still available, one by one or as decided by `allocation`, or puts them
+        on the waiting list
+        """
+        lapped = perf_counter()
+        if self.allocation is None:
+            by_index = self._by_index()
+            for registration in registrations:
+                if registration in self.cancelled or registration in self.banned:
+                    continue  # cancelled or banned after being processed
+                if not self._admit(registration, by_index):
+                    self.waiting_list.append(registration)
+        else:
+            registrations, preferences = self._preferences(registrations)
+            timeslot_names = list(self.timeslots)
+            timeslots = list(self.timeslots.values())
+            capacities = [
+                timeslot.spots_available if isinstance(timeslot, LimitedTimeslot) else None for timeslot in timeslots
+            ]
+            for registration, slot in zip(registrations, self.allocation(preferences, capacities)):
+                if slot is not None and timeslots[slot].admit(registration):
+                    self.admitted[registration.person] = timeslot_names[slot]
+                else:
+                    self.waiting_list.append(registration)
+        if self.stats is not None:
+            self.stats.lap("slot allocation", lapped)
+
+    def _preferences(self, registrations: Iterable[Registration]) -> Tuple[List[Registration], List[List[int]]]:
+        """
+        :return: the registrations not cancelled or banned, and the timeslots each signed up for and isn't disallowed
+                 from, by index in `timeslots` in order of preference, as taken by an Allocation
+        """
+        registrations = [
+            registration for registration in registrations
+            if registration not in self.cancelled and registration not in self.banned
+        ]
+        indexed = self._indexed()
+        positions = [None] * len(self.slots)  # index in `slots`: index in `timeslots`
+        watchlists = {}  # id of a down prioritised list: (the list, the bits of the timeslots sharing it)
+        for position, (index, _, timeslot) in enumerate(indexed):
+            positions[index] = position
+            watchlists.setdefault(id(timeslot.disallowed), [timeslot.disallowed, 0])[1] |= 1 << index
+        opening_mask = sum(1 << index for index, _, _ in indexed)
+        preferences, parse = [], self.slots.preferences
+        for registration in registrations:
+            wanted, order = parse(registration.timeslots)
+            allowed = wanted & opening_mask
+            for disallowed, bits in watchlists.values():
+                if allowed & bits and registration in disallowed:
+                    allowed &= ~bits
+            preferences.append([positions[index] for index in order if allowed >> index & 1])
+        return registrations, preferences
+
+    def timeslot_of(self, person: Person) -> Optional[str]:
+        """
+        :return: the name of the timeslot `person` is admitted to, or None if they are not admitted
+        """
+        return self.admitted.get(person)
+
+    def processed_as(self, person: Person) -> Optional[Person]:
+        """
+        :return: the person whose registration was processed for `person`, themselves or someone with the same identity
+                 key they were taken as registering again, or None if neither was processed, like the banned
+        """
+        if person in self.processed:
+            return person
+        if (same := self._identities.get(identity_key(person))) is not None and same in self.processed:
+            return same
+        return None
+
+    def _remove(self, person: Person) -> bool:
+        """
+        Removes `person` from the timeslot they are admitted to and from the waiting list
+        :return: whether they were found
+        """
+        removed = False
+        if (timeslot_name := self.admitted.pop(person, None)) is not None:
+            removed = self.timeslots[timeslot_name].remove(person)
+        if person in self.waiting_list:
+            self.waiting_list.remove(person)
+            removed = True
+        return removed
+
+    def _admitted_suspects(self, person: Person) -> Iterator[Person]:
+        """
+        :return: the admitted people `person` might be, other than themselves
+        """
+        candidates = self.admitted if self._duplicate_index is None else self._duplicate_index.candidates(person)
+        return (
+            other for other in candidates
+            if other in self.admitted and other != person and self._similar(person, other)
+        )
+
+    def _promote(self, timeslot_name: str):
+        """
+        Fills available spots in the timeslot with the earliest registrations waiting for it
+        """
+        timeslot = self.timeslots[timeslot_name]
+        while not isinstance(timeslot, LimitedTimeslot) or timeslot.spots_available > 0:
+            registration = self.waiting_list.pop_earliest(
+                timeslot_name,
+                lambda waiting: waiting not in timeslot.disallowed and waiting not in self.banned
+                                and waiting not in self.cancelled
+            )
+            if registration is None:
+                return
+            if not timeslot.admit(registration):  # a timeslot with its own rules for admitting
+                self.waiting_list.append(registration)
+                return
+            self.admitted[registration.person] = timeslot_name
+            self.marked[registration.person].append(
+                Remark(RemarkCode.PROMOTED, registration.person, timeslot=timeslot_name)
+            )
+
+    def cancel(self, cancelled: Union[Iterable[Person], Person], promote: bool = True):
+        """
+        :param cancelled: the people cancelling
+        :param promote: give the spots that open up to the earliest eligible registrations on the waiting list
+        """
+        if isinstance(cancelled, Person):
+            cancelled = (cancelled,)  # make iterable
+        with self._collecting_stats():
+            lapped = perf_counter()
+            for person in cancelled:
+                person = person.person
+                timeslot_name = self.admitted.get(person)
+                if self._remove(person):
+                    self.cancelled.add(person)
+                else:
+                    warnings.warn(
+                        f"Unable to cancel for {person}! They were not found in timeslots or the waiting list!"
+                    )
+                for other in self._admitted_suspects(person):
+                    self.marked[other].append(Remark(RemarkCode.MIGHT_HAVE_CANCELLED, other, person))
+                if promote and timeslot_name is not None:
+                    self._promote(timeslot_name)
+            if self.stats is not None:
+                self.stats.lap("cancellations", lapped)
+            self._write_back()
+
+    def ban(self, banned: Union[Iterable[Person], Person], promote: bool = True):
+        """
+        :param banned: the people to ban
+        :param promote: give the spots that open up to the earliest eligible registrations on the waiting list
+        """
+        if isinstance(banned, Person):
+            banned = (banned,)  # make iterable
+        with self._collecting_stats():
+            lapped = perf_counter()
+            for person in banned:
+                person = person.person
+                timeslot_name = self.admitted.get(person)
+                if not self._remove(person):
+                    warnings.warn(f"{person} was not found in timeslots or the waiting list! Banning them anyway.")
+                self.banned.add(person)
+                for other in self._admitted_suspects(person):
+                    self.marked[other].append(Remark(RemarkCode.MIGHT_HAVE_BEEN_BANNED, other, person))
+                if promote and timeslot_name is not None:
+                    self._promote(timeslot_name)
+            if self.stats is not None:
+                self.stats.lap("bans", lapped)
+            self._write_back()
+
+    def _sheets(self) -> Iterator[Tuple[str, List[str], Iterator[list]]]:
+        """
+        :return: the name, header and rows of every sheet of the export, with each person's remarks rendered once
+        """
+        remarks = {person: '\n'.join(map(str, person_remarks)) for person, person_remarks in self.marked.items()}
+
+        def registration_rows(registrations: Iterable[Registration]) -> Iterator[list]:
+            for registration in registrations:
+                person = registration.person
+                yield [
+                    registration.timestamp,
+                    person.name,
+                    person.email,
+                    ", ".join(registration.timeslots),
+                    remarks.get(person, '')
+                ]
+
+        def person_rows(people: Iterable[Person]) -> Iterator[list]:
+            for person in people:
+                yield [person.name, person.email, remarks.get(person, '')]
+
+        registration_header = ["Timestamp", "Name", "Email", "Wanted Timeslots", "Remarks"]
+        person_header = ["Name", "Email", "Remarks"]
+        for timeslot_name, timeslot in self.timeslots.items():
+            yield (timeslot_name.replace(':', '_'), registration_header,
+                   registration_rows(self.processed[person] for person in timeslot.spots))
+        yield "Waiting List", registration_header, registration_rows(self.waiting_list)
+        yield "Cancelled", person_header, person_rows(self.cancelled)
+        yield "Banned", person_header, person_rows(self.banned)
+        yield "All Remarks", person_header, person_rows(self.marked)
+
+    def write_to_spreadsheets(self, destination: str, file_format: str = "xlsx") -> str:
+        """
+        :param destination: the directory to write to
+        :param file_format: "xlsx" for a single workbook, or "csv" for a directory with a file for each sheet
+        :return: the path of the workbook or directory written
+        """
+        output_path = os.path.join(destination, f"output_{datetime.now().strftime('%Y%m%d__%H_%M_%S')}")
+        if file_format == "csv":
+            self.write_to_csv(output_path)
+            return output_path
+        if file_format != "xlsx":
+            raise ValueError(f"Unknown file format {file_format!r}, expected 'xlsx' or 'csv'")
+        import openpyxl as xl  # only needed for workbooks, so headless runs writing csv files don't need it installed
+
+        lapped = perf_counter()
+        workbook = xl.Workbook(write_only=True)  # rows are streamed to the file instead of kept as cells
+        for sheet_name, header, rows in self._sheets():
+            sheet = workbook.create_sheet(sheet_name)
+            sheet.append(header)
+            for row in rows:
+                sheet.append(row)
+        workbook.save(output_path := output_path + ".xlsx")
+        if self.stats is not None:
+            self.stats.lap("export", lapped)
+        return output_path
+
+    def write_to_csv(self, destination: str = "./output/", max_workers: Optional[int] = None):
+        """
+        Writes every sheet of `write_to_spreadsheets` to its own csv file in `destination`, in parallel
+        """
+        os.makedirs(destination, exist_ok=True)
+
+        def write_sheet(sheet_name: str, header: List[str], rows: Iterator[list]):
+            with open(os.path.join(destination, f"{sheet_name}.csv"), 'w', newline='', encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(header)
+                writer.writerows(rows)
+
+        lapped = perf_counter()
+        with ThreadPoolExecutor(max_workers) as executor:
+            for future in [executor.submit(write_sheet, *sheet) for sheet in self._sheets()]:
+                future.result()  # raise any error from writing
+        if self.stats is not None:
+            self.stats.lap("export", lapped)
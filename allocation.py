@@ -0,0 +1,94 @@
+from __future__ import annotations
+import heapq
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Assigns timeslots to registrations all at once. Given the timeslots each registration may be admitted to, by index
+# in order of preference and the registrations in order of priority, and the spots available in each timeslot (None
+# for unlimited), returns the timeslot each registration is admitted to, or None for the waiting list
+Allocation = Callable[[Sequence[Sequence[int]], Sequence[Optional[int]]], List[Optional[int]]]
+
+
+def flow_allocation(preferences: Sequence[Sequence[int]], capacities: Sequence[Optional[int]]) -> List[Optional[int]]:
+    """
+    Admits as many registrations as the capacities allow, unlike admitting each to the first timeslot of their
+    choice with available spots, which can fill a spot someone earlier could have moved to and leave the spot it
+    emptied unused. As a min-cost flow from registrations to timeslots with the cost of admitting someone being how
+    far down their preferences the timeslot is:
+        - the most registrations possible are admitted,
+        - of those who could be, earlier registrations are admitted before later ones,
+        - and of the ways to admit them, the one going the fewest steps down their preferences is chosen.
+
+    Registrations are added one at a time by successive shortest paths. Someone admitted is never left out again, which
+    is the greedy algorithm of the matroid of admittable sets of registrations, giving the most registrations and the
+    earliest ones. The paths run between timeslots, through the admitted person cheapest to move from one to the
+    other, so each registration only costs a Bellman-Ford over the timeslots.
+    :param preferences: the timeslots each registration may be admitted to, by index in order of preference, with
+                        the registrations in order of priority
+    :param capacities: the spots available in each timeslot, None for unlimited
+    :return: the timeslot each registration is admitted to, or None for the waiting list
+    """
+    slots = range(len(capacities))
+    available = [len(preferences) if capacity is None else capacity for capacity in capacities]
+    assigned: List[Optional[int]] = [None] * len(preferences)
+    ranks: List[dict] = [{}] * len(preferences)  # timeslot: position in the preferences, of those admitted
+    # (a, b): heap of (change in cost, priority) of those admitted to a who could move to b, outdated entries are
+    # skipped as they are found
+    movable: List[List[List[Tuple[int, int]]]] = [[[] for _ in slots] for _ in slots]
+
+    def admit(person: int, slot: int):
+        assigned[person] = slot
+        rank = ranks[person]
+        for other_slot, other_rank in rank.items():
+            if other_slot != slot:
+                heapq.heappush(movable[slot][other_slot], (other_rank - rank[slot], person))
+
+    def cheapest_move(slot: int, other_slot: int) -> Optional[Tuple[int, int]]:
+        heap = movable[slot][other_slot]
+        while heap and assigned[heap[0][1]] != slot:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    for person, preferred in enumerate(preferences):
+        if not preferred:
+            continue
+        if available[preferred[0]] > 0:
+            # nothing is cheaper than the first choice, as no path between timeslots costs less than nothing
+            ranks[person] = {slot: rank for rank, slot in enumerate(preferred)}
+            available[preferred[0]] -= 1
+            admit(person, preferred[0])
+            continue
+
+        distance: List[Optional[int]] = [None] * len(capacities)
+        previous: List[Optional[int]] = [None] * len(capacities)
+        for rank, slot in enumerate(preferred):
+            if distance[slot] is None:
+                distance[slot] = rank
+        for _ in slots:
+            changed = False
+            for slot in slots:
+                if distance[slot] is None:
+                    continue
+                for other_slot in slots:
+                    if other_slot == slot or (move := cheapest_move(slot, other_slot)) is None:
+                        continue
+                    if distance[other_slot] is None or distance[slot] + move[0] < distance[other_slot]:
+                        distance[other_slot] = distance[slot] + move[0]
+                        previous[other_slot] = slot
+                        changed = True
+            if not changed:
+                break
+
+        reachable = [slot for slot in slots if distance[slot] is not None and available[slot] > 0]
+        if not reachable:
+            continue  # admitting them would mean leaving out someone earlier
+        slot = min(reachable, key=lambda reached: distance[reached])
+        available[slot] -= 1
+        while previous[slot] is not None:
+            # the cheapest to move from the timeslot before on the path moves into this one
+            from_slot = previous[slot]
+            _, moved = cheapest_move(from_slot, slot)
+            admit(moved, slot)
+            slot = from_slot
+        ranks[person] = {slot: rank for rank, slot in enumerate(preferred)}
+        admit(person, slot)
+    return assigned
@@ -1,7 +1,132 @@
+import os.path
+import queue
+import threading
 import tkinter as tk
+from itertools import islice
 from tkinter import filedialog
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
 
-from admittance import OpeningAdmittance, LimitedTimeslot
+from admittance import OpeningAdmittance, LimitedTimeslot, sorted_registrations
+from form_data import Person, Registration
+
+_poll_interval = 100  # milliseconds between looking for messages from the worker
+_batch_size = 5_000  # registrations admitted between updates of the timeslot list
+
+
+def _admission_summary(admittance: OpeningAdmittance) -> Dict[str, Tuple[int, int]]:
+    # timeslot name: (spots taken, capacity or -1 if unlimited), copied so the main thread never reads the admittance
+    # while the worker changes it
+    return {
+        timeslot_name: (timeslot.spots_taken, timeslot.capacity if isinstance(timeslot, LimitedTimeslot) else -1)
+        for timeslot_name, timeslot in admittance.timeslots.items()
+    }
+
+
+def admit_in_background(admittance: OpeningAdmittance, registrations_path: str, messages: "queue.Queue[tuple]"):
+    """
+    Reads and admits the registrations in batches, giving the same result as admitting them all at once. Runs in the
+    worker thread of App, which is told how far it has come through `messages`:
+        ("progress", text), ("partial", summary of the admission so far, waiting), ("done", admittance)
+        or ("error", exception)
+    """
+    try:
+        registrations = sorted_registrations(registrations_path)
+        banned = list(admittance.banned)  # the ban list is not part of the registrations, keep it
+        admittance.clear()
+        admittance.banned = banned
+        admitted = 0
+        while batch := list(islice(registrations, _batch_size)):
+            admittance.auto_admit(batch, incremental=True)
+            admitted += len(batch)
+            messages.put(("progress", f"Admitted {admitted} registrations..."))
+            messages.put(("partial", _admission_summary(admittance), len(admittance.waiting_list)))
+        messages.put(("done", admittance))
+    except Exception as error:
+        messages.put(("error", error))
+
+
+def load_in_background(snapshot_path: str, messages: "queue.Queue[tuple]"):
+    """
+    Loads a snapshot saved by OpeningAdmittance.save in the worker thread of App, see `admit_in_background`
+    """
+    try:
+        messages.put(("progress", f"Loading {snapshot_path}..."))
+        messages.put(("done", OpeningAdmittance.load(snapshot_path)))
+    except Exception as error:
+        messages.put(("error", error))
+
+
+def _wheel_steps(delta: int) -> int:
+    # a row per event of the wheel, Windows gives deltas of 120 a notch but macOS only a few units, too few to divide
+    return -1 if delta > 0 else 1
+
+
+class VirtualList(tk.Frame):
+    """
+    A list of rows, any number of them, shown through a Listbox that is only ever filled with the rows in view.
+    Scrolling refills it and typing in the search field above narrows the rows down to those containing the text,
+    neither creates any widgets
+    """
+    height: int
+    search: tk.StringVar
+    _rows: Sequence[str]
+    _shown: Sequence[int]  # indices of the rows matching the search
+    _top: int  # the position in _shown of the first row in view
+
+    def __init__(self, master: tk.Misc, height: int = 20, width: int = 80):
+        super().__init__(master)
+        self.height = height
+        self._rows, self._shown, self._top = [], range(0), 0
+
+        self.search = tk.StringVar()
+        self.search.trace_add("write", lambda *_: self._filter())
+        tk.Entry(self, textvariable=self.search).grid(row=0, column=0, columnspan=2, sticky="ew")
+        self._listbox = tk.Listbox(self, height=height, width=width, activestyle="none")
+        self._listbox.grid(row=1, column=0, sticky="nsew")
+        self._scrollbar = tk.Scrollbar(self, command=self._scroll)
+        self._scrollbar.grid(row=1, column=1, sticky="ns")
+        self._listbox.bind("<MouseWheel>", lambda event: self._scroll("scroll", _wheel_steps(event.delta), "units"))
+        self._listbox.bind("<Button-4>", lambda _: self._scroll("scroll", -1, "units"))  # X11 scrolling up
+        self._listbox.bind("<Button-5>", lambda _: self._scroll("scroll", 1, "units"))
+        for key, (amount, unit) in {"<Up>": (-1, "units"), "<Down>": (1, "units"),
+                                    "<Prior>": (-1, "pages"), "<Next>": (1, "pages")}.items():
+            self._listbox.bind(key, lambda _, amount=amount, unit=unit: self._scroll("scroll", amount, unit))
+
+    def set_rows(self, rows: Sequence[str]):
+        self._rows = rows
+        self._filter()
+
+    def _filter(self):
+        if text := self.search.get().strip().lower():
+            self._shown = [i for i, row in enumerate(self._rows) if text in row.lower()]
+        else:
+            self._shown = range(len(self._rows))
+        self._top = 0
+        self._draw()
+
+    def _scroll(self, action: str, amount, unit: str = "units"):
+        # called by the scrollbar with ("moveto", fraction) or ("scroll", steps, "units" or "pages")
+        if action == "moveto":
+            top = int(float(amount) * len(self._shown))
+        else:
+            top = self._top + int(amount) * (self.height if unit == "pages" else 1)
+        self._top = max(0, min(top, len(self._shown) - self.height))
+        self._draw()
+        return "break"  # the listbox should not scroll by itself
+
+    def _draw(self):
+        self._listbox.delete(0, tk.END)
+        self._listbox.insert(tk.END, *(self._rows[i] for i in self._shown[self._top:self._top + self.height]))
+        shown = max(len(self._shown), 1)
+        self._scrollbar.set(self._top / shown, min((self._top + self.height) / shown, 1.0))
+
+
+def _registration_rows(registrations: Iterable[Registration]) -> List[str]:
+    return [f"{r.timestamp}   {r.name}   <{r.email}>   {', '.join(r.timeslots)}" for r in registrations]
+
+
+def _person_rows(people: Iterable[Person]) -> List[str]:
+    return [f"{person.name}   <{person.email}>" for person in people]
 
 
 class App:
@@ -13,12 +138,21 @@ class App:
     btn_read_registrations: tk.Button
 
     lb_timeslots: tk.Listbox
+    lbl_status: tk.Label
+    vl_people: VirtualList
+
+    _messages: "queue.Queue[tuple]"
+    _worker: threading.Thread
 
     def __init__(self, root: tk.Tk, admittance: OpeningAdmittance):
+        self.root = root
+        self.opening_admittance = admittance
+        self._messages = queue.Queue()
+        self._worker = None
         root.title("ReStore Admittance System")
 
         #setting window size
-        width = 600
+        width = 1000
         height = 500
         screenwidth = root.winfo_screenwidth()
         screenheight = root.winfo_screenheight()
@@ -28,40 +162,107 @@ class App:
         root.geometry(alignstr)
         root.resizable(width=False, height=False)
 
-        tk.Label(root, text="Opening timeslots").grid(row=0, column=0)
-        self.lb_timeslots = tk.Listbox(root)
+        tk.Label(root, text="Registrations").grid(row=0, column=0)
+        self.txt_registrations_path = tk.Entry(root, width=80)
+        self.txt_registrations_path.grid(row=0, column=1, sticky="ew")
+        self.btn_browse_registrations_file = tk.Button(root, text="...", command=self.browse_registrations)
+        self.btn_browse_registrations_file.grid(row=0, column=2)
+        self.btn_read_registrations = tk.Button(root, text="Admit Registrations", command=self.admit_registrations)
+        self.btn_read_registrations.grid(row=0, column=3)
 
-        for n, (timeslot_name, timeslot) in enumerate(admittance.timeslots.items()):
-            self.lb_timeslots.insert(n, timeslot_name)
-        self.lb_timeslots.insert(n+1, "General Waiting List")
-        self.lb_timeslots.grid(row=1, column=0)
+        self.lbl_status = tk.Label(root, anchor="w")
+        self.lbl_status.grid(row=1, column=0, columnspan=4, sticky="ew")
 
+        tk.Label(root, text="Opening timeslots").grid(row=2, column=0)
+        self.lb_timeslots = tk.Listbox(root, exportselection=False)
+        self.lb_timeslots.grid(row=3, column=0, sticky="n")
+        self.lb_timeslots.bind("<<ListboxSelect>>", lambda _: self.show_selected())
 
-        # tk.Label(root, text="Registrations").grid(row=0)
-        #
-        # self.txt_registrations_path = tk.Entry(root, width=80)
-        # self.txt_registrations_path.grid(row=0, column=1)
-        # self.btn_read_registrations = tk.Button(root, text="...", command=self.browse_registrations)
-        # self.btn_read_registrations.grid(row=0, column=2)
-        #
-        # self.btn_read_registrations = tk.Button(root, text="Read Registrations")
-        # self.btn_read_registrations.grid(row=1, column=1)
+        self.vl_people = VirtualList(root)
+        self.vl_people.grid(row=2, column=1, rowspan=2, columnspan=3, sticky="nsew")
 
-        # ft = tkFont.Font(family='Times',size=10)
-        # GLabel_980["font"] = ft
-        # GLabel_980["fg"] = "#333333"
-        # GLabel_980["justify"] = "left"
-        # GLabel_980["text"] = "registrations"
-        # GLabel_980.place(x=20,y=20,width=100,height=30)
+        self.show_admittance()
+        root.after(_poll_interval, self._poll)
 
     def browse_registrations(self):
         file_path = filedialog.askopenfilename(
             title="Select Registrations",
-            filetypes=(("Comma Separated Values", "*.csv"), ("All Files", "*.*"))
+            filetypes=(("Comma Separated Values", "*.csv"), ("Spreadsheets", "*.xlsx *.ods *.xls"),
+                       ("All Files", "*.*"))
         )
         self.txt_registrations_path.delete(0, len(self.txt_registrations_path.get()))  # clear text
         self.txt_registrations_path.insert(0, file_path)
 
+    def admit_registrations(self):
+        if registrations_path := self.txt_registrations_path.get():
+            self._run_in_background(admit_in_background, self.opening_admittance, registrations_path)
+
+    def load_snapshot(self, snapshot_path: str):
+        self._run_in_background(load_in_background, snapshot_path)
+
+    def _run_in_background(self, work: Callable[..., None], *arguments):
+        if self._worker is not None and self._worker.is_alive():
+            return  # one thing at a time, the admittance belongs to the worker until it is done
+        self.btn_read_registrations.config(state=tk.DISABLED)
+        self.vl_people.set_rows([])
+        self._worker = threading.Thread(target=work, args=(*arguments, self._messages), daemon=True)
+        self._worker.start()
+
+    def _poll(self):
+        # the only place messages from the worker are handled, on the Tk main thread
+        try:
+            while True:
+                kind, *content = self._messages.get_nowait()
+                if kind == "progress":
+                    self.lbl_status.config(text=content[0])
+                elif kind == "partial":
+                    summary, waiting = content
+                    self._show_timeslots(summary, waiting)
+                elif kind == "done":
+                    self.opening_admittance = content[0]
+                    self.lbl_status.config(text="Done")
+                    self.btn_read_registrations.config(state=tk.NORMAL)
+                    self.show_admittance()
+                elif kind == "error":
+                    self.lbl_status.config(text=f"Failed: {content[0]}")
+                    self.btn_read_registrations.config(state=tk.NORMAL)
+        except queue.Empty:
+            pass
+        self.root.after(_poll_interval, self._poll)
+
+    def _show_timeslots(self, summary: Dict[str, Tuple[int, int]], waiting: int):
+        selected = self.lb_timeslots.curselection()
+        self.lb_timeslots.delete(0, tk.END)
+        for timeslot_name, (taken, capacity) in summary.items():
+            self.lb_timeslots.insert(tk.END, f"{timeslot_name} ({taken}{'' if capacity < 0 else f'/{capacity}'})")
+        self.lb_timeslots.insert(tk.END, f"General Waiting List ({waiting})")
+        self.lb_timeslots.insert(tk.END, "Cancelled")
+        self.lb_timeslots.insert(tk.END, "Banned")
+        for index in selected:
+            self.lb_timeslots.selection_set(index)
+
+    def show_admittance(self):
+        admittance = self.opening_admittance
+        self._show_timeslots(_admission_summary(admittance), len(admittance.waiting_list))
+        self.show_selected()
+
+    def show_selected(self):
+        if self._worker is not None and self._worker.is_alive():
+            return  # shown when the worker is done
+        if not (selected := self.lb_timeslots.curselection()):
+            return
+        admittance = self.opening_admittance
+        timeslot_names = list(admittance.timeslots)
+        index = selected[0]
+        if index < len(timeslot_names):
+            spots = admittance.timeslots[timeslot_names[index]].spots
+            self.vl_people.set_rows(_registration_rows(admittance.processed.get(person, person) for person in spots))
+        elif index == len(timeslot_names):
+            self.vl_people.set_rows(_registration_rows(admittance.waiting_list))
+        elif index == len(timeslot_names) + 1:
+            self.vl_people.set_rows(_person_rows(admittance.cancelled))
+        else:
+            self.vl_people.set_rows(_person_rows(admittance.banned))
 
 
 if __name__ == "__main__":
@@ -74,4 +275,7 @@ if __name__ == "__main__":
 
     root = tk.Tk()
     app = App(root, admittance)
+    snapshot_path = "data/admittance.snapshot"  # saved by main.py
+    if os.path.exists(snapshot_path):
+        app.load_snapshot(snapshot_path)
     root.mainloop()
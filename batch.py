@@ -0,0 +1,189 @@
+"""
+Admits the registrations of one or more openings from the command line, without a display. Every combination of
+registration file and timeslot capacities given is admitted as its own opening, in parallel worker processes:
+
+    python batch.py data/third_opening_registrations.csv --timeslots 10:00-11:00=50,11:00-12:00=60 \
+        --timeslots 10:00-11:00=40,11:00-12:00=80 --banlist data/banlist.csv --output data/batch/
+
+Only what is needed is imported, tkinter never is, and openpyxl only when writing workbooks.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence
+
+from admittance import sorted_registrations, AdmittanceStats, OpeningAdmittance, LimitedTimeslot, read_people_table
+from allocation import Allocation, flow_allocation
+from candidate_index import WatchlistIndex
+from similarity_cache import SimilarityCache
+
+_allocations: Dict[str, Optional[Allocation]] = {"greedy": None, "flow": flow_allocation}
+
+
+@dataclass
+class Opening:
+    """
+    What to admit and where to write the result, read by `admit_opening`. The lists are read the way main.py does
+    """
+    registrations_path: str
+    capacities: Dict[str, int]  # timeslot name: capacity, in the order of the timeslots
+    output_directory: str
+    ban_list_path: Optional[str] = None
+    down_prioritised_path: Optional[str] = None
+    down_prioritised_timeslots: List[str] = field(default_factory=list)  # the timeslots disallowed to those listed
+    confirmed_duplicates_path: Optional[str] = None
+    similarity_cache_path: Optional[str] = None  # read if it exists
+    save_similarity_cache: bool = False
+    file_format: str = "xlsx"
+    workers: int = 1  # processes screening the registrations, see OpeningAdmittance._screen
+    stats: bool = False
+    allocation: Optional[Allocation] = None  # see OpeningAdmittance.allocation
+
+
+def parse_capacities(text: str) -> Dict[str, int]:
+    """
+    :param text: timeslots with their capacities, e.g. "10:00-11:00=50,11:00-12:00=60"
+    """
+    capacities = {}
+    for timeslot in filter(None, (part.strip() for part in text.split(','))):
+        name, separator, capacity = timeslot.rpartition('=')
+        if not separator or not name or not capacity.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"expected TIMESLOT=CAPACITY, got {timeslot!r}")
+        capacities[name.strip()] = int(capacity)
+    if not capacities:
+        raise argparse.ArgumentTypeError("no timeslots given")
+    return capacities
+
+
+def admit_opening(opening: Opening) -> Dict[str, object]:
+    """
+    Admits an opening and writes the result to its output directory, along with a snapshot app.py can load
+    :return: a summary of the admission: the paths written, the spots taken of each timeslot, the size of the waiting
+             list, the number of remarks and the seconds it took, with the stats as text if asked for
+    """
+    start = perf_counter()
+    similarity_cache = None
+    if opening.similarity_cache_path is not None:
+        similarity_cache = SimilarityCache.load(opening.similarity_cache_path)
+
+    admittance = OpeningAdmittance(
+        {timeslot_name: LimitedTimeslot(capacity) for timeslot_name, capacity in opening.capacities.items()},
+        similarity_cache=similarity_cache, workers=opening.workers,
+        stats=AdmittanceStats() if opening.stats else None, allocation=opening.allocation
+    )
+    if opening.ban_list_path is not None:
+        admittance.banned.update(read_people_table(opening.ban_list_path, name_column=2, email_column=1))
+    if opening.down_prioritised_path is not None:
+        # shared by the timeslots, so confirmed duplicates of the down prioritised are added to all of them
+        disallowed = WatchlistIndex(read_people_table(opening.down_prioritised_path, name_column=2, email_column=1))
+        for timeslot_name in opening.down_prioritised_timeslots:
+            if timeslot_name not in admittance.timeslots:
+                raise ValueError(f"Down prioritised timeslot {timeslot_name!r} is not one of the timeslots")
+            admittance.timeslots[timeslot_name].disallowed = disallowed
+    if opening.confirmed_duplicates_path is not None:
+        admittance.confirmed_duplicates = set(
+            read_people_table(opening.confirmed_duplicates_path, name_column=0, email_column=1)
+        )
+
+    admittance.auto_admit(sorted_registrations(opening.registrations_path))
+    if similarity_cache is not None and opening.save_similarity_cache:
+        similarity_cache.save(opening.similarity_cache_path)
+
+    os.makedirs(opening.output_directory, exist_ok=True)
+    output_path = admittance.write_to_spreadsheets(opening.output_directory, opening.file_format)
+    snapshot_path = os.path.join(opening.output_directory, "admittance.snapshot")
+    admittance.save(snapshot_path)
+    return {
+        "registrations": opening.registrations_path,
+        "output": output_path,
+        "snapshot": snapshot_path,
+        "spots_taken": {name: timeslot.spots_taken for name, timeslot in admittance.timeslots.items()},
+        "capacities": dict(opening.capacities),
+        "waiting": len(admittance.waiting_list),
+        "remarks": sum(map(len, admittance.marked.values())),
+        "seconds": perf_counter() - start,
+        "stats": None if admittance.stats is None else str(admittance.stats),
+    }
+
+
+def admit_openings(openings: Sequence[Opening], processes: int = 1) -> List[Dict[str, object]]:
+    """
+    Admits every opening, several at a time in `processes` worker processes
+    :return: the summaries of `admit_opening`, in the order of `openings`
+    """
+    if processes == 1 or len(openings) == 1:
+        return list(map(admit_opening, openings))
+    with ProcessPoolExecutor(min(processes, len(openings))) as executor:
+        return list(executor.map(admit_opening, openings))
+
+
+def _openings(arguments: argparse.Namespace) -> List[Opening]:
+    # every registration file with every configuration of capacities, each written to its own directory when there
+    # are more than one
+    openings = []
+    parallel = len(arguments.registrations) * len(arguments.timeslots) > 1
+    for registrations_path in arguments.registrations:
+        for number, capacities in enumerate(arguments.timeslots, start=1):
+            output_directory = arguments.output
+            if parallel:
+                stem = os.path.splitext(os.path.basename(registrations_path))[0]
+                output_directory = os.path.join(output_directory, f"{stem}__{number}")
+            openings.append(Opening(
+                registrations_path, capacities, output_directory,
+                ban_list_path=arguments.banlist,
+                down_prioritised_path=arguments.downprioritized,
+                down_prioritised_timeslots=arguments.downprioritized_timeslot or list(capacities)[:1],
+                confirmed_duplicates_path=arguments.confirmed_duplicates,
+                similarity_cache_path=arguments.similarity_cache,
+                # the cache is only written back when a single opening can't race others to it
+                save_similarity_cache=not parallel,
+                file_format=arguments.format,
+                # screening only gets the processes when there is no other opening to run them
+                workers=1 if parallel else arguments.processes,
+                stats=arguments.stats,
+                allocation=_allocations[arguments.allocation],
+            ))
+    return openings
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Admits the registrations of one or more openings, without a display")
+    parser.add_argument("registrations", nargs='+', help="the registration files, in the format of the form export")
+    parser.add_argument("--timeslots", type=parse_capacities, action="append", required=True,
+                        metavar="TIMESLOT=CAPACITY,...",
+                        help="the timeslots and their capacities, repeat to admit with several configurations")
+    parser.add_argument("--banlist", help="the ban list")
+    parser.add_argument("--downprioritized", help="the people disallowed the down prioritised timeslots")
+    parser.add_argument("--downprioritized-timeslot", action="append", metavar="TIMESLOT",
+                        help="a timeslot disallowed to the down prioritised, the first timeslot if not given")
+    parser.add_argument("--confirmed-duplicates", help="the manually confirmed duplicates")
+    parser.add_argument("--similarity-cache", help="the comparisons made in earlier runs, only updated when admitting "
+                                                   "a single opening")
+    parser.add_argument("--output", default="output/", help="the directory to write to")
+    parser.add_argument("--format", choices=("xlsx", "csv"), default="xlsx")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes to use")
+    parser.add_argument("--allocation", choices=list(_allocations), default="greedy",
+                        help="admit in order to the first timeslot with spots left, or fill as many spots as possible")
+    parser.add_argument("--stats", action="store_true", help="print what the time was spent on")
+    arguments = parser.parse_args(argv)
+
+    try:
+        summaries = admit_openings(_openings(arguments), arguments.processes)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    for summary in summaries:
+        slots = ", ".join(f"{name}: {summary['spots_taken'][name]}/{capacity}"
+                          for name, capacity in summary["capacities"].items())
+        print(f"{summary['registrations']} ({slots}), {summary['waiting']} waiting, {summary['remarks']} remarks, "
+              f"{summary['seconds']:.1f}s -> {summary['output']}")
+        if summary["stats"] is not None:
+            print(summary["stats"])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,396 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from string import ascii_lowercase
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from admittance import OpeningAdmittance, LimitedTimeslot, iter_registrations, read_people_table, \
+    read_registrations, sorted_registrations, _normalise
+from form_data import Registration
+
+
+def write_registrations(file_path: str, count: int, seed: int = 0):
+    """
+    Writes `count` made up registrations in the format of the Google Forms export, roughly in timestamp order
+    """
+    rng = random.Random(seed)
+    start = datetime(2022, 8, 18, 18)
+    with open(file_path, 'w', newline='', encoding="utf-8") as registration_file:
+        writer = csv.writer(registration_file)
+        writer.writerow(["Timestamp", "Email Address", "Name", "Timeslots"])
+        for i in range(count):
+            timestamp = start + timedelta(seconds=i + rng.randint(-30, 30))
+            first_name, last_name = (''.join(rng.choices(ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2))
+            writer.writerow([
+                timestamp.strftime('%d/%m/%Y %H:%M:%S'),
+                f"{first_name}.{last_name}@gmail.com",
+                f"{first_name.title()} {last_name.title()}",
+                ", ".join(rng.sample(["10:00-11:00", "11:00-12:00"], rng.randint(1, 2))),
+            ])
+
+
+_syllables = [
+    "an", "ka", "ri", "ol", "per", "ma", "lin", "jo", "han", "sen", "ber", "ing", "vik", "stad", "mo", "el", "ta",
+    "nor", "dal", "li", "sa", "tor", "em", "ru", "gun", "hil", "da", "kri", "st", "ine", "bj", "ørn", "ah", "mad",
+    "chen", "wei", "xu", "ng", "yu", "ko", "fer", "nan", "dez", "go", "mez", "sch", "mit", "ul", "rich", "lu", "ca",
+    "pi", "ot", "rov", "iva", "no", "va", "ki", "mu", "ra", "zh", "ang", "oh", "bar", "tel", "que", "wa", "fi", "ja",
+    "tu", "eg", "ge", "ho", "be", "ur", "sk", "ås", "æ", "ve", "dy", "ph", "il", "az", "yo", "sh", "ev",
+]
+_domains = ["gmail.com", "hotmail.com", "stud.ntnu.no", "outlook.com", "yahoo.com", "gmail.con", "ntnu.no"]
+_timeslots = ["10:00-11:00", "11:00-12:00", "12:00-13:00"]
+
+
+def _made_up_name(rng: random.Random) -> str:
+    sub_names = [''.join(rng.choices(_syllables, k=rng.randint(2, 3))) for _ in range(rng.randint(1, 2))]
+    sub_names += [''.join(rng.choices(_syllables, k=rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+    return ' '.join(sub_names)
+
+
+def _made_up_email(rng: random.Random, name: str) -> str:
+    sub_names = name.split(' ')
+    local = rng.choice([
+        f"{sub_names[0]}.{sub_names[-1]}",
+        f"{sub_names[0]}{sub_names[-1]}{rng.randint(1, 99)}",
+        f"{sub_names[0][0]}{sub_names[-1]}",
+        f"{sub_names[-1]}_{sub_names[0]}",
+    ])
+    return f"{local}@{rng.choice(_domains)}"
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    i = rng.randrange(len(text))
+    return rng.choice([
+        text[:i] + text[i + 1:],  # deletion
+        text[:i] + rng.choice(ascii_lowercase) + text[i:],  # insertion
+        text[:i] + rng.choice(ascii_lowercase) + text[i + 1:],  # substitution
+        text[:i] + text[i + 1:i + 2] + text[i:i + 1] + text[i + 2:],  # swapped neighbours
+    ])
+
+
+def _near_duplicate(rng: random.Random, name: str, email: str) -> Tuple[str, str]:
+    # the same person registering again without quite getting it the same
+    sub_names = name.split(' ')
+    kind = rng.random()
+    if kind < 0.3:
+        rng.shuffle(sub_names)  # last name first
+        return ' '.join(sub_names), email
+    if kind < 0.6:
+        return _typo(rng, name), email
+    if kind < 0.8:
+        return name, _typo(rng, email)
+    return name, _made_up_email(rng, name)  # another email address
+
+
+def write_opening(directory: str, count: int, seed: int = 0) -> Dict[str, str]:
+    """
+    Writes the files of a made up opening to `directory`: `count` registrations in the format of the Google Forms
+    export, with re-registrations, near duplicates (typos, reordered names, other emails) and timestamps slightly out
+    of order, along with a ban list, a down prioritised list and the confirmed duplicates among them
+    :return: the paths of the files written, by the names used in main.py
+    """
+    rng = random.Random(seed)
+    start = datetime(2022, 8, 18, 18)
+    people: List[Tuple[str, str]] = []
+    confirmed_duplicates: List[Tuple[str, str]] = []
+    paths = {name: os.path.join(directory, f"{name}.csv")
+             for name in ("registrations", "banlist", "downprioritized", "confirmed_duplicates")}
+    with open(paths["registrations"], 'w', newline='', encoding="utf-8") as registration_file:
+        writer = csv.writer(registration_file)
+        writer.writerow(["Timestamp", "Email Address", "Name", "Timeslots", "Student type", "Erasmus", "Nationality",
+                         "SiT residency"])
+        for i in range(count):
+            kind = rng.random()
+            if people and kind < 0.05:
+                name, email = rng.choice(people)  # registering again, maybe for other timeslots
+            elif people and kind < 0.09:
+                name, email = _near_duplicate(rng, *rng.choice(people))
+                if rng.random() < 0.5:
+                    confirmed_duplicates.append((name, email))
+            else:
+                name = _made_up_name(rng)
+                email = _made_up_email(rng, name)
+                people.append((name, email))
+            timestamp = start + timedelta(seconds=3 * i + rng.randint(-20, 20))
+            writer.writerow([
+                timestamp.strftime('%d/%m/%Y %H:%M:%S'),
+                email if rng.random() < 0.8 else email.upper(),
+                name.title() if rng.random() < 0.7 else name,
+                ", ".join(rng.sample(_timeslots, rng.randint(1, len(_timeslots)))),
+                rng.choice(["Bachelor", "Master", "PhD", ""]),
+                rng.choice(["yes", "no"]),
+                "",
+                rng.choice(["yes", "no"]),
+            ])
+
+    def write_people_list(file_path: str, listed: List[Tuple[str, str]]):
+        with open(file_path, 'w', newline='', encoding="utf-8") as people_file:
+            writer = csv.writer(people_file)
+            writer.writerow(["Timestamp", "Email Address", "Name"])
+            writer.writerows((start.strftime('%d/%m/%Y %H:%M:%S'), email, name) for name, email in listed)
+
+    # some of those listed register under a slightly different name or email, some don't register at all
+    banned = [rng.choice(people) for _ in range(max(count // 100, 1))]
+    banned = [_near_duplicate(rng, *person) if rng.random() < 0.3 else person for person in banned]
+    banned += [(name := _made_up_name(rng), _made_up_email(rng, name)) for _ in range(max(count // 200, 1))]
+    write_people_list(paths["banlist"], banned)
+    down_prioritised = [rng.choice(people) for _ in range(max(count // 20, 1))]
+    down_prioritised = [_near_duplicate(rng, *person) if rng.random() < 0.2 else person for person in down_prioritised]
+    write_people_list(paths["downprioritized"], down_prioritised)
+    with open(paths["confirmed_duplicates"], 'w', newline='', encoding="utf-8") as duplicates_file:
+        writer = csv.writer(duplicates_file)
+        writer.writerow(["Name", "Email Address"])
+        writer.writerows(confirmed_duplicates)
+    return paths
+
+
+def benchmark_pipeline(count: int, seed: int = 0, workers: int = 1) -> Dict[str, float]:
+    """
+    Seconds spent on each phase of admitting a made up opening of `count` registrations the way main.py does.
+    auto_admit includes the _preprocess_and_mark it calls
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_opening(directory, count, seed)
+
+        start = time.perf_counter()
+        registrations = read_registrations(paths["registrations"])
+        timings["read_registrations"] = time.perf_counter() - start
+        registrations.sort(key=attrgetter("timestamp"))
+
+        capacity = int(count * 0.6) // len(_timeslots) + 1
+        admittance = OpeningAdmittance({timeslot: LimitedTimeslot(capacity) for timeslot in _timeslots},
+                                       workers=workers)
+        admittance.banned.update(read_people_table(paths["banlist"], name_column=2, email_column=1))
+        admittance.timeslots[_timeslots[0]].disallowed = read_people_table(
+            paths["downprioritized"], name_column=2, email_column=1
+        )
+        admittance.confirmed_duplicates = set(read_people_table(paths["confirmed_duplicates"], 0, 1))
+
+        preprocess_and_mark = admittance._preprocess_and_mark
+
+        def timed_preprocess_and_mark(*args, **kwargs):
+            preprocess_start = time.perf_counter()
+            try:
+                return preprocess_and_mark(*args, **kwargs)
+            finally:
+                timings["_preprocess_and_mark"] = time.perf_counter() - preprocess_start
+
+        admittance._preprocess_and_mark = timed_preprocess_and_mark
+        start = time.perf_counter()
+        admittance.auto_admit(registrations)
+        timings["auto_admit"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        admittance.write_to_spreadsheets(directory)
+        timings["write_to_spreadsheets"] = time.perf_counter() - start
+    return {phase: timings[phase]
+            for phase in ("read_registrations", "_preprocess_and_mark", "auto_admit", "write_to_spreadsheets")}
+
+
+def regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                tolerance: float = 0.25, min_seconds: float = 0.05) -> List[str]:
+    """
+    :param results: seconds per phase per number of registrations, as reported by `benchmark.py --pipeline`
+    :param baseline: earlier results to compare with
+    :param tolerance: the fraction a phase may be slower than in the baseline
+    :param min_seconds: differences below this are noise
+    :return: a line for every phase slower than the baseline allows
+    """
+    slower = []
+    for count, timings in results.items():
+        for phase, seconds in timings.items():
+            if (baseline_seconds := baseline.get(count, {}).get(phase)) is None:
+                continue
+            if seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds > min_seconds:
+                slower.append(f"{phase} with {count} registrations: {seconds:.3f}s, was {baseline_seconds:.3f}s")
+    return slower
+
+
+def _strptime_registrations(file_path: str) -> List[Registration]:
+    # The reader as it was before the timestamp parser and streaming, for reference
+    with open(file_path, encoding="utf-8") as registration_file:
+        next(reader := csv.reader(registration_file))
+        return [
+            Registration(
+                _normalise(name),
+                _normalise(mail),
+                datetime.strptime(timestamp, '%d/%m/%Y %H:%M:%S'),
+                [timeslot.replace(' ', '') for timeslot in timeslots.split(',')])
+            for timestamp, mail, name, timeslots, *_ in reader
+        ]
+
+
+@dataclass(frozen=True, eq=True)
+class _DataclassPerson:
+    # Person and Registration as they were before being slotted, for reference
+    name: str
+    email: str
+
+    @property
+    def person(self):
+        return _DataclassPerson(self.name, self.email)
+
+
+@dataclass(frozen=True)
+class _DataclassRegistration(_DataclassPerson):
+    timestamp: datetime = field(compare=False)
+    timeslots: List[str] = field(compare=False)
+
+    def __eq__(self, other: "_DataclassRegistration"):
+        return self.person.__eq__(other.person)
+
+
+def _timed(function: Callable[[], object], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_readers(count: int = 100_000) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "registrations.csv")
+        write_registrations(file_path, count)
+
+        def sort_strptime_registrations():
+            registrations = [r.registration for r in _strptime_registrations(file_path)]
+            registrations.sort(key=lambda reg: reg.timestamp)
+
+        def sort_registrations():
+            registrations = read_registrations(file_path)
+            registrations.sort(key=lambda reg: reg.timestamp)
+
+        return {
+            "strptime list": _timed(lambda: _strptime_registrations(file_path)),
+            "read_registrations": _timed(lambda: read_registrations(file_path)),
+            "iter_registrations": _timed(lambda: sum(1 for _ in iter_registrations(file_path))),
+            "strptime list, copied and sorted": _timed(sort_strptime_registrations),
+            "read_registrations, sorted": _timed(sort_registrations),
+            "sorted_registrations": _timed(lambda: sum(1 for _ in sorted_registrations(file_path))),
+            "sorted_registrations in chunks of 10 000": _timed(
+                lambda: sum(1 for _ in sorted_registrations(file_path, chunk_size=10_000))
+            ),
+        }
+
+
+def benchmark_records(count: int = 100_000) -> Dict[str, float]:
+    """
+    Bytes per registration kept together with the person registering, like in _preprocess_and_mark, and seconds spent
+    on the lookups it makes with them
+    """
+    rng = random.Random(0)
+    # about every other registration is by someone who registered before
+    numbers = [(rng.randrange(count // 2), rng.randrange(count // 2)) for _ in range(count)]
+    timestamp, timeslots = datetime(2022, 8, 18, 18), ["10:00-11:00"]
+    results = {}
+    for name, registration_type in (("dataclass", _DataclassRegistration), ("slotted", Registration)):
+        tracemalloc.start()
+        # new strings for every registration, as when read from a file
+        registrations = [registration_type(f"person {name_number} nordmann", f"person{email_number}@gmail.com",
+                                           timestamp, timeslots)
+                         for email_number, name_number in numbers]
+        people = [registration.person for registration in registrations]
+        results[f"{name} bytes per registration"] = tracemalloc.get_traced_memory()[0] / count
+        tracemalloc.stop()
+        del people
+
+        def look_up():
+            processed = {}
+            for registration in registrations:
+                if (person := registration.person) in processed:
+                    processed[person] == registration
+                processed[person] = registration
+
+        results[f"{name} lookups"] = _timed(look_up)
+    return results
+
+
+def benchmark_screening(count: int = 2_000, workers: Optional[int] = None) -> Dict[str, float]:
+    """
+    Seconds spent preprocessing the registrations, comparing them one at a time and spread over worker processes
+    """
+    from ngram_matrix import NGramMatrix  # needs numpy, only imported when screening is benchmarked
+
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "registrations.csv")
+        write_registrations(file_path, count)
+        registrations = list(sorted_registrations(file_path))
+
+    def preprocess(worker_count: int, prefilter: Optional[NGramMatrix] = None):
+        admittance = OpeningAdmittance({"10:00-11:00": LimitedTimeslot(50), "11:00-12:00": LimitedTimeslot(60)},
+                                       workers=worker_count, screening_prefilter=prefilter)
+        admittance.banned.update(registration.person for registration in registrations[::100])
+        admittance._preprocess_and_mark(registrations)
+
+    return {
+        "one process": _timed(lambda: preprocess(1), repeat=1),
+        f"{workers} processes": _timed(lambda: preprocess(workers), repeat=1),
+        "one process, n-gram matrix prefilter": _timed(lambda: preprocess(1, NGramMatrix()), repeat=1),
+        f"{workers} processes, n-gram matrix prefilter": _timed(lambda: preprocess(workers, NGramMatrix()), repeat=1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times the admittance system on made up registrations")
+    parser.add_argument("count", nargs='?', type=int, default=100_000,
+                        help="registrations for the benchmarks of the readers, records and screening")
+    parser.add_argument("--pipeline", nargs='*', type=int, metavar="COUNT",
+                        help="time every phase of admitting an opening of each COUNT registrations instead, "
+                             "by default 1 000 and 5 000. Larger ones like 100 000 take hours")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the made up openings")
+    parser.add_argument("--workers", type=int, default=1, help="processes screening registrations in the pipeline")
+    parser.add_argument("--output", help="write the timings of the pipeline to this JSON file")
+    parser.add_argument("--baseline", help="fail if the pipeline is slower than in this JSON file from --output")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the fraction a phase may be slower than in the baseline")
+    arguments = parser.parse_args()
+
+    if arguments.pipeline is None:
+        registration_count = arguments.count
+        print(f"Reading {registration_count} registrations")
+        for name, seconds in benchmark_readers(registration_count).items():
+            print(f"{name:>45}: {seconds:.3f}s")
+        print(f"Making and looking up {registration_count} registrations")
+        for name, value in benchmark_records(registration_count).items():
+            print(f"{name:>45}: {value:.3f}")
+        print(f"Preprocessing {min(registration_count, 2_000)} registrations")
+        for name, seconds in benchmark_screening(min(registration_count, 2_000)).items():
+            print(f"{name:>45}: {seconds:.3f}s")
+        sys.exit()
+
+    results = {}
+    for registration_count in arguments.pipeline or [1_000, 5_000]:
+        print(f"Admitting {registration_count} registrations", file=sys.stderr)
+        results[str(registration_count)] = benchmark_pipeline(registration_count, arguments.seed,
+                                                                  arguments.workers)
+        for name, seconds in results[str(registration_count)].items():
+            print(f"{name:>45}: {seconds:.3f}s", file=sys.stderr)
+    report = {"seed": arguments.seed, "workers": arguments.workers, "python": platform.python_version(),
+              "results": results}
+    if arguments.output:
+        with open(arguments.output, 'w', encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if arguments.baseline:
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("seed") != arguments.seed:
+            print(f"The baseline was made with seed {baseline.get('seed')}, not {arguments.seed}", file=sys.stderr)
+            sys.exit(2)
+        if slower := regressions(results, baseline["results"], arguments.tolerance):
+            print("Slower than the baseline:", *slower, sep="\n    ", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,381 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from functools import lru_cache
+from math import floor
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from form_data import Person, identity_key
+
+
+def _ngrams(text: str, n: int) -> Counter:
+    return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def _sub_name_ngrams(name: str, n: int) -> Counter:
+    # Pad every sub-name with the separating space, this way the n-grams of any permutation of the sub-names
+    # (which is what Person.similar compares against) are a subset of these, except for those spanning a whole space
+    grams = Counter()
+    for sub_name in name.split(' '):
+        grams.update(_ngrams(f" {sub_name} ", n))
+    return grams
+
+
+def _max_edits(length_a: int, length_b: int, similarity_threshold: float) -> int:
+    """
+    The largest number of unmatched characters two strings can have and still have a SequenceMatcher ratio above
+    the threshold. ratio = 2M / (|a| + |b|) > t  <=>  |a| + |b| - 2M < (1 - t) * (|a| + |b|)
+    """
+    return floor((1 - similarity_threshold) * (length_a + length_b) + 1e-9)  # err on the side of too many edits
+
+
+def _guaranteed_shared(length_a: int, length_b: int, similarity_threshold: float, gram_size: int) -> Optional[int]:
+    """
+    The least number of n-grams two strings of the given lengths share if their SequenceMatcher ratio is above the
+    threshold, or None if the lengths alone rule that out.
+    An unmatched character of a breaks at most n of a's n-grams, while any number of unmatched characters of b
+    squeezed in between two matched characters of a breaks at most the n - 1 n-grams spanning that gap.
+    """
+    if length_a + length_b == 0:
+        return 0
+    # the number of unmatched characters, |a| + |b| - 2M, has the same parity as |a| + |b| and is at least ||a| - |b||
+    edits = _max_edits(length_a, length_b, similarity_threshold)
+    edits -= (edits - length_a - length_b) % 2
+    if edits < abs(length_a - length_b):
+        return None
+    unmatched_a, unmatched_b = (edits + length_a - length_b) // 2, (edits - length_a + length_b) // 2
+    return max(
+        length_a - gram_size + 1 - gram_size * unmatched_a - (gram_size - 1) * unmatched_b,
+        length_b - gram_size + 1 - gram_size * unmatched_b - (gram_size - 1) * unmatched_a,
+    )
+
+
+@lru_cache(maxsize=None)
+def _required_shared(length: int, other_length: int, similarity_threshold: float, gram_size: int,
+                     sub_names: bool) -> Optional[int]:
+    if not sub_names:
+        return _guaranteed_shared(length, other_length, similarity_threshold, gram_size)
+    # Names are compared against permutations of the other's sub-names, which can be of any length up to the full name
+    guarantees = [
+        shared for permutation_length in range(other_length + 1)
+        if (shared := _guaranteed_shared(length, permutation_length, similarity_threshold, gram_size)) is not None
+    ]
+    return min(guarantees) if guarantees else None
+
+
+class CandidateIndex(ABC):
+    """
+    Keeps track of people already processed and shortlists those that might be `similar` to a new person.
+    Candidates are returned in the order they were added, mirroring iteration over an insertion ordered dict.
+    """
+
+    @abstractmethod
+    def add(self, person: Person):
+        ...
+
+    @abstractmethod
+    def remove(self, person: Person):
+        ...
+
+    @abstractmethod
+    def candidates(self, person: Person) -> List[Person]:
+        ...
+
+
+class ExhaustiveIndex(CandidateIndex):
+    """
+    Reference mode, every person added is a candidate
+    """
+    _people: Dict[Person, None]
+
+    def __init__(self):
+        self._people = {}
+
+    def add(self, person: Person):
+        self._people[person] = None
+
+    def remove(self, person: Person):
+        self._people.pop(person, None)
+
+    def candidates(self, person: Person) -> List[Person]:
+        return list(self._people)
+
+
+class ShortlistIndex(CandidateIndex):
+    """
+    Shortlists from lists made beforehand, e.g. by ngram_matrix.NGramMatrix for a whole batch of people at once.
+    The people added are kept in `index` as well, which shortlists for those without a list
+    """
+    index: CandidateIndex
+    _shortlists: Dict[Person, List[Person]]  # person: everyone that might be similar to them, in any order
+    _order: Dict[Person, int]  # person: when they were added
+
+    def __init__(self, index: CandidateIndex, shortlists: Dict[Person, List[Person]], people: Iterable[Person] = ()):
+        """
+        :param people: those already in `index`, in the order they were added
+        """
+        self.index = index
+        self._shortlists = shortlists
+        self._order = {}
+        for person in people:
+            self._order[person] = len(self._order)
+        self._next_order = len(self._order)
+
+    def add(self, person: Person):
+        self.index.add(person)
+        if person not in self._order:
+            self._order[person] = self._next_order
+            self._next_order += 1
+
+    def remove(self, person: Person):
+        self.index.remove(person)
+        self._order.pop(person, None)
+
+    def candidates(self, person: Person) -> List[Person]:
+        if (shortlist := self._shortlists.get(person)) is None:
+            return self.index.candidates(person)
+        return sorted((other for other in shortlist if other in self._order), key=self._order.__getitem__)
+
+
+class NGramIndex(CandidateIndex):
+    """
+    Blocks on shared character n-grams of names and emails.
+
+    Every unmatched character can break at most `gram_size` n-grams, so a pair of strings with a SequenceMatcher ratio
+    above the threshold must share a minimum number of n-grams. Only people passing that count filter on either their
+    email or their name are shortlisted, which makes the shortlist lossless for any `similarity_threshold` at or above
+    the one the index was made for.
+
+    By default `candidates(person)` shortlists the people `p` for which `person.similar(p)` might hold. With `reverse`
+    it is the other way around, the people `p` for which `p.similar(person)` might hold.
+    """
+    similarity_threshold: float
+    gram_size: int
+    reverse: bool
+    _people: Dict[int, Person]
+    _ids: Dict[Person, int]
+    _keys: Dict[int, Tuple[int, Tuple[int, int]]]  # id: (email length, (name length, number of spaces in name))
+    _grams: Dict[int, Tuple[Counter, Counter]]  # id: (email n-grams, name n-grams)
+
+    def __init__(self, similarity_threshold: float = 0.9, gram_size: int = 3, reverse: bool = False):
+        self.similarity_threshold = similarity_threshold
+        self.gram_size = gram_size
+        self.reverse = reverse
+        self._next_id = 0
+        self._people = {}
+        self._ids = {}
+        self._keys = {}
+        self._grams = {}
+        self._email_postings = defaultdict(dict)
+        self._name_postings = defaultdict(dict)
+        self._email_keys = defaultdict(set)
+        self._name_keys = defaultdict(set)
+
+    def __len__(self):
+        return len(self._people)
+
+    def __contains__(self, person: Person):
+        return person in self._ids
+
+    def _name_ngrams(self, name: str, compared: bool) -> Counter:
+        # The name which permutations are compared against is covered by the n-grams of its padded sub-names
+        return _sub_name_ngrams(name, self.gram_size) if compared else _ngrams(name, self.gram_size)
+
+    def _uncovered(self, spaces: int) -> int:
+        # n-grams of a compared permutation spanning a whole space between two sub-names, one per space in the name
+        # it is compared with
+        return spaces * max(self.gram_size - 2, 0)
+
+    def add(self, person: Person):
+        if person in self._ids:
+            return
+        person_id = self._next_id
+        self._next_id += 1
+        self._people[person_id] = person
+        self._ids[person] = person_id
+        self._keys[person_id] = (email_key, name_key) = (len(person.email), (len(person.name), person.name.count(' ')))
+        self._grams[person_id] = (
+            email_grams := _ngrams(person.email, self.gram_size),
+            name_grams := self._name_ngrams(person.name, compared=not self.reverse)
+        )
+        for gram, count in email_grams.items():
+            self._email_postings[gram][person_id] = count
+        for gram, count in name_grams.items():
+            self._name_postings[gram][person_id] = count
+        self._email_keys[email_key].add(person_id)
+        self._name_keys[name_key].add(person_id)
+
+    def remove(self, person: Person):
+        if (person_id := self._ids.pop(person, None)) is None:
+            return
+        del self._people[person_id]
+        email_key, name_key = self._keys.pop(person_id)
+        email_grams, name_grams = self._grams.pop(person_id)
+        for grams, postings in ((email_grams, self._email_postings), (name_grams, self._name_postings)):
+            for gram in grams:
+                del postings[gram][person_id]
+                if not postings[gram]:
+                    del postings[gram]
+        for key, keys in ((email_key, self._email_keys), (name_key, self._name_keys)):
+            keys[key].discard(person_id)
+            if not keys[key]:
+                del keys[key]
+
+    def candidates(self, person: Person) -> List[Person]:
+        threshold, gram_size = self.similarity_threshold, self.gram_size
+        length, spaces = len(person.name), person.name.count(' ')
+
+        def required_email(other_length: int) -> Optional[int]:
+            return _required_shared(len(person.email), other_length, threshold, gram_size, False)
+
+        def required_name(other_key: Tuple[int, int]) -> Optional[int]:
+            other_length, other_spaces = other_key
+            if self.reverse:
+                required = _required_shared(other_length, length, threshold, gram_size, True)
+                uncovered = self._uncovered(other_spaces)
+            else:
+                required = _required_shared(length, other_length, threshold, gram_size, True)
+                uncovered = self._uncovered(spaces)
+            return None if required is None else required - uncovered
+
+        shortlist = self._shortlist(
+            _ngrams(person.email, gram_size), required_email, self._email_postings, self._email_keys, 0
+        )
+        shortlist |= self._shortlist(
+            self._name_ngrams(person.name, compared=self.reverse), required_name,
+            self._name_postings, self._name_keys, 1
+        )
+        return [self._people[person_id] for person_id in sorted(shortlist)]
+
+    def _shortlist(self, grams: Counter, required_for: Callable[[Hashable], Optional[int]],
+                   postings: Dict[str, Dict[int, int]], keys: Dict[Hashable, Set[int]], field: int) -> Set[int]:
+        shortlist = set()
+        required_shared = {}  # other key: least number of n-grams that must be shared with a similar string
+        for other_key, person_ids in keys.items():
+            if (required := required_for(other_key)) is None:
+                continue
+            if required <= 0:
+                shortlist.update(person_ids)  # too short to tell anything apart by n-grams
+            else:
+                required_shared[other_key] = required
+        if not required_shared:
+            return shortlist
+
+        # Leave out the most common n-grams (think "gmail.com") as long as every similar string still has to share at
+        # least one of the remaining ones
+        grams = sorted(grams.items(), key=lambda gram_count: len(postings.get(gram_count[0], ())))
+        skipped, skip_budget = 0, min(required_shared.values()) - 1
+        while grams and skipped + grams[-1][1] <= skip_budget:
+            skipped += grams.pop()[1]
+
+        shared = defaultdict(int)
+        for gram, count in grams:
+            for person_id, other_count in postings.get(gram, {}).items():
+                shared[person_id] += min(count, other_count)
+        for person_id, shared_count in shared.items():
+            required = required_shared.get(self._keys[person_id][field])
+            if required is not None and shared_count >= required - skipped:
+                shortlist.add(person_id)
+        return shortlist
+
+
+class WatchlistIndex:
+    """
+    A set of people to look out for, like the ban list or a timeslot's down prioritised list.
+    Looking up someone on the list is O(1), as is looking up the same person written differently by their identity
+    key, and people on the list that someone might be are shortlisted through a reversed NGramIndex before being
+    compared with `Person.similar`.
+    """
+    similarity_threshold: float
+    _people: Dict[Person, None]
+    _identities: Dict[Tuple[str, str], Person]  # identity key: the first person on the list with it
+    _index: NGramIndex
+
+    def __init__(self, people: Iterable[Person] = (), similarity_threshold: float = 0.9):
+        self.similarity_threshold = similarity_threshold
+        self._people = {}
+        self._identities = {}
+        self._index = NGramIndex(similarity_threshold, reverse=True)
+        self.update(people)
+
+    def __contains__(self, person: Person):
+        return person in self._people
+
+    def __iter__(self) -> Iterator[Person]:
+        return iter(self._people)
+
+    def __len__(self):
+        return len(self._people)
+
+    def __str__(self):
+        return f"WatchlistIndex({', '.join(map(str, self._people))})"
+
+    def __repr__(self):
+        return f"WatchlistIndex({', '.join(map(repr, self._people))})"
+
+    def add(self, person: Person):
+        self._people[person] = None
+        self._identities.setdefault(identity_key(person), person)
+        self._index.add(person)
+
+    def update(self, people: Iterable[Person]):
+        for person in people:
+            self.add(person)
+
+    def discard(self, person: Person):
+        self._people.pop(person, None)
+        if self._identities.get(key := identity_key(person)) == person:
+            del self._identities[key]
+            # someone else on the list might have the same key, they are looked for since removing is rare
+            if (other := next((other for other in self._people if identity_key(other) == key), None)) is not None:
+                self._identities[key] = other
+        self._index.remove(person)
+
+    def clear(self):
+        self._people.clear()
+        self._identities.clear()
+        self._index = NGramIndex(self.similarity_threshold, reverse=True)
+
+    def identical(self, person: Person) -> Optional[Person]:
+        """
+        :return: the first person on the list with the same identity key as `person`, see form_data.identity_key
+        """
+        return self._identities.get(identity_key(person))
+
+    def candidates(self, person: Person) -> List[Person]:
+        """
+        :return: the people on the list, in the order they were added, that `person` might be, before comparing them
+        """
+        return self._index.candidates(person)
+
+    def _shortlisted(self, person: Person, shortlist: Optional[Iterable[Person]]) -> Iterable[Person]:
+        if shortlist is None:
+            return self.candidates(person)
+        return (listed_person for listed_person in shortlist if listed_person in self._people)
+
+    def suspects(self, person: Person, similar: Callable[[Person, Person, float], bool] = Person.similar,
+                 shortlist: Optional[Iterable[Person]] = None) -> List[Person]:
+        """
+        :param person: the person to look for
+        :param similar: used in place of Person.similar, e.g. SimilarityCache.similar
+        :param shortlist: compare with these instead of the candidates, in the order they were added to the list,
+                          e.g. shortlisted beforehand by ngram_matrix.NGramMatrix. Those not on the list are skipped
+        :return: the people on the list, in the order they were added, that `person` might be
+        """
+        return [
+            listed_person for listed_person in self._shortlisted(person, shortlist)
+            if similar(listed_person, person, self.similarity_threshold)
+        ]
+
+    def suspect(self, person: Person, similar: Callable[[Person, Person, float], bool] = Person.similar,
+                shortlist: Optional[Iterable[Person]] = None) -> Optional[Person]:
+        """
+        :param person: the person to look for
+        :param similar: used in place of Person.similar, e.g. SimilarityCache.similar
+        :param shortlist: compare with these instead of the candidates, see `suspects`
+        :return: the first person on the list that `person` might be, if any
+        """
+        for listed_person in self._shortlisted(person, shortlist):
+            if similar(listed_person, person, self.similarity_threshold):
+                return listed_person
+        return None
@@ -0,0 +1,49 @@
+"""
+Helpers shared by the tests
+"""
+import random
+from typing import Callable, List
+
+import pytest
+
+from form_data import Person
+
+_first_names = ["ola", "kari", "halvor", "klara", "per", "anne", "jon", "marit", "lars", "ingrid", "kate", "ruben"]
+_last_names = ["nordmann", "smedås", "bakken", "schlüter", "hansen", "johansen", "olsen", "larsen", "berg", "mccoy"]
+_domains = ["gmail.com", "hotmail.com", "stud.ntnu.no", "restore-trd.no", "gmail.con"]
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    if not text:
+        return text
+    i = rng.randrange(len(text))
+    return rng.choice([
+        text[:i] + text[i + 1:],  # deletion
+        text[:i] + rng.choice("abcdeø ") + text[i:],  # insertion
+        text[:i] + rng.choice("abcdeø") + text[i + 1:],  # substitution
+    ])
+
+
+def _random_people(seed: int, count: int) -> List[Person]:
+    rng = random.Random(seed)
+    people = []
+    for _ in range(count):
+        if people and rng.random() < 0.3:  # make a near duplicate of someone
+            original = rng.choice(people)
+            sub_names = original.name.split(' ')
+            rng.shuffle(sub_names)
+            people.append(Person(_typo(rng, ' '.join(sub_names)), _typo(rng, original.email)))
+            continue
+        sub_names = [rng.choice(_first_names) for _ in range(rng.randint(1, 2))]
+        sub_names += [rng.choice(_last_names) for _ in range(rng.randint(1, 3))]
+        email = f"{rng.choice(sub_names)}{rng.choice(['', '.', '_'])}{rng.choice(sub_names)}@{rng.choice(_domains)}"
+        people.append(Person(' '.join(sub_names), email))
+    return people
+
+
+@pytest.fixture
+def random_people() -> Callable[[int, int], List[Person]]:
+    """
+    Made up people, about a third of them near duplicates of earlier ones: random_people(seed, count)
+    """
+    return _random_people
@@ -1 +1,71 @@
-import xlrd
+"""
+Rows of the first sheet of a spreadsheet, one at a time, for util.read_table. The libraries reading them are only
+imported when a spreadsheet of their kind is read
+"""
+import zipfile
+from datetime import datetime
+from typing import Any, Iterator, List
+from xml.etree.ElementTree import iterparse
+
+_TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+_OFFICE = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+def iter_xlsx_rows(file_path: str) -> Iterator[List[Any]]:
+    import openpyxl as xl
+
+    workbook = xl.load_workbook(file_path, read_only=True, data_only=True)  # streamed from the file as iterated
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_xls_rows(file_path: str) -> Iterator[List[Any]]:
+    import xlrd  # old binary workbooks, which are read whole
+
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+        for row in range(sheet.nrows):
+            yield [
+                xlrd.xldate_as_datetime(cell.value, workbook.datemode) if cell.ctype == xlrd.XL_CELL_DATE else cell.value
+                for cell in sheet.row(row)
+            ]
+    finally:
+        workbook.release_resources()
+
+
+def _ods_cell(cell) -> Any:
+    if cell.get(f"{_OFFICE}value-type") == "date":
+        return datetime.fromisoformat(cell.get(f"{_OFFICE}date-value"))
+    return "\n".join("".join(paragraph.itertext()) for paragraph in cell.iter(f"{_TEXT}p"))
+
+
+def iter_ods_rows(file_path: str) -> Iterator[List[Any]]:
+    """
+    Parses the content of the OpenDocument spreadsheet as it is unzipped, letting go of every row once read. Repeated
+    cells are repeated, empty rows are left out along with the empty cells ending a row
+    """
+    with zipfile.ZipFile(file_path) as spreadsheet, spreadsheet.open("content.xml") as content:
+        tables = 0
+        for event, element in iterparse(content, events=("start", "end")):
+            if element.tag == f"{_TABLE}table":
+                if event == "start":
+                    tables += 1
+                elif tables == 1:
+                    return  # only the first sheet
+            if event != "end" or tables != 1 or element.tag != f"{_TABLE}table-row":
+                continue
+            row = []
+            for cell in element:
+                if cell.tag in (f"{_TABLE}table-cell", f"{_TABLE}covered-table-cell"):
+                    row.extend([_ods_cell(cell)] * int(cell.get(f"{_TABLE}number-columns-repeated", 1)))
+            while row and row[-1] == '':
+                row.pop()
+            if row:
+                for _ in range(int(element.get(f"{_TABLE}number-rows-repeated", 1))):
+                    yield row
+            element.clear()
@@ -1,61 +1,239 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
 import datetime
 from difflib import SequenceMatcher
+from functools import lru_cache
 from itertools import permutations
+import sys
+import unicodedata
+from typing import Iterator, Optional, Tuple
+
+# Bump whenever a change to Person.similar or the name matchers could change a verdict, this invalidates saved caches
+SIMILARITY_VERSION = 1
+
+@dataclass
+class SimilarityStats:
+    """
+    What Person.similar did while counting, see `counting_similarity`
+    """
+    similar_calls: int = 0
+    quick_ratio_rejections: int = 0  # permutations skipped on SequenceMatcher.quick_ratio alone
+    permutations: int = 0  # permutations of names evaluated
+
+
+_similarity_stats: Optional[SimilarityStats] = None  # counted into by Person.similar while set
+
+
+@contextmanager
+def counting_similarity(stats: SimilarityStats) -> Iterator[SimilarityStats]:
+    """
+    Counts the calls to Person.similar in this process into `stats` until the end of the with block
+    """
+    global _similarity_stats
+    previous, _similarity_stats = _similarity_stats, stats
+    try:
+        yield stats
+    finally:
+        _similarity_stats = previous
+
 
 def _seq_ignore_space(c: str):
     return c in " \t\r\n"
 
 
-@dataclass(frozen=True, eq=True)
+@lru_cache(maxsize=65536)
+def _matching_characters(a: str, b: str) -> int:
+    # sub-names repeat a lot between people ("ola", "hansen", ...), so remembering these pays off
+    return sum(block.size for block in SequenceMatcher(_seq_ignore_space, a, b).get_matching_blocks())
+
+
+def _permutation_name_similarity(a: Person, b: Person, similarity_threshold: float) -> bool:
+    # Evaluate all permutations of b's name consisting of same number of sub-names as a
+    #   Example:    a:  Ola Nordmann
+    #               b:  Per Nordmann Ola
+    #       This will make permutations of b of length: len("Ola Nordmann".split(' ')) = 2
+    #       Permutations made: (Per Nordmann, Per Ola, Nordmann Per, Nordmann Ola, Ola Per, Ola Nordmann)
+
+    name_similarity = 0
+    stats = _similarity_stats
+    seqm = SequenceMatcher(_seq_ignore_space, a.name)
+    for name in (' '.join(name_part) for name_part in permutations(b.sub_names, len(a.sub_names))):
+        seqm.set_seq2(name)
+        if stats is not None:
+            stats.permutations += 1
+        if seqm.quick_ratio() < similarity_threshold:  # skip if sets of character doesn't match enough
+            if stats is not None:
+                stats.quick_ratio_rejections += 1
+            continue
+        if (ratio := seqm.ratio()) > name_similarity:
+            name_similarity = ratio
+            if name_similarity > similarity_threshold:
+                return True
+    return False
+
+
+def _token_assignment_name_similarity(a: Person, b: Person, similarity_threshold: float) -> bool:
+    # Match every sub-name of a to a distinct sub-name of b, the same pairing the permutations above would try, but
+    # scored per pair of sub-names: the joined names then match in the sum of the pairs' matching characters plus the
+    # separating spaces. The best pairing for every subset of b's sub-names is found by dynamic programming over
+    # bitmasks instead of enumerating the permutations.
+    #   Example:    a:  Ola Nordmann
+    #               b:  Per Nordmann Ola
+    #       Scores (ola, per), (ola, nordmann), (ola, ola), (nordmann, per), ... once each, and picks {ola: ola,
+    #       nordmann: nordmann} as the best pairing, compared like "Ola Nordmann" against "Ola Nordmann"
+
+    sub_names, other_sub_names = a.sub_names, b.sub_names
+    if len(sub_names) > len(other_sub_names):
+        return False
+    if len(a.name) + len(b.name) == 0:
+        return True
+    separators = len(sub_names) - 1
+
+    # best[mask]: most matching characters pairing the first popcount(mask) sub-names of a with the sub-names of b
+    # in mask
+    best = {0: 0}
+    for sub_name in sub_names:
+        matched = {}
+        for mask, matching in best.items():
+            for j, other_sub_name in enumerate(other_sub_names):
+                if mask & (bit := 1 << j):
+                    continue
+                score = matching + _matching_characters(sub_name, other_sub_name)
+                if score > matched.get(mask | bit, -1):
+                    matched[mask | bit] = score
+        best = matched
+
+    for mask, matching in best.items():
+        length = sum(len(other_sub_names[j]) for j in range(len(other_sub_names)) if mask & (1 << j)) + separators
+        if 2 * (matching + separators) / (len(a.name) + length) > similarity_threshold:
+            return True
+    return False
+
+
+_gmail_domains = {"gmail.com", "googlemail.com"}
+# letters that are not a plain letter with accents in Unicode, and so are kept by NFKD
+_folded_letters = str.maketrans({'ø': 'o', 'æ': 'ae', 'œ': 'oe', 'ß': 'ss', 'ł': 'l', 'đ': 'd', 'ð': 'd', 'þ': 'th'})
+
+
+def canonical_email(email: str) -> str:
+    """
+    The mailbox an email address delivers to: without case, spaces or +tag, and for Gmail without the dots it ignores
+    """
+    email = ''.join(email.split()).lower()
+    local, at, domain = email.rpartition('@')
+    if not at:
+        return email
+    local = local.split('+', 1)[0]
+    if domain in _gmail_domains:
+        local, domain = local.replace('.', ''), "gmail.com"
+    return f"{local}@{domain}"
+
+
+def canonical_name(name: str) -> str:
+    """
+    The name without case, accents, spaces or hyphens, e.g. "Halvor Bakken-Smedås" and "halvor bakkensmedas" are one
+    """
+    name = unicodedata.normalize("NFKD", name.casefold().translate(_folded_letters))
+    return ''.join(c for c in name if not unicodedata.combining(c) and not c.isspace() and c != '-')
+
+
+def identity_key(person: Person) -> Tuple[str, str]:
+    """
+    People with the same identity key are the same person, written differently. Both the name and the mailbox have
+    to be the same, a shared name or a shared family email alone are left to Person.similar
+    """
+    return canonical_name(person.name), canonical_email(person.email)
+
+
+# Strategies for comparing names in Person.similar
+name_matchers = {
+    "permutations": _permutation_name_similarity,
+    "token_assignment": _token_assignment_name_similarity,
+}
+
+
+@dataclass(frozen=True, eq=False)
 class Person:
+    # written out rather than dataclass(slots=True), which needs Python 3.10. The slots set in __post_init__ are not
+    # annotated, so they are not fields and arguments:
+    #   _hash: Every dict and set lookup of a person needs the hash of (name, email), compute it once
+    #   _sub_names: the words of the name, split when first compared, see sub_names
+    __slots__ = ("name", "email", "_hash", "_sub_names")
     name: str
     email: str
 
+    def __post_init__(self):
+        # The same names and emails show up again and again (duplicate entries, lists), share the strings
+        object.__setattr__(self, "name", sys.intern(self.name))
+        object.__setattr__(self, "email", sys.intern(self.email))
+        object.__setattr__(self, "_hash", hash((self.name, self.email)))
+        object.__setattr__(self, "_sub_names", None)
+
+    def __eq__(self, other: Person):
+        # Registrations are the same as the person registering
+        if isinstance(other, Person):
+            return self._hash == other._hash and self.name == other.name and self.email == other.email
+        return NotImplemented
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # pickled as the arguments it was made from, so the cached hash is computed again when unpickled, as str
+        # hashes differ between processes
+        return type(self), tuple(getattr(self, person_field.name) for person_field in fields(self) if person_field.init)
+
     @property
     def person(self):
-        return Person(self.name, self.email)
+        return self
 
-    def similar(self, other: Person, similarity_threshold: float = 0.9) -> bool:
-        # Consider permutations of name order, last name before first name etc.
+    @property
+    def sub_names(self) -> Tuple[str, ...]:
+        if self._sub_names is None:
+            object.__setattr__(self, "_sub_names", tuple(self.name.split(' ')))
+        return self._sub_names
 
+    def similar(self, other: Person, similarity_threshold: float = 0.9, name_matcher: str = "permutations") -> bool:
+        """
+        :param other: the person to compare with
+        :param similarity_threshold: ratio of matching characters above which two emails or names are similar
+        :param name_matcher: strategy used for comparing names, see `name_matchers`. Consider name order, last name
+                             before first name etc.
+        """
+        if _similarity_stats is not None:
+            _similarity_stats.similar_calls += 1
         email_similarity = SequenceMatcher(_seq_ignore_space, self.email, other.email).ratio()
         if email_similarity > similarity_threshold:
             return True
+        return name_matchers[name_matcher](self, other, similarity_threshold)
 
 
-        # Evaluate all permutations of other's name consisting of same number of sub-names as self
-        #   Example:    self:   Ola Nordmann
-        #               other:  Per Nordmann Ola
-        #       This will make permutations of other of length: len("Ola Nordmann".split(' ')) = 2
-        #       Permutations made: (Per Nordmann, Per Ola, Nordmann Per, Nordmann Ola, Ola Per, Ola Nordmann)
-
-        name_similarity = 0
-        num_sub_names = len(self.name.split(' '))
-        seqm = SequenceMatcher(_seq_ignore_space, self.name)
-        for name in (' '.join(name_part) for name_part in permutations(other.name.split(' '), num_sub_names)):
-            seqm.set_seq2(name)
-            if seqm.quick_ratio() < similarity_threshold:  # skip if sets of character doesn't match enough
-                continue
-            if (ratio := seqm.ratio()) > name_similarity:
-                name_similarity = ratio
-                if name_similarity > similarity_threshold:
-                    return True
-        return False
-
-
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Registration(Person):
-    timestamp: datetime.datetime = field(compare=False)
-    timeslots: [str] = field(compare=False)
-    # read_rules: bool = field(compare=False)
+    __slots__ = ("timestamp", "timeslots", "_person")  # _person: the person registering, see person
+    timestamp: datetime.datetime
+    timeslots: [str]
+    # read_rules: bool
 
-    def __eq__(self, other: Registration):
-        return self.person.__eq__(other.person)
+    def __post_init__(self):
+        Person.__post_init__(self)
+        object.__setattr__(self, "_person", None)
+
+    @property
+    def person(self):
+        if self._person is None:
+            # made once, sharing the strings and hash of the registration
+            person = object.__new__(Person)
+            for attribute in ("name", "email", "_hash", "_sub_names"):
+                object.__setattr__(person, attribute, getattr(self, attribute))
+            object.__setattr__(self, "_person", person)
+        return self._person
 
     @property
     def registration(self):
+        if type(self) is Registration:
+            return self
         return Registration(self.name, self.email, self.timestamp, self.timeslots)
 
 
@@ -71,11 +249,11 @@ class RegistrationExtras:
         return RegistrationExtras(self.student_type, self.erasmus, self.nationality, self.sit_residency)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class FullRegistration(RegistrationExtras, Registration):
-
-    def __eq__(self, other: FullRegistration):
-        return self.person.__eq__(other.person)
+    __slots__ = ("student_type", "erasmus", "nationality", "sit_residency")
+    __eq__ = Person.__eq__
+    __hash__ = Person.__hash__
 
 
 if __name__ == '__main__':
@@ -0,0 +1,138 @@
+"""
+Sends made up registrations to a running service.py from many connections at once, with reads of the occupancy mixed
+in, and reports the throughput and the latency of the requests, e.g.
+
+    python service.py --timeslots 10:00-11:00=5000,11:00-12:00=5000 &
+    python loadgen.py --count 20000 --connections 50
+"""
+import argparse
+import asyncio
+import json
+import random
+from string import ascii_lowercase
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def percentile(latencies: Sequence[float], fraction: float) -> float:
+    """
+    :return: the latency `fraction` of the requests were at most as slow as, by the nearest rank
+    """
+    if not latencies:
+        return 0.0
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method: str, path: str, payload=None) -> Tuple[int, object]:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split(b' ', 2)[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(':')
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+async def connect(host: str = "127.0.0.1", port: int = 8080, unix_path: Optional[str] = None) -> _Connection:
+    if unix_path is not None:
+        return _Connection(*await asyncio.open_unix_connection(unix_path))
+    return _Connection(*await asyncio.open_connection(host, port))
+
+
+def made_up_registrations(count: int, timeslot_names: Sequence[str], seed: int = 0) -> List[Dict[str, object]]:
+    rng = random.Random(seed)
+    registrations = []
+    for _ in range(count):
+        first_name, last_name = (''.join(rng.choices(ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2))
+        registrations.append({
+            "name": f"{first_name.title()} {last_name.title()}",
+            "email": f"{first_name}.{last_name}@gmail.com",
+            "timeslots": rng.sample(list(timeslot_names), rng.randint(1, len(timeslot_names))),
+        })
+    return registrations
+
+
+async def run_load(count: int = 10_000, connections: int = 20, batch_size: int = 1, read_ratio: float = 0.2,
+                   host: str = "127.0.0.1", port: int = 8080, unix_path: Optional[str] = None,
+                   seed: int = 0) -> Dict[str, float]:
+    """
+    Posts `count` registrations, `batch_size` per request, over `connections` connections each waiting for the
+    answer before sending its next request. After each post a connection reads the occupancy with the probability
+    `read_ratio`
+    :return: the registrations admitted per second, and the median and 99th percentile latencies in milliseconds of
+             the posts and reads
+    """
+    connected = [await connect(host, port, unix_path) for _ in range(connections)]
+    status, occupancy = await connected[0].request("GET", "/timeslots")
+    registrations = made_up_registrations(count, list(occupancy["timeslots"]), seed)
+    batches = [registrations[i:i + batch_size] for i in range(0, count, batch_size)]
+    rng = random.Random(seed)
+    post_latencies, read_latencies = [], []
+    decisions = {"admitted": 0, "waiting": 0, "rejected": 0}
+
+    async def send(connection: _Connection):
+        while batches:
+            batch = batches.pop()
+            start = perf_counter()
+            status, answer = await connection.request("POST", "/registrations", batch if batch_size > 1 else batch[0])
+            post_latencies.append(perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"The service answered {status}: {answer}")
+            for decision in answer if batch_size > 1 else [answer]:
+                decisions[decision["status"]] += 1
+            if rng.random() < read_ratio:
+                start = perf_counter()
+                await connection.request("GET", "/timeslots")
+                read_latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    try:
+        await asyncio.gather(*map(send, connected))
+    finally:
+        for connection in connected:
+            connection.close()
+    seconds = perf_counter() - start
+    return {
+        "registrations": count,
+        "seconds": seconds,
+        "registrations_per_second": count / seconds,
+        "requests_per_second": (len(post_latencies) + len(read_latencies)) / seconds,
+        "post_p50_ms": percentile(post_latencies, 0.5) * 1_000,
+        "post_p99_ms": percentile(post_latencies, 0.99) * 1_000,
+        "read_p50_ms": percentile(read_latencies, 0.5) * 1_000,
+        "read_p99_ms": percentile(read_latencies, 0.99) * 1_000,
+        **decisions,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the throughput and latency of a running service.py")
+    parser.add_argument("--count", type=int, default=10_000, help="registrations to send")
+    parser.add_argument("--connections", type=int, default=20, help="clients sending at the same time")
+    parser.add_argument("--batch-size", type=int, default=1, help="registrations per request")
+    parser.add_argument("--read-ratio", type=float, default=0.2, help="reads of the occupancy per registration post")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    results = asyncio.run(run_load(arguments.count, arguments.connections, arguments.batch_size,
+                                   arguments.read_ratio, arguments.host, arguments.port, arguments.unix,
+                                   arguments.seed))
+    for name, value in results.items():
+        print(f"{name:>24}: {value:.2f}" if isinstance(value, float) else f"{name:>24}: {value}")
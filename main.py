@@ -1,16 +1,21 @@
+import argparse
 import copy
 import datetime
 import os.path
-import tkinter as tk
-from tkinter import filedialog
 from typing import List
 
-from admittance import read_registrations, OpeningAdmittance, LimitedTimeslot, read_people_table
+from admittance import sorted_registrations, AdmittanceStats, OpeningAdmittance, LimitedTimeslot, read_people_table
+from candidate_index import WatchlistIndex
 from form_data import Person, FullRegistration
+from people_store import PeopleStore
+from similarity_cache import SimilarityCache
 
 def open_csv_path_if_not_exist(path: str, title: str) -> str:
     if os.path.exists(path):
         return path
+    import tkinter as tk  # only when asked for, see batch.py for running without a display
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()
     path = filedialog.askopenfilename(title=title, filetypes=[("Comma Separated Values", "*.csv"), ("All types", "*.*")])
@@ -21,38 +26,61 @@ def open_csv_path_if_not_exist(path: str, title: str) -> str:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Admits the registrations of an opening")
+    parser.add_argument("--stats", action="store_true", help="print what the time was spent on")
+    parser.add_argument("--people-store", help="the database of bans, confirmed duplicates and earlier openings to use "
+                                               "instead of the csv lists, filled from them the first time")
+    parser.add_argument("--opening", default="third opening", help="the name of this opening in the people store")
+    parser.add_argument("--workers", type=int, default=1, help="processes screening the registrations before admitting")
+    arguments = parser.parse_args()
 
     # TODO: Are you also in waiting list if you're admitted in the second time slot?
 
     # file_path = "C:/Users/halvo/Downloads/RESTORE-Second opening (Responses) - Form responses 1.csv"
     registrations_path = open_csv_path_if_not_exist("data/third_opening_registrations.csv", "Registrations")
-    ban_list_path = open_csv_path_if_not_exist("data/banlist.csv", "Ban list")
-    first_slot_disallowed_list_path = open_csv_path_if_not_exist("data/downprioritized.csv", "First slot disallowed list")
-    confirmed_duplicates_path = open_csv_path_if_not_exist("data/confirmed_duplicates.csv", "Manually confirmed duplicates")
+    people_store = PeopleStore(arguments.people_store) if arguments.people_store else None
+    if people_store is None or not people_store.openings():
+        ban_list_path = open_csv_path_if_not_exist("data/banlist.csv", "Ban list")
+        first_slot_disallowed_list_path = open_csv_path_if_not_exist("data/downprioritized.csv", "First slot disallowed list")
+        confirmed_duplicates_path = open_csv_path_if_not_exist("data/confirmed_duplicates.csv", "Manually confirmed duplicates")
+
+        ban_list = read_people_table(ban_list_path, name_column=2, email_column=1)
+        disallowed = read_people_table(first_slot_disallowed_list_path, name_column=2, email_column=1)
 
-    registrations = [r.registration for r in read_registrations(registrations_path)]
-    registrations.sort(key=lambda reg: reg.timestamp)
+        confirmed_duplicates = read_people_table(confirmed_duplicates_path, name_column=0, email_column=1)
+        if people_store is not None:
+            people_store.import_lists(ban_list, confirmed_duplicates, disallowed)
 
-    ban_list = read_people_table(ban_list_path, name_column=2, email_column=1)
-    disallowed_set = set(read_people_table(first_slot_disallowed_list_path, name_column=2, email_column=1))
+    registrations = sorted_registrations(registrations_path)  # read lazily when admitting
 
-    confirmed_duplicates = read_people_table(confirmed_duplicates_path, name_column=0, email_column=1)
 
+    # Comparisons made in earlier runs on the same data don't have to be made again
+    similarity_cache_path = "data/similarity_cache.json"
+    similarity_cache = SimilarityCache.load(similarity_cache_path)
 
     admittance = OpeningAdmittance({
         "10:00-11:00": LimitedTimeslot(50),
         "11:00-12:00": LimitedTimeslot(60),
-    })
+    }, similarity_cache=similarity_cache, workers=arguments.workers,
+        stats=AdmittanceStats() if arguments.stats else None, people_store=people_store, opening=arguments.opening)
 
-    admittance.confirmed_duplicates = set(confirmed_duplicates)
+    if people_store is not None:
+        # the result is written back, so the next opening disallows those admitted to the first timeslot of this one
+        people_store.prepare(admittance, ["10:00-11:00"])
+    else:
+        admittance.confirmed_duplicates = set(confirmed_duplicates)
 
-    admittance.timeslots["10:00-11:00"].disallowed = disallowed_set
+        admittance.timeslots["10:00-11:00"].disallowed = WatchlistIndex(disallowed)
 
-    admittance.banned.update(ban_list)
+        admittance.banned.update(ban_list)
 
     admittance.auto_admit(registrations)
+    similarity_cache.save(similarity_cache_path)
 
     admittance.write_to_spreadsheets("data/")
+    admittance.save("data/admittance.snapshot")  # app.py picks up from here without redoing the admission
+    if admittance.stats is not None:
+        print(admittance.stats)
     # registrations[0].person()
     #
     # admittance.cancel(Person("halvor smedås", "halvor@restore-trd.no"))
@@ -0,0 +1,139 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from candidate_index import _guaranteed_shared, _ngrams, _sub_name_ngrams
+from form_data import Person
+
+_NEVER = 1 << 30  # more n-grams than any two strings share, for lengths that can't be similar at all
+
+
+class NGramVectors:
+    """
+    People encoded by `NGramMatrix.encode`, as hashed n-gram counts stored row by row
+    """
+    people: List[Person]
+
+    def __init__(self, people: List[Person], email_lengths: np.ndarray, name_lengths: np.ndarray,
+                 spaces: np.ndarray, grams: Tuple[Tuple[np.ndarray, np.ndarray], ...]):
+        self.people = people
+        self.email_lengths = email_lengths
+        self.name_lengths = name_lengths
+        self.spaces = spaces
+        self._grams = grams  # (row offsets, hashed n-grams) of the emails, the names and the padded sub-names
+
+    def __len__(self):
+        return len(self.people)
+
+    def dense(self, kind: int, start: int, stop: int, dimensions: int) -> np.ndarray:
+        """
+        :param kind: 0 for emails, 1 for names, 2 for names as split into padded sub-names
+        :return: the n-gram counts of people[start:stop], one row each
+        """
+        offsets, grams = self._grams[kind]
+        counts = np.zeros((stop - start, dimensions), dtype=np.float32)
+        rows = np.repeat(np.arange(stop - start), np.diff(offsets[start:stop + 1]))
+        np.add.at(counts, (rows, grams[offsets[start]:offsets[stop]]), 1)
+        return counts
+
+
+@lru_cache(maxsize=None)
+def _required_tables(max_email_length: int, max_name_length: int, similarity_threshold: float,
+                     gram_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    # The same least numbers of shared n-grams NGramIndex requires, for every pair of lengths at once
+    emails = np.full((max_email_length + 1, max_email_length + 1), _NEVER, dtype=np.int64)
+    names = np.full((max_name_length + 1, max_name_length + 1), _NEVER, dtype=np.int64)
+    for length in range(max_email_length + 1):
+        for other_length in range(max_email_length + 1):
+            if (shared := _guaranteed_shared(length, other_length, similarity_threshold, gram_size)) is not None:
+                emails[length, other_length] = shared
+    for length in range(max_name_length + 1):
+        least = _NEVER
+        # names are compared against permutations of the other's sub-names, which can be of any length up to the name
+        for other_length in range(max_name_length + 1):
+            if (shared := _guaranteed_shared(length, other_length, similarity_threshold, gram_size)) is not None:
+                least = min(least, shared)
+            names[length, other_length] = least
+    return emails, names
+
+
+class NGramMatrix:
+    """
+    Batch counterpart of NGramIndex. People are encoded as vectors of character n-gram counts hashed into
+    `dimensions` buckets, and the n-grams shared by every pair in two groups of people are counted block by block
+    with matrix multiplication. The product of two count vectors is never less than the number of n-grams the strings
+    share, colliding buckets only add to it, so pairs are left out on the same lossless grounds as in NGramIndex.
+
+    Blocks are sized to keep the matrices of a block within about `memory_budget` bytes.
+    """
+    gram_size: int
+    dimensions: int
+    memory_budget: int
+
+    def __init__(self, gram_size: int = 3, dimensions: int = 4096, memory_budget: int = 64 * 2 ** 20):
+        self.gram_size = gram_size
+        self.dimensions = dimensions
+        self.memory_budget = memory_budget
+
+    @property
+    def block_size(self) -> int:
+        # two dense float32 matrices for each side, and for every pair two products, two requirements and the masks
+        per_row, per_pair = 2 * 2 * 4 * self.dimensions, 2 * 4 + 2 * 8 + 4
+        block_size = int((-per_row + (per_row ** 2 + 4 * per_pair * self.memory_budget) ** 0.5) / (2 * per_pair))
+        return max(block_size, 1)
+
+    def encode(self, people: Sequence[Person]) -> NGramVectors:
+        people = list(people)
+        grams = []
+        for to_grams in (lambda p: _ngrams(p.email, self.gram_size),
+                         lambda p: _ngrams(p.name, self.gram_size),
+                         lambda p: _sub_name_ngrams(p.name, self.gram_size)):
+            offsets, hashed = [0], []
+            for person in people:
+                hashed.extend(hash(gram) % self.dimensions for gram in to_grams(person).elements())
+                offsets.append(len(hashed))
+            grams.append((np.array(offsets, dtype=np.int64), np.array(hashed, dtype=np.int64)))
+        return NGramVectors(
+            people,
+            np.array([len(person.email) for person in people], dtype=np.int64),
+            np.array([len(person.name) for person in people], dtype=np.int64),
+            np.array([person.name.count(' ') for person in people], dtype=np.int64),
+            tuple(grams)
+        )
+
+    def pairs(self, people: NGramVectors, others: NGramVectors, similarity_threshold: float = 0.9,
+              earlier_only: bool = False) -> Iterator[Tuple[int, int]]:
+        """
+        :param people: the people compared, `a` in `a.similar(b)`
+        :param others: the people they are compared with, `b` in `a.similar(b)`
+        :param earlier_only: `others` are `people`, only pair each person with those before them
+        :return: the indices (i, j) of the pairs for which `people[i].similar(others[j], similarity_threshold)` might
+                 hold
+        """
+        if not len(people) or not len(others):
+            return
+        max_email_length = int(max(people.email_lengths.max(), others.email_lengths.max()))
+        max_name_length = int(max(people.name_lengths.max(), others.name_lengths.max()))
+        email_table, name_table = _required_tables(max_email_length, max_name_length, similarity_threshold,
+                                                   self.gram_size)
+        # n-grams of a compared permutation spanning a whole space between two sub-names, one per space in the name
+        uncovered = people.spaces * max(self.gram_size - 2, 0)
+        block_size, dimensions = self.block_size, self.dimensions
+        for start in range(0, len(people), block_size):
+            stop = min(start + block_size, len(people))
+            emails, names = people.dense(0, start, stop, dimensions), people.dense(1, start, stop, dimensions)
+            email_lengths = people.email_lengths[start:stop, None]
+            name_lengths = people.name_lengths[start:stop, None]
+            for other_start in range(0, stop - 1 if earlier_only else len(others), block_size):
+                other_stop = min(other_start + block_size, len(others))
+                required = email_table[email_lengths, others.email_lengths[None, other_start:other_stop]]
+                possible = emails @ others.dense(0, other_start, other_stop, dimensions).T >= required
+                required = name_table[name_lengths, others.name_lengths[None, other_start:other_stop]]
+                required -= uncovered[start:stop, None]
+                possible |= names @ others.dense(2, other_start, other_stop, dimensions).T >= required
+                if earlier_only:
+                    possible &= np.arange(other_start, other_stop)[None, :] < np.arange(start, stop)[:, None]
+                for i, j in zip(*np.nonzero(possible)):
+                    yield start + int(i), other_start + int(j)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence, Set, TYPE_CHECKING
+
+from candidate_index import WatchlistIndex
+from form_data import Person
+from remarks import RemarkCode
+
+if TYPE_CHECKING:
+    from admittance import OpeningAdmittance
+
+SCHEMA_VERSION = 1  # kept in the user_version of the database, bump when the tables below change
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    UNIQUE (name, email)
+);
+CREATE TABLE IF NOT EXISTS bans (
+    person_id INTEGER PRIMARY KEY REFERENCES people (id)
+);
+-- people confirmed by hand to be the same as the others in their group
+CREATE TABLE IF NOT EXISTS duplicates (
+    person_id INTEGER PRIMARY KEY REFERENCES people (id),
+    group_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS duplicates_by_group ON duplicates (group_id);
+CREATE TABLE IF NOT EXISTS openings (
+    id INTEGER PRIMARY KEY,  -- in the order the openings were first recorded
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS timeslots (
+    opening_id INTEGER NOT NULL REFERENCES openings (id),
+    position INTEGER NOT NULL,  -- 0 for the earliest timeslot of the opening
+    name TEXT NOT NULL,
+    PRIMARY KEY (opening_id, position)
+);
+-- the timeslot of the opening each person was admitted to
+CREATE TABLE IF NOT EXISTS attendance (
+    opening_id INTEGER NOT NULL REFERENCES openings (id),
+    person_id INTEGER NOT NULL REFERENCES people (id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (opening_id, person_id)
+);
+CREATE INDEX IF NOT EXISTS attendance_by_timeslot ON attendance (opening_id, position);
+"""
+
+_PERSON_ID = "SELECT id FROM people WHERE name = ? AND email = ?"
+
+
+class PeopleStore:
+    """
+    The people known across openings in a SQLite database: who is banned, who has been confirmed to be the same as
+    whom, and who was admitted to which timeslot of each opening. Replaces the ban list, the down prioritised list and
+    the confirmed duplicates kept as csv files, see `prepare` for giving them to an admittance and `record` for
+    writing its result back, which an OpeningAdmittance with a people_store does by itself.
+    """
+    file_path: str
+    _connection: sqlite3.Connection
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._connection = sqlite3.connect(file_path)
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            self._connection.close()
+            raise ValueError(f"{file_path} is a people store of version {version}, expected {SCHEMA_VERSION}")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> PeopleStore:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def _add_people(self, people: Iterable[Person]) -> List[tuple]:
+        rows = [(person.name, person.email) for person in people]
+        self._connection.executemany("INSERT OR IGNORE INTO people (name, email) VALUES (?, ?)", rows)
+        return rows
+
+    def _people(self, query: str, *parameters) -> List[Person]:
+        return [Person(name, email) for name, email in self._connection.execute(query, parameters)]
+
+    def banned(self) -> List[Person]:
+        return self._people("SELECT name, email FROM people JOIN bans ON bans.person_id = people.id ORDER BY id")
+
+    def ban(self, people: Iterable[Person]):
+        with self._connection:
+            self._connection.executemany(f"INSERT OR IGNORE INTO bans (person_id) {_PERSON_ID}",
+                                         self._add_people(people))
+
+    def confirmed_duplicates(self) -> Set[Person]:
+        return set(self._people("SELECT name, email FROM people JOIN duplicates ON duplicates.person_id = people.id"))
+
+    def duplicate_groups(self) -> List[List[Person]]:
+        groups: Dict[int, List[Person]] = {}
+        for group_id, name, email in self._connection.execute(
+                "SELECT group_id, name, email FROM duplicates JOIN people ON people.id = duplicates.person_id "
+                "ORDER BY group_id, people.id"):
+            groups.setdefault(group_id, []).append(Person(name, email))
+        return list(groups.values())
+
+    def confirm_duplicates(self, *groups: Iterable[Person]):
+        """
+        Stores groups of people confirmed to be the same, merging groups sharing anyone
+        """
+        with self._connection:
+            self._confirm_duplicates(groups)
+
+    def _confirm_duplicates(self, groups: Iterable[Iterable[Person]]):
+        for group in groups:
+            rows = self._add_people(group)
+            ids = [self._connection.execute(_PERSON_ID, row).fetchone()[0] for row in rows]
+            if not ids:
+                continue
+            placeholders = ', '.join('?' * len(ids))
+            existing = [group_id for group_id, in self._connection.execute(
+                f"SELECT DISTINCT group_id FROM duplicates WHERE person_id IN ({placeholders})", ids
+            )]
+            group_id = min(existing + ids)
+            if existing:
+                self._connection.execute(
+                    f"UPDATE duplicates SET group_id = ? WHERE group_id IN ({', '.join('?' * len(existing))})",
+                    (group_id, *existing)
+                )
+            self._connection.executemany("INSERT OR REPLACE INTO duplicates (person_id, group_id) VALUES (?, ?)",
+                                         [(person_id, group_id) for person_id in ids])
+
+    def openings(self) -> List[str]:
+        """
+        :return: the names of the openings recorded, in the order they were first recorded
+        """
+        return [name for name, in self._connection.execute("SELECT name FROM openings ORDER BY id")]
+
+    def previous_opening(self, opening: Optional[str] = None) -> Optional[str]:
+        """
+        :return: the name of the opening recorded before `opening`, the last one recorded if `opening` is not given or
+                 not recorded, None if there is none
+        """
+        row = self._connection.execute(
+            "SELECT name FROM openings WHERE id < COALESCE((SELECT id FROM openings WHERE name = ?), "
+            "(SELECT MAX(id) + 1 FROM openings)) ORDER BY id DESC LIMIT 1", (opening,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def attended(self, opening: Optional[str] = None, early_slots: int = 1) -> List[Person]:
+        """
+        :param opening: the name of the opening, the last one recorded if not given
+        :param early_slots: how many of the first timeslots of the opening to look at
+        :return: the people admitted to the first `early_slots` timeslots of the opening, e.g. to down prioritise
+        """
+        if opening is None:
+            return self._people(
+                "SELECT name, email FROM attendance JOIN people ON people.id = attendance.person_id "
+                "WHERE opening_id = (SELECT MAX(id) FROM openings) AND position < ? ORDER BY people.id", early_slots
+            )
+        return self._people(
+            "SELECT people.name, email FROM attendance JOIN people ON people.id = attendance.person_id "
+            "JOIN openings ON openings.id = attendance.opening_id WHERE openings.name = ? AND position < ? "
+            "ORDER BY people.id", opening, early_slots
+        )
+
+    def record_attendance(self, opening: str, timeslot_names: Sequence[str], admitted: Dict[Person, str]):
+        """
+        Replaces who was admitted to which timeslot of the opening, recording it if new
+        :param timeslot_names: the timeslots of the opening, earliest first
+        :param admitted: the name of the timeslot each person was admitted to
+        """
+        with self._connection:
+            self._record_attendance(opening, timeslot_names, admitted)
+
+    def _record_attendance(self, opening: str, timeslot_names: Sequence[str], admitted: Dict[Person, str]):
+        connection = self._connection
+        connection.execute("INSERT OR IGNORE INTO openings (name) VALUES (?)", (opening,))
+        opening_id = connection.execute("SELECT id FROM openings WHERE name = ?", (opening,)).fetchone()[0]
+        connection.execute("DELETE FROM timeslots WHERE opening_id = ?", (opening_id,))
+        connection.executemany("INSERT INTO timeslots (opening_id, position, name) VALUES (?, ?, ?)",
+                               [(opening_id, position, name) for position, name in enumerate(timeslot_names)])
+        positions = {name: position for position, name in enumerate(timeslot_names)}
+        self._add_people(admitted)
+        connection.execute("DELETE FROM attendance WHERE opening_id = ?", (opening_id,))
+        connection.executemany(
+            f"INSERT INTO attendance (opening_id, person_id, position) SELECT ?, id, ? FROM people "
+            f"WHERE name = ? AND email = ?",
+            [(opening_id, positions[timeslot_name], person.name, person.email)
+             for person, timeslot_name in admitted.items()]
+        )
+
+    def import_lists(self, ban_list: Iterable[Person] = (), confirmed_duplicates: Iterable[Person] = (),
+                     down_prioritised: Iterable[Person] = (), previous_opening: str = "previous opening"):
+        """
+        Takes over the lists kept by hand, e.g. read by admittance.read_people_table. The down prioritised are
+        recorded as admitted to the earliest timeslot of `previous_opening`, and each of the confirmed duplicates as a
+        group of their own, as the csv files don't tell who they are the same as
+        """
+        with self._connection:
+            self._connection.executemany(f"INSERT OR IGNORE INTO bans (person_id) {_PERSON_ID}",
+                                         self._add_people(ban_list))
+            self._connection.executemany(
+                f"INSERT OR IGNORE INTO duplicates (person_id, group_id) SELECT id, id FROM people "
+                f"WHERE name = ? AND email = ?", self._add_people(confirmed_duplicates)
+            )
+            if down_prioritised := list(down_prioritised):
+                self._record_attendance(previous_opening, ["early"],
+                                        {person: "early" for person in down_prioritised})
+
+    def prepare(self, admittance: OpeningAdmittance, down_prioritised_timeslots: Sequence[str] = (),
+                previous_opening: Optional[str] = None, early_slots: int = 1):
+        """
+        Gives the admittance the ban list and confirmed duplicates, and disallows the timeslots to those admitted early
+        in the previous opening, each loaded with a single query
+        :param down_prioritised_timeslots: the timeslots disallowed to them, the first one if not given
+        :param previous_opening: the opening to look at, if not given the one recorded before the opening of the
+                                 admittance, which is not recorded yet unless it is admitted again
+        """
+        admittance.banned.update(self.banned())
+        admittance.confirmed_duplicates |= self.confirmed_duplicates()
+        if previous_opening is None:
+            previous_opening = self.previous_opening(admittance.opening)
+        disallowed = WatchlistIndex(() if previous_opening is None else self.attended(previous_opening, early_slots))
+        for timeslot_name in down_prioritised_timeslots or list(admittance.timeslots)[:1]:
+            admittance.timeslots[timeslot_name].disallowed = disallowed
+
+    def record(self, opening: str, admittance: OpeningAdmittance):
+        """
+        Writes the result of the admittance back in one transaction: who was admitted to which timeslot of the
+        opening, everyone banned, and the duplicates confirmed while processing
+        """
+        groups = [
+            (remark.person, remark.other.person) for remark in admittance.remarks(RemarkCode.CONFIRMED_DUPLICATE)
+        ]
+        with self._connection:
+            self._record_attendance(opening, list(admittance.timeslots), admittance.admitted)
+            self._connection.executemany(f"INSERT OR IGNORE INTO bans (person_id) {_PERSON_ID}",
+                                         self._add_people(admittance.banned))
+            self._confirm_duplicates(groups)
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import hashlib
+import os
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from admittance import SNAPSHOT_VERSION, LimitedTimeslot, OpeningAdmittance, Timeslot, read_people_table, \
+    sorted_registrations
+from allocation import Allocation
+from candidate_index import WatchlistIndex
+
+
+def input_key(paths: Sequence[Optional[str]], *settings: object) -> str:
+    """
+    :return: a key for what is made from the files at `paths`, which changes with the contents of the files, the
+             settings and the SNAPSHOT_VERSION
+    """
+    key = hashlib.sha256(repr((SNAPSHOT_VERSION, settings)).encode())
+    for path in paths:
+        file_hash = hashlib.sha256()
+        if path is not None:
+            with open(path, 'rb') as file:
+                while chunk := file.read(2 ** 20):
+                    file_hash.update(chunk)
+        key.update(file_hash.digest() if path is not None else b"\0" * file_hash.digest_size)
+    return key.hexdigest()
+
+
+def capacity_grid(capacities: Dict[str, Iterable[Optional[int]]]) -> List[Dict[str, Optional[int]]]:
+    """
+    :param capacities: the capacities to try for each timeslot, e.g. {"10:00-11:00": range(40, 81, 10), ...}
+    :return: every combination of them, to `Preprocessed.sweep`
+    """
+    timeslot_names = list(capacities)
+    return [dict(zip(timeslot_names, combination)) for combination in product(*capacities.values())]
+
+
+@dataclass
+class SweepResult:
+    capacities: Dict[str, Optional[int]]  # None for unlimited
+    spots_taken: Dict[str, int]
+    waiting: int  # the size of the waiting list
+
+    @property
+    def fill_rates(self) -> Dict[str, float]:
+        """
+        :return: the share of the spots taken in each limited timeslot with any
+        """
+        return {
+            timeslot_name: self.spots_taken[timeslot_name] / capacity
+            for timeslot_name, capacity in self.capacities.items() if capacity
+        }
+
+    @property
+    def fill_rate(self) -> float:
+        """
+        :return: the share of the spots taken in all limited timeslots together
+        """
+        limited = [timeslot_name for timeslot_name, capacity in self.capacities.items() if capacity is not None]
+        capacity = sum(self.capacities[timeslot_name] for timeslot_name in limited)
+        return sum(self.spots_taken[timeslot_name] for timeslot_name in limited) / capacity if capacity else 1.0
+
+
+def _first_come_first_served(preferences: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+    """
+    Admits like OpeningAdmittance does without an allocation, with one pass over all registrations for each timeslot
+    that fills up instead of one step for each registration. Everyone is given the first timeslot of their choice that
+    isn't full yet, in the order the timeslots fill up: until the first one does everyone gets their first choice, and
+    the registration finding it full is the first turned away from it.
+    :param preferences: (registrations, most choices) timeslot indices in order of preference, padded with the index
+                        one past the last timeslot
+    :param capacities: the spots available in each timeslot
+    :return: the timeslot each registration is admitted to, or -1 for the waiting list
+    """
+    count, timeslots = len(preferences), len(capacities)
+    full_from = np.full(timeslots + 1, count, dtype=np.int64)  # the first registration finding each timeslot full
+    full_from[timeslots] = -1  # the padding is never open
+    order = np.arange(count)[:, None]
+    while True:
+        available = order < full_from[preferences]
+        choice = available.argmax(axis=1)
+        assigned = np.where(available.any(axis=1), preferences[order[:, 0], choice], -1)
+
+        first_turned_away, filled = count, None
+        for timeslot in range(timeslots):
+            if full_from[timeslot] < count or capacities[timeslot] >= count:
+                continue
+            admitted = np.flatnonzero(assigned == timeslot)
+            if len(admitted) > capacities[timeslot] and admitted[capacities[timeslot]] < first_turned_away:
+                first_turned_away, filled = admitted[capacities[timeslot]], timeslot
+        if filled is None:
+            return assigned
+        full_from[filled] = first_turned_away
+
+
+class Preprocessed:
+    """
+    The registrations of an opening processed and marked by OpeningAdmittance.preprocess, with nobody admitted yet.
+    Admitting them only depends on the capacities of the timeslots from here, so the same preprocessing can be
+    admitted with any number of them, see `admit` and `sweep`. Cached by `from_files` in the format of
+    OpeningAdmittance.save, keyed by the contents of the files read.
+    """
+    admittance: OpeningAdmittance
+    key: Optional[str]  # the input_key of the files it was made from, if made by from_files
+
+    def __init__(self, admittance: OpeningAdmittance, key: Optional[str] = None):
+        self.admittance = admittance
+        self.key = key
+
+    @classmethod
+    def from_files(cls, registrations_path: str, timeslot_names: Sequence[str], ban_list_path: Optional[str] = None,
+                   down_prioritised_path: Optional[str] = None,
+                   down_prioritised_timeslots: Optional[Sequence[str]] = None,
+                   confirmed_duplicates_path: Optional[str] = None, cache_directory: Optional[str] = None,
+                   **options) -> Preprocessed:
+        """
+        Reads and preprocesses an opening the way main.py does, or loads it from `cache_directory` if it was made from
+        the same files before
+        :param down_prioritised_timeslots: the timeslots disallowed to the down prioritised, the first if not given
+        :param options: passed on to OpeningAdmittance, e.g. the similarity_cache or workers
+        """
+        if down_prioritised_timeslots is None:
+            down_prioritised_timeslots = list(timeslot_names)[:1]
+        key = input_key(
+            (registrations_path, ban_list_path, down_prioritised_path, confirmed_duplicates_path),
+            list(timeslot_names), list(down_prioritised_timeslots)
+        )
+        cache_path = None if cache_directory is None else os.path.join(cache_directory, f"{key}.snapshot")
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                return cls.load(cache_path, key, **options)
+            except ValueError:
+                pass  # made by another version, made again below
+
+        admittance = OpeningAdmittance({timeslot_name: Timeslot() for timeslot_name in timeslot_names}, **options)
+        if ban_list_path is not None:
+            admittance.banned.update(read_people_table(ban_list_path, name_column=2, email_column=1))
+        if down_prioritised_path is not None:
+            # shared by the timeslots, so confirmed duplicates of the down prioritised are added to all of them
+            disallowed = WatchlistIndex(read_people_table(down_prioritised_path, name_column=2, email_column=1))
+            for timeslot_name in down_prioritised_timeslots:
+                admittance.timeslots[timeslot_name].disallowed = disallowed
+        if confirmed_duplicates_path is not None:
+            admittance.confirmed_duplicates = set(
+                read_people_table(confirmed_duplicates_path, name_column=0, email_column=1)
+            )
+        admittance.preprocess(sorted_registrations(registrations_path))
+
+        if cache_path is not None:
+            os.makedirs(cache_directory, exist_ok=True)
+            admittance.save(cache_path)
+        return cls(admittance, key)
+
+    def save(self, file_path: str):
+        self.admittance.save(file_path)
+
+    @classmethod
+    def load(cls, file_path: str, key: Optional[str] = None, **options) -> Preprocessed:
+        """
+        :param options: passed on to OpeningAdmittance, as the ones `load` takes are
+        """
+        loaded = OpeningAdmittance.load(file_path, **{
+            option: options.pop(option) for option in ("candidate_index", "similarity_cache") if option in options
+        })
+        for option, value in options.items():
+            setattr(loaded, option, value)
+        return cls(loaded, key)
+
+    def _capacities(self, capacities: Dict[str, Optional[int]]) -> List[Optional[int]]:
+        if set(capacities) != set(self.admittance.timeslots):
+            raise ValueError(f"Expected capacities for exactly the timeslots {list(self.admittance.timeslots)}, "
+                             f"got {list(capacities)}")
+        return [capacities[timeslot_name] for timeslot_name in self.admittance.timeslots]
+
+    def admit(self, capacities: Dict[str, Optional[int]], allocation: Optional[Allocation] = None) \
+            -> OpeningAdmittance:
+        """
+        Admits the registrations to timeslots of the given capacities, None for unlimited. The admittance is the same
+        each time, readmitted from scratch
+        """
+        admittance = self.admittance
+        for timeslot_name, capacity in zip(admittance.timeslots, self._capacities(capacities)):
+            timeslot = Timeslot() if capacity is None else LimitedTimeslot(capacity)
+            timeslot.disallowed = admittance.timeslots[timeslot_name].disallowed
+            admittance.timeslots[timeslot_name] = timeslot
+        admittance.allocation = allocation
+        admittance.admit_processed()
+        return admittance
+
+    def sweep(self, configurations: Iterable[Dict[str, Optional[int]]], allocation: Optional[Allocation] = None) \
+            -> List[SweepResult]:
+        """
+        How full the timeslots get and how many end up waiting with each configuration of capacities, as `admit` would
+        admit them but without admitting anyone
+        :param configurations: the capacities of the timeslots to try, None for unlimited, e.g. from capacity_grid
+        """
+        timeslot_names = list(self.admittance.timeslots)
+        registrations, preferences = self.admittance._preferences(self.admittance.processed.values())
+        padded = np.full((len(preferences), max(1, max(map(len, preferences), default=0))), len(timeslot_names),
+                         dtype=np.int64)
+        for i, preferred in enumerate(preferences):
+            padded[i, :len(preferred)] = preferred
+
+        results = []
+        for capacities in configurations:
+            listed = self._capacities(capacities)
+            if allocation is None:
+                assigned = _first_come_first_served(padded, np.array(
+                    [len(registrations) if capacity is None else capacity for capacity in listed], dtype=np.int64
+                ))
+            else:
+                assigned = np.array([-1 if slot is None else slot for slot in allocation(preferences, listed)],
+                                    dtype=np.int64)
+            spots_taken = np.bincount(assigned[assigned >= 0], minlength=len(timeslot_names))
+            results.append(SweepResult(
+                dict(capacities),
+                {timeslot_name: int(taken) for timeslot_name, taken in zip(timeslot_names, spots_taken)},
+                int((assigned < 0).sum())
+            ))
+        return results
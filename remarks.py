@@ -0,0 +1,54 @@
+from __future__ import annotations
+from enum import Enum
+from typing import NamedTuple, Optional, Union
+
+from form_data import Person, Registration
+
+
+class RemarkCode(Enum):
+    """
+    The kinds of remarks, each with the template it is rendered with. The fields of the Remark are available to it.
+    SAME_AS_... are for people found to be the same by their identity key, see form_data.identity_key
+    """
+    BANNED = "Banned from attending, see ban list!"
+    CONFIRMED_BAN = "Confirmed ban, see ban list for {other}!"
+    SUSPECTED_BAN = "Suspected ban: {person} might be!, {other} from banlist!"
+    BAD_EMAIL = "Likely a non-working email! It ends with '{detail}'."
+    DOWN_PRIORITISED_EVERYWHERE = "Down prioritised from attending the timeslot(s) they signed up for, " \
+                                  "attended previous opening in the early slot(s)!"
+    DOWN_PRIORITISED = "Down prioritised from attending {timeslot} because they attended previous opening in the " \
+                       "early slot(s)!"
+    CONFIRMED_DOWN_PRIORITISED = "Down prioritised from attending {timeslot} because they attended previous opening " \
+                                 "in the early slot(s)!. confirmed suspected duplicate of: {other} from " \
+                                 "downprioritised list!"
+    SUSPECTED_DOWN_PRIORITISED = "Subject to being down prioritised from {timeslot}, suspecting {person} might be " \
+                                 "thesame as {other} from the down prioritised list!"
+    CHANGED_TIMESLOTS = "Duplicate Entry for {person}:\noverwriting {other}...\ntimestamp changed from " \
+                        "{other.timestamp} to {detail.timestamp}\nchanged timeslots from {other.timeslots} to " \
+                        "{detail.timeslots}"
+    CONFIRMED_DUPLICATE = "Confirmed suspected duplicate! {other.person} is the same as {person}!\nOverwriting " \
+                          "{detail} with {other}...\n"
+    SUSPECTED_DUPLICATE = "Suspected duplicate of {other}"
+    SAME_AS_BANNED = "Banned as the same person as {other} from the ban list, written differently!"
+    SAME_AS_DOWN_PRIORITISED = "Down prioritised as the same person as {other} from the down prioritised list, " \
+                               "written differently!"
+    SAME_AS_REGISTERED = "Duplicate entry: {person} is the same person as {other}, written differently!"
+    PROMOTED = "Promoted from the waiting list to {timeslot}!"
+    MIGHT_HAVE_CANCELLED = "Might have cancelled! {other} cancelled, and {person} might be the same person."
+    MIGHT_HAVE_BEEN_BANNED = "Might have been banned! {other} is banned, and {person} might be the same person."
+
+
+class Remark(NamedTuple):
+    """
+    A remark on a person for manual checking. Only refers to the people and registrations involved, the text is
+    rendered when asked for with str()
+    """
+    code: RemarkCode
+    person: Person  # the person remarked on
+    other: Optional[Person] = None  # the other person or registration involved, like the one on the ban list
+    timeslot: Optional[str] = None
+    detail: Union[str, Registration, None] = None  # e.g. the email ending, or the registration that came later
+
+    def __str__(self):
+        return self.code.value.format(person=self.person, other=self.other, timeslot=self.timeslot,
+                                      detail=self.detail)
@@ -0,0 +1,304 @@
+"""
+A local service admitting registrations as they come in, over HTTP or a Unix socket, for telling people their timeslot
+right after they sign up. Keeps one OpeningAdmittance in memory:
+
+    POST /registrations  {"name": ..., "email": ..., "timeslots": [...]}, or a list of them
+                         -> the decision on each, {"status": "admitted" | "waiting" | "rejected", "timeslot": ...,
+                            "flagged": ..., "remarks": [...]}
+    GET /timeslots       -> the spots taken of every timeslot and the size of the waiting list
+
+Registrations are admitted by a single task, in the order they were received, a batch at a time as they queue up, so
+the admittance is only ever changed by one thread. The occupancy is published after every batch and read without
+waiting for the admission. A decision holds as of its batch, later registrations may still change it, e.g. someone
+registering again overwriting their earlier registration. See loadgen.py for measuring the throughput and latency.
+"""
+import argparse
+import asyncio
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from admittance import LimitedTimeslot, OpeningAdmittance, _normalise, _read_timeslots
+from batch import parse_capacities
+from form_data import Registration
+
+_MICROSECOND = timedelta(microseconds=1)
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+
+
+class _RequestError(Exception):
+    """
+    A request answered with `status` without being read to the end, the connection is closed after
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_registration(entry: Dict[str, Any], timestamp: datetime) -> Registration:
+    """
+    :param entry: the name, email and timeslots of a registration, the timeslots as a list or the way the form writes
+                  them
+    :param timestamp: when it was received
+    :raises ValueError: if the entry is not a registration
+    """
+    try:
+        timeslots = entry.get("timeslots", [])
+        if isinstance(timeslots, str):
+            timeslots = _read_timeslots(timeslots)
+        return Registration(_normalise(entry["name"]), _normalise(entry["email"]), timestamp,
+                            [timeslot.replace(' ', '') for timeslot in timeslots])
+    except (AttributeError, KeyError, TypeError):
+        raise ValueError(f"Not a registration: {entry!r}") from None
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[Tuple[str, str, bytes, bool]]:
+    """
+    :param max_body: the longest body read, in bytes
+    :return: the method, path and body of the next HTTP request on the connection and whether to keep it open
+             after, None once the client is done
+    :raises _RequestError: if the length of the body is not given as a number, or is longer than `max_body`
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, version = request_line.decode("latin-1").split(' ', 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise _RequestError(400, f"Not a content length: {headers['content-length']!r}")
+    if length > max_body:
+        raise _RequestError(413, f"The body is longer than {max_body} bytes")
+    body = await reader.readexactly(length)
+    keep_alive = headers.get("connection", "").lower() != "close" and version.strip() != "HTTP/1.0"
+    return method, target.split('?', 1)[0], body, keep_alive
+
+
+class AdmissionService:
+    admittance: OpeningAdmittance
+    max_batch: int  # registrations admitted together at most, to keep the decisions on the first ones coming
+    max_body: int  # the longest request body read, in bytes, longer ones are refused unread
+    _queue: "asyncio.Queue[Tuple[List[Registration], asyncio.Future]]"
+    _occupancy: Dict[str, Any]  # replaced, never changed, after every batch
+    _last_timestamp: datetime
+
+    def __init__(self, admittance: OpeningAdmittance, max_batch: int = 1_000, max_body: int = 1 << 20):
+        self.admittance = admittance
+        self.max_batch = max_batch
+        self.max_body = max_body
+        self._executor = ThreadPoolExecutor(1)  # the only thread touching the admittance
+        self._queue = asyncio.Queue()
+        self._last_timestamp = max(
+            (registration.timestamp for registration in admittance.processed.values()), default=datetime.min
+        )
+        self._occupancy = self._count()
+        self._admitting = None
+        self._servers = []
+
+    def _count(self) -> Dict[str, Any]:
+        return {
+            "timeslots": {
+                name: {"spots_taken": timeslot.spots_taken,
+                       "capacity": timeslot.capacity if isinstance(timeslot, LimitedTimeslot) else None}
+                for name, timeslot in self.admittance.timeslots.items()
+            },
+            "waiting": len(self.admittance.waiting_list),
+            "processed": len(self.admittance.processed),
+        }
+
+    @property
+    def occupancy(self) -> Dict[str, Any]:
+        return self._occupancy
+
+    def _admit(self, registrations: List[Registration]) -> List[Dict[str, Any]]:
+        admittance = self.admittance
+        admittance.auto_admit(registrations, incremental=True)
+        decisions = []
+        for registration in registrations:
+            # registering again without changing anything is decided on as the registration processed earlier
+            person = admittance.processed_as(registration.person)
+            timeslot_name = None if person is None else admittance.admitted.get(person)
+            if timeslot_name is not None:
+                status = "admitted"
+            elif person is not None and person in admittance.waiting_list:
+                status = "waiting"
+            else:
+                status = "rejected"  # banned, or left out for someone registering as them
+            remarks = [str(remark) for remark in admittance.marked.get(registration.person, ())]
+            decisions.append({"status": status, "timeslot": timeslot_name, "flagged": bool(remarks),
+                              "remarks": remarks})
+        self._occupancy = self._count()
+        return decisions
+
+    async def _admit_queued(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            waiting = [await self._queue.get()]
+            count = len(waiting[0][0])
+            while not self._queue.empty() and count < self.max_batch:
+                waiting.append(self._queue.get_nowait())
+                count += len(waiting[-1][0])
+            registrations = [registration for batch, _ in waiting for registration in batch]
+            try:
+                decisions = await loop.run_in_executor(self._executor, self._admit, registrations)
+            except Exception as error:
+                for _, future in waiting:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            start = 0
+            for batch, future in waiting:
+                if not future.done():
+                    future.set_result(decisions[start:start + len(batch)])
+                start += len(batch)
+
+    async def submit(self, entries: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Queues registrations for admission, timestamped as received
+        :return: the decision on each of them, once admitted
+        """
+        registrations = []
+        for entry in entries:
+            self._last_timestamp = max(datetime.now(), self._last_timestamp + _MICROSECOND)
+            registrations.append(parse_registration(entry, self._last_timestamp))
+        if not registrations:
+            return []
+        if self._admitting is None:
+            self._admitting = asyncio.get_running_loop().create_task(self._admit_queued())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((registrations, future))
+        return await future
+
+    async def _respond(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        if path == "/timeslots":
+            if method != "GET":
+                return 405, {"error": f"{method} {path} is not supported"}
+            return 200, self._occupancy
+        if path == "/registrations":
+            if method != "POST":
+                return 405, {"error": f"{method} {path} is not supported"}
+            try:
+                entries = json.loads(body)
+                if isinstance(entries, dict):
+                    return 200, (await self.submit([entries]))[0]
+                if not isinstance(entries, list):
+                    raise ValueError(f"Not a registration or a list of them: {entries!r}")
+                return 200, await self.submit(entries)
+            except ValueError as error:
+                return 400, {"error": str(error)}
+        return 404, {"error": f"{path} not found"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the HTTP requests of a connection one after the other, the connections themselves concurrently
+        """
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, self.max_body)
+                except _RequestError as error:
+                    # answered and closed, the rest of the request can't be told from the next one
+                    keep_alive = False
+                    status, payload = error.status, {"error": str(error)}
+                else:
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    try:
+                        status, payload = await self._respond(method, path, body)
+                    except Exception as error:
+                        status, payload = 500, {"error": repr(error)}
+                content = json.dumps(payload).encode("utf-8")
+                headers = f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n" \
+                          f"Content-Length: {len(content)}\r\n"
+                if not keep_alive:
+                    headers += "Connection: close\r\n"
+                writer.write(headers.encode("latin-1") + b"\r\n" + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # the client went away or didn't speak HTTP
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080, unix_path: Optional[str] = None) \
+            -> asyncio.AbstractServer:
+        """
+        Starts listening on `unix_path` if given, otherwise on `host` and `port`, port 0 for any free one
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._admitting is not None:
+            self._admitting.cancel()
+        # whatever is being admitted is finished before the admittance is handed back, e.g. to be saved
+        await asyncio.get_running_loop().run_in_executor(self._executor, lambda: None)
+        self._executor.shutdown()
+
+
+async def _serve(arguments: argparse.Namespace):
+    if arguments.snapshot is not None:
+        admittance = OpeningAdmittance.load(arguments.snapshot)
+    else:
+        admittance = OpeningAdmittance(
+            {timeslot_name: LimitedTimeslot(capacity) for timeslot_name, capacity in arguments.timeslots.items()}
+        )
+    service = AdmissionService(admittance, arguments.max_batch, arguments.max_body)
+    server = await service.start(arguments.host, arguments.port, arguments.unix)
+    print("Admitting registrations on", ", ".join(map(str, (socket.getsockname() for socket in server.sockets))))
+    stopped = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+        except NotImplementedError:
+            pass  # Windows, stopped by KeyboardInterrupt instead
+    try:
+        await stopped.wait()
+    finally:
+        await service.close()
+        if arguments.save is not None:
+            start = perf_counter()
+            admittance.save(arguments.save)
+            print(f"Saved the admittance to {arguments.save} in {perf_counter() - start:.2f}s")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Admits registrations as they come in, until interrupted")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--timeslots", type=parse_capacities, help="the capacities of the timeslots, like "
+                                                                   "'10:00-11:00=50,11:00-12:00=60'")
+    source.add_argument("--snapshot", help="carry on with an admittance saved by main.py, batch.py or app.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    parser.add_argument("--max-batch", type=int, default=1_000, help="registrations admitted together at most")
+    parser.add_argument("--max-body", type=int, default=1 << 20, help="the longest request body read, in bytes")
+    parser.add_argument("--save", metavar="PATH", help="save the admittance here when stopped, e.g. for app.py")
+    arguments = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(arguments))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Tuple
+
+from form_data import Person, SIMILARITY_VERSION
+
+_Key = Tuple[str, str, str, str, float, str]  # name, email, other name, other email, threshold, name matcher
+
+
+class SimilarityCache:
+    """
+    Remembers the verdicts of `Person.similar`, evicting the least recently used ones beyond `max_size`.
+    Reruns on the same registrations mostly ask for the same comparisons, so the cache can be saved to a file between
+    runs. Files saved by another SIMILARITY_VERSION are ignored.
+    """
+    max_size: int
+    hits: int
+    misses: int
+    _verdicts: "OrderedDict[_Key, bool]"
+
+    def __init__(self, max_size: int = 200_000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._verdicts = OrderedDict()
+
+    def __len__(self):
+        return len(self._verdicts)
+
+    def similar(self, person: Person, other: Person, similarity_threshold: float = 0.9,
+                name_matcher: str = "permutations") -> bool:
+        """
+        Same as `person.similar(other, similarity_threshold, name_matcher)`
+        """
+        key = (person.name, person.email, other.name, other.email, similarity_threshold, name_matcher)
+        if (verdict := self._verdicts.get(key)) is not None:
+            self.hits += 1
+            self._verdicts.move_to_end(key)
+            return verdict
+        self.misses += 1
+        verdict = self._verdicts[key] = person.similar(other, similarity_threshold, name_matcher)
+        if len(self._verdicts) > self.max_size:
+            self._verdicts.popitem(last=False)
+        return verdict
+
+    def knows(self, person: Person, other: Person, similarity_threshold: float = 0.9,
+              name_matcher: str = "permutations") -> bool:
+        return (person.name, person.email, other.name, other.email, similarity_threshold, name_matcher) in self._verdicts
+
+    def remember(self, person: Person, other: Person, similarity_threshold: float = 0.9,
+                 name_matcher: str = "permutations", *, verdict: bool):
+        """
+        Stores a verdict of `person.similar(other, similarity_threshold, name_matcher)` made elsewhere
+        """
+        key = (person.name, person.email, other.name, other.email, similarity_threshold, name_matcher)
+        self._verdicts[key] = verdict
+        self._verdicts.move_to_end(key)
+        if len(self._verdicts) > self.max_size:
+            self._verdicts.popitem(last=False)
+
+    def clear(self):
+        self._verdicts.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, file_path: str):
+        temporary_path = f"{file_path}.tmp"
+        with open(temporary_path, 'w', encoding="utf-8") as cache_file:
+            json.dump({
+                "version": SIMILARITY_VERSION,
+                "verdicts": [[*key, verdict] for key, verdict in self._verdicts.items()]  # least recently used first
+            }, cache_file, ensure_ascii=False)
+        os.replace(temporary_path, file_path)  # don't leave a half written cache behind if interrupted
+
+    @classmethod
+    def load(cls, file_path: str, max_size: int = 200_000, allow_failure: bool = True) -> "SimilarityCache":
+        cache = cls(max_size)
+        try:
+            with open(file_path, encoding="utf-8") as cache_file:
+                content = json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError) as error:
+            if allow_failure:
+                return cache
+            raise error
+        if content.get("version") != SIMILARITY_VERSION:
+            return cache
+        for *key, verdict in content["verdicts"][-max_size:]:
+            cache._verdicts[tuple(key)] = verdict
+        return cache
@@ -0,0 +1,71 @@
+"""
+Timeslot names interned to bit indices, so the timeslots a registration signed up for are an integer bitmask and a
+tuple of small integers instead of a list of strings to scan. Every OpeningAdmittance keeps its own registry of its
+timeslots
+"""
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class Preferences(NamedTuple):
+    mask: int  # bit i is set for the timeslot with index i in the registry
+    order: Tuple[int, ...]  # the indices of the timeslots, most wanted first, without repeats
+
+
+class SlotRegistry:
+    """
+    Gives every timeslot name an index once, the first time it is indexed, and parses lists of timeslot names into
+    Preferences. The same few lists of timeslots are signed up for again and again, each is only parsed once
+    """
+    names: List[str]  # by index
+    _indices: Dict[str, int]
+    _parsed: Dict[Tuple[str, ...], Preferences]
+    max_parsed = 1024  # lists of timeslots kept parsed, registrations may sign up for any names
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names = []
+        self._indices = {}
+        self._parsed = {}
+        for name in names:
+            self.index(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name: str) -> int:
+        """
+        :return: the index of the timeslot, given one if it has none yet
+        """
+        if (index := self._indices.get(name)) is None:
+            index = self._indices.setdefault(sys.intern(name), len(self.names))
+            if index == len(self.names):
+                self.names.append(name)
+                self._parsed.clear()  # parsed without the name
+        return index
+
+    def find(self, name: str) -> Optional[int]:
+        """
+        :return: the index of the timeslot, or None if it has none
+        """
+        return self._indices.get(name)
+
+    def names_of(self, mask: int) -> List[str]:
+        """
+        :return: the names of the timeslots set in `mask`, by index
+        """
+        return [name for index, name in enumerate(self.names) if mask >> index & 1]
+
+    def preferences(self, names: Sequence[str]) -> Preferences:
+        """
+        :return: the timeslots among `names` that have an index, the others are left out without being indexed
+        """
+        key = tuple(names)
+        if (preferences := self._parsed.get(key)) is None:
+            order = tuple(dict.fromkeys(index for index in map(self._indices.get, key) if index is not None))
+            mask = 0
+            for index in order:
+                mask |= 1 << index
+            if len(self._parsed) >= self.max_parsed:
+                self._parsed.clear()
+            preferences = self._parsed[key] = Preferences(mask, order)
+        return preferences
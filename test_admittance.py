@@ -1,9 +1,16 @@
+import csv
 import datetime
+import os
 
 import pytest
 
-from admittance import OpeningAdmittance, LimitedTimeslot, read_entry
-from form_data import Person, Registration
+from admittance import AdmittanceStats, OpeningAdmittance, LimitedTimeslot, RegistrationFeed, read_entry, read_registrations, \
+    sorted_registrations, Timeslot
+from candidate_index import WatchlistIndex
+from form_data import FullRegistration, Person, Registration
+from util import TableSchema
+from allocation import flow_allocation
+from remarks import Remark, RemarkCode
 
 _kate = read_entry("18/08/2022 18:04:40", "katemccoy@gmail.com", "Kate Mccoy", "a, b", "", "yes", "", "yes", "yes")
 _barrett = read_entry("18/08/2022 18:04:41", "BarrettIngram@gmail.com", "Barrett Ingram", "a, b", "", "yes", "", "yes", "yes")
@@ -41,9 +48,279 @@ def test_cancel(admittance_filled):
     assert (_kate not in admittance_filled.timeslots['b'].spots)
     assert (_kate not in admittance_filled.waiting_list)
 
+def test_timeslot_of(admittance_filled):
+    assert admittance_filled.timeslot_of(_kate) == 'a'
+    assert admittance_filled.timeslot_of(_braydon) == 'b'
+    admittance_filled.cancel(_kate)
+    assert admittance_filled.timeslot_of(_kate) is None
+    assert admittance_filled.timeslots['a'].spots_taken == 4
+
 def test_waiting_list(admittance_filled):
     waiter = read_entry("18/08/2022 18:04:55", "JordonEmelie@gmail.com", "Jordon Emelie", "a", "", "yes", "", "yes", "yes")
     admittance_filled.auto_admit([waiter])
     assert (waiter in admittance_filled.waiting_list)
     assert (waiter not in admittance_filled.timeslots['a'].spots)
-    assert (waiter not in admittance_filled.timeslots['b'].spots)
\ No newline at end of file
+    assert (waiter not in admittance_filled.timeslots['b'].spots)
+
+def test_promotion_on_cancel(admittance_filled):
+    disallowed = read_entry("18/08/2022 18:04:52", "JordonEmelie@gmail.com", "Jordon Emelie", "a", "", "yes", "", "yes", "yes")
+    waiter = read_entry("18/08/2022 18:04:55", "MaliaDuke@gmail.com", "Malia Duke", "a", "", "yes", "", "yes", "yes")
+    later = read_entry("18/08/2022 18:04:58", "AmariBooth@gmail.com", "Amari Booth", "a", "", "yes", "", "yes", "yes")
+    admittance_filled.timeslots['a'].disallowed = [disallowed.person]
+    admittance_filled.auto_admit([later, waiter, disallowed])
+    admittance_filled.cancel(_kate)
+    assert admittance_filled.timeslot_of(waiter) == 'a'  # the earliest eligible, not the first put on the list
+    assert admittance_filled.marked[waiter.person] == [Remark(RemarkCode.PROMOTED, waiter.person, timeslot='a')]
+    assert str(admittance_filled.marked[waiter.person][0]) == "Promoted from the waiting list to a!"
+    assert list(admittance_filled.waiting_list) == [later, disallowed]
+    admittance_filled.ban(_barrett, promote=False)
+    assert admittance_filled.timeslots['a'].spots_available == 1
+
+def test_incremental_auto_admit(tmp_path):
+    rows = [
+        "Timestamp,Email Address,Name,Timeslots\n",
+        "18/08/2022 18:04:40,katemccoy@gmail.com,Kate Mccoy,a\n",
+        "18/08/2022 18:04:41,BarrettIngram@gmail.com,Barrett Ingram,\"a, b\"\n",
+        "18/08/2022 18:04:42,ZaydenJenkins@gmail.com,Zayden Jenkins,a\n",
+        "18/08/2022 18:04:43,katemccoy@gmail.com,Kate Mccoy,b\n",  # changed timeslots after being admitted
+        "18/08/2022 18:04:44,RubenPalmer@gmail.com,Ruben Palmer,a\n",
+    ]
+    registration_file = tmp_path / "registrations.csv"
+    registration_file.write_text("".join(rows), encoding="utf-8")
+    from_scratch = OpeningAdmittance({'a': LimitedTimeslot(2), 'b': LimitedTimeslot(1)})
+    from_scratch.auto_admit(RegistrationFeed(str(registration_file)).read_new())
+
+    registration_file.write_text("", encoding="utf-8")
+    feed = RegistrationFeed(str(registration_file))
+    incremental = OpeningAdmittance({'a': LimitedTimeslot(2), 'b': LimitedTimeslot(1)})
+    for row in rows:
+        with open(registration_file, 'a', encoding="utf-8") as file:
+            file.write(row)
+        incremental.auto_admit(feed.read_new(), incremental=True)
+
+    assert incremental.processed == from_scratch.processed
+    assert incremental.waiting_list == from_scratch.waiting_list
+    for name, timeslot in incremental.timeslots.items():
+        assert timeslot.spots == from_scratch.timeslots[name].spots
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_sorted_registrations(tmp_path, chunk_size):
+    registration_file = tmp_path / "registrations.csv"
+    registration_file.write_text(
+        "Timestamp,Email Address,Name,Timeslots\n"
+        "18/08/2022 18:04:42,ZaydenJenkins@gmail.com,Zayden Jenkins,a\n"
+        "18/08/2022 18:04:40,katemccoy@gmail.com,Kate Mccoy,a\n"
+        "18/08/2022 18:04:42,RubenPalmer@gmail.com,Ruben Palmer,\"a, b\"\n"
+        "8/8/2022 18:04:41,BarrettIngram@gmail.com,Barrett Ingram,b\n",
+        encoding="utf-8"
+    )
+    expected = sorted(read_registrations(str(registration_file)), key=lambda registration: registration.timestamp)
+    registrations = list(sorted_registrations(str(registration_file), chunk_size))
+    assert [r.email for r in registrations] == [
+        "barrettingram@gmail.com", "katemccoy@gmail.com", "zaydenjenkins@gmail.com", "rubenpalmer@gmail.com"
+    ]
+    assert [(r.timestamp, r.timeslots) for r in registrations] == [(r.timestamp, r.timeslots) for r in expected]
+
+def test_sorted_registrations_keep_schema(tmp_path):
+    registration_file = tmp_path / "registrations.csv"
+    registration_file.write_text(
+        "Timestamp,Email Address,Name,Timeslots,Student type,Erasmus,Nationality,SiT residency\n"
+        "2022-08-18 18:04:42.250,zayden@gmail.com,Zayden Jenkins,a,bachelor,no,norwegian,moholt\n"
+        "2022-08-18 18:04:40.500,kate@gmail.com,Kate Mccoy,a,master,yes,irish,\n"
+        "2022-08-18 18:04:42.125,ruben@gmail.com,Ruben Palmer,b,phd,no,danish,moholt\n"
+        "2022-08-18 18:04:40.750,barrett@gmail.com,Barrett Ingram,b,master,no,swedish,\n"
+        "2022-08-18 18:04:41.000,jaydon@gmail.com,Jaydon Huff,a,bachelor,yes,german,berg\n",
+        encoding="utf-8"
+    )
+    # timestamps with fractions of a second, as spreadsheets may have them, and the extra columns of the form
+    schema = TableSchema(FullRegistration, {
+        "name": 2, "email": 1, "timestamp": 0, "timeslots": 3, "student_type": 4, "erasmus": 5, "nationality": 6,
+        "sit_residency": 7,
+    }, {"timestamp": datetime.datetime.fromisoformat, "timeslots": lambda timeslots: timeslots.split(','),
+        "erasmus": lambda erasmus: erasmus == "yes"})
+    in_one_chunk = list(sorted_registrations(str(registration_file), schema=schema))
+    in_chunks = list(sorted_registrations(str(registration_file), chunk_size=2, schema=schema))
+    assert [r.email for r in in_one_chunk] == [
+        "kate@gmail.com", "barrett@gmail.com", "jaydon@gmail.com", "ruben@gmail.com", "zayden@gmail.com"
+    ]
+    assert {type(r) for r in in_chunks} == {FullRegistration}
+    assert [(r.timestamp, r.timeslots, r.extras) for r in in_chunks] == \
+           [(r.timestamp, r.timeslots, r.extras) for r in in_one_chunk]
+    assert in_chunks[0].timestamp.microsecond == 500_000
+
+def test_write_to_csv(admittance_filled, tmp_path):
+    admittance_filled.ban(_kate)
+    admittance_filled.write_to_csv(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["All Remarks.csv", "Banned.csv", "Cancelled.csv", "Waiting List.csv",
+                                            "a.csv", "b.csv"]
+    with open(tmp_path / "a.csv", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["Timestamp", "Name", "Email", "Wanted Timeslots", "Remarks"]
+    assert [row[2] for row in rows[1:]] == [person.email for person in admittance_filled.timeslots['a'].spots]
+    with open(tmp_path / "Banned.csv", encoding="utf-8") as file:
+        assert list(csv.reader(file))[1][:2] == [_kate.name, _kate.email]
+
+def test_snapshot(admittance_filled, tmp_path):
+    waiter = read_entry("18/08/2022 18:04:55", "MaliaDuke@gmail.com", "Malia Duke", "a", "", "yes", "", "yes", "yes")
+    admittance_filled.timeslots['b'].disallowed = admittance_filled.timeslots['a'].disallowed
+    admittance_filled.timeslots['a'].disallowed.add(Person("jordon emelie", "jordonemelie@gmail.com"))
+    admittance_filled.confirmed_duplicates = {Person("kate mccoy", "kate.mccoy@gmail.com")}
+    admittance_filled.auto_admit([waiter], incremental=True)
+    admittance_filled.ban(_kate, promote=False)
+    admittance_filled.cancel(_barrett, promote=False)
+    admittance_filled.save(str(tmp_path / "snapshot"))
+    loaded = OpeningAdmittance.load(str(tmp_path / "snapshot"))
+
+    for name, timeslot in admittance_filled.timeslots.items():
+        assert type(loaded.timeslots[name]) is type(timeslot)
+        assert loaded.timeslots[name].spots == timeslot.spots
+        assert list(loaded.timeslots[name].disallowed) == list(timeslot.disallowed)
+    assert loaded.timeslots['a'].disallowed is loaded.timeslots['b'].disallowed
+    assert loaded.timeslots['a'].spots_available == 2
+    assert loaded.admitted == admittance_filled.admitted
+    assert list(loaded.processed.items()) == list(admittance_filled.processed.items())
+    assert [r.timestamp for r in loaded.processed.values()] == [r.timestamp for r in admittance_filled.processed.values()]
+    assert loaded.waiting_list == admittance_filled.waiting_list
+    assert loaded.cancelled == admittance_filled.cancelled
+    assert list(loaded.banned) == list(admittance_filled.banned)
+    assert loaded.marked == admittance_filled.marked
+    assert loaded.confirmed_duplicates == admittance_filled.confirmed_duplicates
+
+    loaded.cancel(_zayden)
+    assert loaded.timeslot_of(waiter) == 'a'
+
+    (tmp_path / "not a snapshot").write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        OpeningAdmittance.load(str(tmp_path / "not a snapshot"))
+
+@pytest.mark.parametrize("workers, memory_budget, batch_size", [
+    (2, None, 150), (1, 2 ** 18, 150), (2, 64 * 2 ** 20, 150), (1, 2 ** 18, 40), (2, 64 * 2 ** 20, 40)
+])  # screened without a prefilter if no memory budget is given for one
+def test_screening_matches_sequential(random_people, workers, memory_budget, batch_size):
+    prefilter = None if memory_budget is None else pytest.importorskip("ngram_matrix").NGramMatrix(memory_budget=memory_budget)
+    people = random_people(3, 150)
+    registrations = [
+        Registration(person.name, person.email, datetime.datetime(2022, 8, 18, 18) + datetime.timedelta(seconds=i),
+                     ['a', 'b'] if i % 3 else ['b'])
+        for i, person in enumerate(people)
+    ]
+    results = []
+    for screened in (False, True):
+        adm = OpeningAdmittance({'a': LimitedTimeslot(25), 'b': LimitedTimeslot(50)},
+                                workers=workers if screened else 1, screening_chunk_size=200,
+                                screening_prefilter=prefilter if screened else None)
+        adm.banned.update(people[5::20])
+        adm.timeslots['a'].disallowed = people[7::12]
+        adm.confirmed_duplicates = set(people[::11])
+        for start in range(0, len(registrations), batch_size):
+            adm.auto_admit(registrations[start:start + batch_size], incremental=True)
+        results.append((dict(adm.marked), list(adm.processed.values()), list(adm.waiting_list),
+                        [list(timeslot.spots) for timeslot in adm.timeslots.values()]))
+    assert results[0] == results[1]
+    assert results[0][0]  # something was marked
+
+def test_stats():
+    adm = OpeningAdmittance({'a': LimitedTimeslot(5), 'b': LimitedTimeslot(10)}, stats=AdmittanceStats())
+    kate_again = read_entry("18/08/2022 18:05:40", "kate.mccoy@gmail.com", "Mccoy Kate", "b", "", "yes", "", "yes", "yes")
+    adm.banned.add(Person("river fry", "riverfry@gmail.com"))
+    adm.auto_admit([_kate, _barrett, _zayden, _ruben, _river, kate_again])
+    adm.cancel(_zayden)
+    assert set(adm.stats.seconds) == {"ban screening", "down prioritisation screening", "duplicate screening",
+                                      "slot allocation", "cancellations"}
+    assert adm.stats.similarity.similar_calls > 0
+    assert adm.stats.remarks == sum(map(len, adm.marked.values())) == 3  # banned, and a suspected duplicate pair
+    assert "similar calls" in str(adm.stats)
+
+def test_remarks():
+    adm = OpeningAdmittance({'a': LimitedTimeslot(5), 'b': LimitedTimeslot(10)})
+    kate_later = read_entry("18/08/2022 18:05:40", "katemccoy@gmail.com", "Kate Mccoy", "b", "", "yes", "", "yes", "yes")
+    kate_again = read_entry("18/08/2022 18:05:41", "kate.mccoy@gmail.con", "Mccoy Kate", "b", "", "yes", "", "yes", "yes")
+    adm.banned.add(Person("river fry", "riverfry@gmail.com"))
+    adm.auto_admit([_kate, _barrett, _river, kate_later, kate_again])
+    assert [str(remark) for remark in adm.remarks(RemarkCode.BANNED, RemarkCode.BAD_EMAIL)] == [
+        "Banned from attending, see ban list!",
+        "Likely a non-working email! It ends with '.con'.",
+    ]
+    assert str(next(adm.remarks(RemarkCode.CHANGED_TIMESLOTS))) == (
+        f"Duplicate Entry for {_kate.person}:\noverwriting {_kate}...\n"
+        f"timestamp changed from {_kate.timestamp} to {kate_later.timestamp}\n"
+        f"changed timeslots from {_kate.timeslots} to {kate_later.timeslots}"
+    )
+    assert [str(remark) for remark in adm.marked[kate_again.person] if remark.code == RemarkCode.SUSPECTED_DUPLICATE] \
+        == [f"Suspected duplicate of {kate_later}"]
+    assert len(list(adm.remarks())) == sum(map(len, adm.marked.values()))
+
+
+def test_flow_allocation():
+    early = read_entry("18/08/2022 18:04:40", "katemccoy@gmail.com", "Kate Mccoy", "a, b")
+    late = read_entry("18/08/2022 18:04:41", "BarrettIngram@gmail.com", "Barrett Ingram", "a")
+    disallowed = read_entry("18/08/2022 18:04:42", "ZaydenJenkins@gmail.com", "Zayden Jenkins", "b")
+    greedy = OpeningAdmittance({'a': LimitedTimeslot(1), 'b': LimitedTimeslot(1)})
+    greedy.auto_admit([early, late])
+    assert (greedy.timeslot_of(early), greedy.timeslot_of(late)) == ('a', None)
+
+    admittance = OpeningAdmittance({'a': LimitedTimeslot(1), 'b': LimitedTimeslot(2)}, allocation=flow_allocation)
+    admittance.timeslots['b'].disallowed = [disallowed.person]
+    admittance.auto_admit([early, late, disallowed])
+    assert (admittance.timeslot_of(early), admittance.timeslot_of(late)) == ('b', 'a')
+    assert admittance.timeslot_of(disallowed) is None
+    assert list(admittance.waiting_list) == [disallowed]
+
+
+def test_same_identity():
+    adm = OpeningAdmittance({'a': LimitedTimeslot(5), 'b': LimitedTimeslot(5)}, stats=AdmittanceStats())
+    adm.banned.add(Person("river fry", "riverfry@gmail.com"))
+    adm.timeslots['a'].disallowed = [Person("ruben palmer", "rubenpalmer@gmail.com")]
+    river = read_entry("18/08/2022 18:05:40", "River.Fry+restore@gmail.com", "Rivér Fry", "a")
+    ruben = read_entry("18/08/2022 18:05:41", "ruben.palmer@googlemail.com", "Ruben  Palmer", "a, b")
+    kate_again = read_entry("18/08/2022 18:05:42", "Kate.McCoy@gmail.com", "Kate Mc-Coy", "b, a")
+    barrett_again = read_entry("18/08/2022 18:05:43", "barrett.ingram@gmail.com", "Barrett Ingram", "b")
+    adm.auto_admit([_kate, _barrett, river, ruben, kate_again, barrett_again])
+
+    assert river.person in adm.banned and river.person not in adm.processed
+    assert adm.marked[river.person] == [
+        Remark(RemarkCode.SAME_AS_BANNED, river.person, Person("river fry", "riverfry@gmail.com")),
+        Remark(RemarkCode.BANNED, river.person),
+    ]
+    assert ruben.person in adm.timeslots['a'].disallowed and adm.timeslot_of(ruben) == 'b'
+    assert adm.marked[ruben.person][0].code == RemarkCode.SAME_AS_DOWN_PRIORITISED
+    # the same timeslots keep the earlier registration, other timeslots overwrite it
+    assert kate_again.person not in adm.processed and adm.timeslot_of(_kate) == 'a'
+    assert adm.marked[_kate.person] == [Remark(RemarkCode.SAME_AS_REGISTERED, _kate.person, kate_again)]
+    assert _barrett.person not in adm.processed and adm.timeslot_of(barrett_again) == 'b'
+    assert [remark.code for remark in adm.marked[barrett_again.person]] == [RemarkCode.SAME_AS_REGISTERED,
+                                                                            RemarkCode.CHANGED_TIMESLOTS]
+
+    # and the ones written differently are never compared with anyone
+    without = OpeningAdmittance({'a': LimitedTimeslot(5), 'b': LimitedTimeslot(5)}, stats=AdmittanceStats())
+    without.banned.add(Person("river fry", "riverfry@gmail.com"))
+    without.timeslots['a'].disallowed = [Person("ruben palmer", "rubenpalmer@gmail.com")]
+    without.auto_admit([_kate, _barrett, ruben])
+    assert adm.stats.similarity.similar_calls == without.stats.similarity.similar_calls
+
+
+def test_timeslots_share_empty_disallowed():
+    disallowed = WatchlistIndex()
+    first, second = Timeslot(disallowed), LimitedTimeslot(1)
+    second.disallowed = disallowed
+    disallowed.add(_kate.person)
+    assert first.disallowed is second.disallowed
+    assert not first.admit(_kate) and not second.admit(_kate)
+
+
+def test_registration_feed_multiline_values(tmp_path):
+    registration_file = tmp_path / "registrations.csv"
+    registration_file.write_bytes("Timestamp,Email Address,Name,Timeslots\r\n"
+                                  "18/08/2022 18:04:40,katemccoy@gmail.com,\"Kate\u2028Mccoy\",a\r\n"
+                                  "18/08/2022 18:04:41,BarrettIngram@gmail.com,\"Barrett\r\n".encode("utf-8"))
+    feed = RegistrationFeed(str(registration_file))
+    assert [registration.name for registration in feed.read_new()] == ["kate\u2028mccoy"]
+
+    # the rest of the quoted name, written after the first read
+    with open(registration_file, 'ab') as file:
+        file.write("Ingram\",\"a, b\"\r\n".encode("utf-8"))
+    assert [(registration.name, registration.timeslots) for registration in feed.read_new()] == [
+        ("barrett\r\ningram", ["a", "b"])
+    ]
+    assert feed.read_new() == []
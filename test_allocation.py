@@ -0,0 +1,55 @@
+import random
+from itertools import product
+from time import perf_counter
+
+import pytest
+
+from allocation import flow_allocation
+
+
+def _best(preferences, capacities):
+    # every way to assign the registrations, ranked by how many are admitted, which and then the preference steps
+    def rank(assignment):
+        admitted = [slot is not None for slot in assignment]
+        steps = sum(preferred.index(slot) for preferred, slot in zip(preferences, assignment) if slot is not None)
+        return -sum(admitted), [not is_admitted for is_admitted in admitted], steps
+
+    assignments = (
+        assignment for assignment in product(*([None, *preferred] for preferred in preferences))
+        if all(capacity is None or sum(slot == i for slot in assignment) <= capacity
+               for i, capacity in enumerate(capacities))
+    )
+    return rank(min(assignments, key=rank))
+
+
+def test_flow_allocation_fills_what_greedy_leaves():
+    # the first only wants either, the second only the first, first come first served leaves the second out
+    assert flow_allocation([[0, 1], [0]], [1, 1]) == [1, 0]
+    assert flow_allocation([[0, 1], [0], [1]], [1, 1]) == [1, 0, None]
+    assert flow_allocation([[0, 1], [1], [1]], [1, None]) == [0, 1, 1]
+    assert flow_allocation([[], [1]], [1, 1]) == [None, 1]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_flow_allocation_is_optimal(seed):
+    rng = random.Random(seed)
+    slots = rng.randint(1, 3)
+    capacities = [rng.randint(0, 3) for _ in range(slots)]
+    preferences = [rng.sample(range(slots), rng.randint(0, slots)) for _ in range(rng.randint(1, 7))]
+
+    assignment = flow_allocation(preferences, capacities)
+    for i, capacity in enumerate(capacities):
+        assert sum(slot == i for slot in assignment) <= capacity
+    assert all(slot is None or slot in preferred for preferred, slot in zip(preferences, assignment))
+    admitted = [slot is not None for slot in assignment]
+    steps = sum(preferred.index(slot) for preferred, slot in zip(preferences, assignment) if slot is not None)
+    assert (-sum(admitted), [not is_admitted for is_admitted in admitted], steps) == _best(preferences, capacities)
+
+
+def test_flow_allocation_speed():
+    rng = random.Random(0)
+    preferences = [rng.sample(range(3), rng.randint(1, 3)) for _ in range(10_000)]
+    start = perf_counter()
+    assignment = flow_allocation(preferences, [2_000, 2_500, 3_000])
+    assert perf_counter() - start < 1
+    assert sum(slot is not None for slot in assignment) == 7_500
@@ -0,0 +1,95 @@
+import queue
+import threading
+
+import pytest
+
+import app
+from admittance import LimitedTimeslot, OpeningAdmittance, sorted_registrations
+from form_data import Person
+
+
+def _messages_until_done(work, *arguments):
+    # runs the work in a thread like App does, and collects what it tells until it is done
+    messages = queue.Queue()
+    worker = threading.Thread(target=work, args=(*arguments, messages), daemon=True)
+    worker.start()
+    received = []
+    while not received or received[-1][0] not in ("done", "error"):
+        received.append(messages.get(timeout=30))
+    worker.join(timeout=30)
+    return received
+
+
+@pytest.fixture
+def registrations_path(tmp_path):
+    path = tmp_path / "registrations.csv"
+    path.write_text(
+        "Timestamp,Email Address,Name,Timeslots\n"
+        + "".join(f"18/08/2022 18:04:{i:02},person{i}@gmail.com,Person {chr(97 + i)} Nordmann,\"a, b\"\n"
+                  for i in range(7))
+        + "18/08/2022 18:05:00,person0@gmail.com,Person a Nordmann,b\n",
+        encoding="utf-8"
+    )
+    return str(path)
+
+
+def test_admit_in_background(monkeypatch, registrations_path):
+    monkeypatch.setattr(app, "_batch_size", 3)
+    banned = Person("person b nordmann", "person1@gmail.com")
+    admittance = OpeningAdmittance({'a': LimitedTimeslot(2), 'b': LimitedTimeslot(2)})
+    admittance.banned.add(banned)
+    received = _messages_until_done(app.admit_in_background, admittance, registrations_path)
+
+    kinds = [message[0] for message in received]
+    assert kinds == ["progress", "partial"] * 3 + ["done"]
+    assert [message[1] for message in received if message[0] == "progress"] == [
+        "Admitted 3 registrations...", "Admitted 6 registrations...", "Admitted 8 registrations..."
+    ]
+    assert received[1][1:] == ({'a': (2, 2), 'b': (0, 2)}, 0)  # the first batch, without the banned
+    assert received[-1][1] is admittance
+    assert banned in admittance.banned  # kept when the admittance is cleared
+
+    at_once = OpeningAdmittance({'a': LimitedTimeslot(2), 'b': LimitedTimeslot(2)})
+    at_once.banned.add(banned)
+    at_once.auto_admit(sorted_registrations(registrations_path))
+    assert received[-2][1:] == (app._admission_summary(at_once), len(at_once.waiting_list))
+    assert admittance.processed == at_once.processed
+    assert admittance.admitted == at_once.admitted
+
+
+def test_admit_in_background_again(registrations_path):
+    down_prioritised = Person("person c nordmann", "person.2@gmail.com")  # registers as person2@gmail.com
+    admittance = OpeningAdmittance({'a': LimitedTimeslot(2), 'b': LimitedTimeslot(2)})
+    admittance.timeslots['a'].disallowed = [down_prioritised]
+    _messages_until_done(app.admit_in_background, admittance, registrations_path)
+    first_remarks = list(map(str, admittance.remarks()))
+    assert len(admittance.timeslots['a'].disallowed) == 2  # the registration was added to the list
+
+    _messages_until_done(app.admit_in_background, admittance, registrations_path)
+    assert list(map(str, admittance.remarks())) == first_remarks  # not down prioritised by the first admission
+    admittance.clear()
+    assert list(admittance.timeslots['a'].disallowed) == [down_prioritised]
+
+
+def test_admit_in_background_error(tmp_path):
+    received = _messages_until_done(app.admit_in_background, OpeningAdmittance(), str(tmp_path / "missing.csv"))
+    assert received[-1][0] == "error"
+    assert isinstance(received[-1][1], OSError)
+
+
+def test_load_in_background(tmp_path, registrations_path):
+    admittance = OpeningAdmittance({'a': LimitedTimeslot(2), 'b': LimitedTimeslot(2)})
+    admittance.auto_admit(sorted_registrations(registrations_path))
+    admittance.save(str(tmp_path / "snapshot"))
+    received = _messages_until_done(app.load_in_background, str(tmp_path / "snapshot"))
+    assert [message[0] for message in received] == ["progress", "done"]
+    assert received[-1][1].admitted == admittance.admitted
+
+    (tmp_path / "not a snapshot").write_bytes(b"not a snapshot")
+    received = _messages_until_done(app.load_in_background, str(tmp_path / "not a snapshot"))
+    assert received[-1][0] == "error"
+
+
+@pytest.mark.parametrize("delta, steps", [(120, -1), (-240, 1), (1, -1), (-3, 1)])  # Windows and macOS
+def test_wheel_steps(delta, steps):
+    assert app._wheel_steps(delta) == steps
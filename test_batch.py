@@ -0,0 +1,65 @@
+import argparse
+import subprocess
+import sys
+
+import pytest
+
+from admittance import OpeningAdmittance
+from batch import Opening, admit_opening, admit_openings, main, parse_capacities
+from benchmark import write_opening
+
+
+def test_parse_capacities():
+    assert parse_capacities("10:00-11:00=50, 11:00-12:00=60") == {"10:00-11:00": 50, "11:00-12:00": 60}
+    for bad in ("", "10:00-11:00", "10:00-11:00=many", "=50"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_capacities(bad)
+
+
+def test_no_gui_or_spreadsheet_imports():
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, batch; print(sorted({'tkinter', 'openpyxl', 'xlrd'} & set(sys.modules)))"],
+        capture_output=True, text=True, check=True
+    ).stdout
+    assert loaded.strip() == "[]"
+
+
+def test_admit_openings_in_parallel(tmp_path):
+    paths = write_opening(str(tmp_path), 200, seed=2)
+    openings = [
+        Opening(paths["registrations"], capacities, str(tmp_path / f"output{number}"),
+                ban_list_path=paths["banlist"], down_prioritised_path=paths["downprioritized"],
+                down_prioritised_timeslots=["10:00-11:00"],
+                confirmed_duplicates_path=paths["confirmed_duplicates"], file_format="csv")
+        for number, capacities in enumerate(({"10:00-11:00": 20, "11:00-12:00": 30},
+                                             {"10:00-11:00": 60, "11:00-12:00": 60}))
+    ]
+    sequential = [admit_opening(opening) for opening in openings]
+    parallel = admit_openings(openings, processes=2)
+    for summary, expected in zip(parallel, sequential):
+        assert summary["spots_taken"] == expected["spots_taken"]
+        assert (summary["waiting"], summary["remarks"]) == (expected["waiting"], expected["remarks"])
+    assert parallel[0]["spots_taken"] == {"10:00-11:00": 20, "11:00-12:00": 30}
+    assert parallel[0]["waiting"] > parallel[1]["waiting"]
+
+
+def test_down_prioritised_list_shared(tmp_path):
+    paths = write_opening(str(tmp_path), 100, seed=4)
+    summary = admit_opening(Opening(paths["registrations"], {"10:00-11:00": 20, "11:00-12:00": 30}, str(tmp_path),
+                                    down_prioritised_path=paths["downprioritized"],
+                                    down_prioritised_timeslots=["10:00-11:00", "11:00-12:00"], file_format="csv"))
+    timeslots = OpeningAdmittance.load(summary["snapshot"]).timeslots
+    assert timeslots["10:00-11:00"].disallowed is timeslots["11:00-12:00"].disallowed
+
+
+def test_main(tmp_path, capsys):
+    paths = write_opening(str(tmp_path), 100, seed=3)
+    output = tmp_path / "output"
+    assert main([paths["registrations"], "--timeslots", "10:00-11:00=10,11:00-12:00=10",
+                 "--timeslots", "10:00-11:00=30", "--banlist", paths["banlist"], "--format", "csv",
+                 "--output", str(output), "--processes", "2", "--allocation", "flow"]) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 2
+    assert sorted(path.name for path in output.iterdir()) == ["registrations__1", "registrations__2"]
+    assert (output / "registrations__1" / "admittance.snapshot").exists()
+
+    assert main([str(tmp_path / "missing.csv"), "--timeslots", "10:00-11:00=10", "--output", str(output)]) == 1
@@ -0,0 +1,34 @@
+import filecmp
+
+from admittance import read_people_table, read_registrations
+from benchmark import benchmark_pipeline, regressions, write_opening
+
+
+def test_write_opening(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    paths = write_opening(str(tmp_path / "a"), 500, seed=1)
+    registrations = read_registrations(paths["registrations"])
+    assert len(registrations) == 500
+    people = {registration.person for registration in registrations}
+    assert len(people) < 500  # some registered more than once
+    assert read_people_table(paths["banlist"], name_column=2, email_column=1)
+    assert read_people_table(paths["downprioritized"], name_column=2, email_column=1)
+    assert set(read_people_table(paths["confirmed_duplicates"], 0, 1)) <= people
+
+    same_seed = write_opening(str(tmp_path / "b"), 500, seed=1)
+    assert all(filecmp.cmp(paths[name], same_seed[name], shallow=False) for name in paths)
+
+
+def test_benchmark_pipeline():
+    timings = benchmark_pipeline(100)
+    assert list(timings) == ["read_registrations", "_preprocess_and_mark", "auto_admit", "write_to_spreadsheets"]
+    assert timings["auto_admit"] >= timings["_preprocess_and_mark"] > 0
+
+
+def test_regressions():
+    baseline = {"1000": {"auto_admit": 1.0, "read_registrations": 0.01}}
+    assert regressions({"1000": {"auto_admit": 1.2, "read_registrations": 0.05}}, baseline) == []
+    assert regressions({"1000": {"auto_admit": 1.5}, "10000": {"auto_admit": 20.0}}, baseline) == [
+        "auto_admit with 1000 registrations: 1.500s, was 1.000s"
+    ]
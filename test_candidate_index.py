@@ -0,0 +1,78 @@
+
+import pytest
+
+from candidate_index import CandidateIndex, ExhaustiveIndex, NGramIndex, ShortlistIndex, WatchlistIndex
+from form_data import Person
+
+
+@pytest.mark.parametrize("gram_size, reverse", [(2, False), (3, False), (3, True)])
+@pytest.mark.parametrize("seed", range(2))
+def test_ngram_index_is_lossless(random_people, seed, gram_size, reverse):
+    people = random_people(seed, 100) + [Person("", ""), Person("a", "b"), Person("ola  nordmann", "")]
+    index = NGramIndex(gram_size=gram_size, reverse=reverse)
+    for person in people:
+        shortlist = set(index.candidates(person))
+        for other in index._people.values():
+            if (other.similar(person) if reverse else person.similar(other)):
+                assert other in shortlist, f"{other} is similar to {person} but was not shortlisted"
+        index.add(person)
+
+
+def test_candidates_keep_insertion_order():
+    people = [Person("ola nordmann", "ola@gmail.com"), Person("kari nordmann", "kari@gmail.com"),
+              Person("nordmann ola", "ola@gmail.com")]
+    ngram_index, exhaustive_index = NGramIndex(), ExhaustiveIndex()
+    for person in people:
+        ngram_index.add(person)
+        exhaustive_index.add(person)
+    ngram_index.remove(people[0])
+    exhaustive_index.remove(people[0])
+    ngram_index.add(people[0])
+    exhaustive_index.add(people[0])
+
+    query = Person("ola nordman", "ola@gmail.com")
+    expected = [other for other in exhaustive_index.candidates(query) if query.similar(other)]
+    assert [other for other in ngram_index.candidates(query) if query.similar(other)] == expected
+    assert expected == [people[2], people[0]]
+
+
+def test_incomplete_index():
+    class AddOnly(CandidateIndex):
+        def add(self, person):
+            pass
+
+    with pytest.raises(TypeError):
+        AddOnly()
+
+
+def test_watchlist_index():
+    banned = Person("ola nordmann", "ola@gmail.com")
+    watchlist = WatchlistIndex([banned, Person("kari nordmann", "kari@hotmail.com")])
+    assert banned in watchlist
+    assert Person("ola nordmann", "ola.nordmann@gmail.com") not in watchlist
+    assert watchlist.suspect(Person("per nordmann ola", "per@gmail.com")) == banned
+    assert watchlist.suspects(Person("ola nordman", "kari@hotmail.co")) == list(watchlist)
+    assert watchlist.suspect(Person("per hansen", "per@gmail.com")) is None
+    # a shortlist made beforehand is compared with instead, leaving out those not on the list
+    kari = Person("kari nordmann", "kari@hotmail.com")
+    assert watchlist.suspect(Person("per nordmann ola", "per@gmail.com"), shortlist=[kari]) is None
+    assert watchlist.suspects(Person("ola nordman", "kari@hotmail.co"), shortlist=[kari, Person("per", "")]) == [kari]
+
+
+def test_shortlist_index():
+    people = [Person("ola nordmann", "ola@gmail.com"), Person("per hansen", "per@gmail.com"),
+              Person("ola nordman", "ola.n@gmail.com"), Person("kari berg", "kari@gmail.com")]
+    query = Person("ola nordmann", "ola.nordmann@gmail.com")
+    index = ShortlistIndex(NGramIndex(), {query: [people[2], people[3], people[0]]})
+    for person in people:
+        index.add(person)
+    index.remove(people[0])
+    index.add(people[0])
+    # the shortlisted people in the index, in the order they were added
+    assert index.candidates(query) == [people[2], people[3], people[0]]
+    index.remove(people[3])
+    assert index.candidates(query) == [people[2], people[0]]
+    # the index shortlists for those without a list
+    other = Person("per hanssen", "per@gmail.com")
+    assert index.candidates(other) == index.index.candidates(other)
+    assert people[1] in index.candidates(other)
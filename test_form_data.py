@@ -0,0 +1,118 @@
+import os
+import pickle
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from form_data import FullRegistration, Person, Registration, SimilarityStats, canonical_email, canonical_name, counting_similarity, identity_key
+from similarity_cache import SimilarityCache
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    (Person("ola nordmann", "a@a.no"), Person("ola nordmann", "b@b.no"), True),
+    (Person("ola nordmann", "a@a.no"), Person("nordmann ola", "b@b.no"), True),
+    (Person("ola nordmann", "a@a.no"), Person("per nordmann ola", "b@b.no"), True),
+    (Person("ola nordman", "a@a.no"), Person("nordmann ola", "b@b.no"), True),
+    (Person("halvor bakken smedås", "a@a.no"), Person("smedås halvor bakken", "b@b.no"), True),
+    (Person("ola nordmann", "a@a.no"), Person("kari nordmann", "b@b.no"), False),
+    (Person("ola per nordmann", "a@a.no"), Person("ola nordmann", "b@b.no"), False),
+    (Person("kate mccoy", "katemccoy@gmail.com"), Person("barrett ingram", "katemccoy@gmail.com"), True),
+])
+def test_name_matchers_agree_on_known_pairs(a, b, expected):
+    assert a.similar(b, name_matcher="permutations") == expected
+    assert a.similar(b, name_matcher="token_assignment") == expected
+
+
+def test_name_matchers_agree_on_random_pairs(random_people):
+    people = random_people(7, 150)
+    disagreements = [
+        (a, b) for i, a in enumerate(people) for b in people[max(0, i - 30):i]
+        if a.similar(b, name_matcher="permutations") != a.similar(b, name_matcher="token_assignment")
+    ]
+    assert not disagreements
+
+
+def test_name_matchers_differ_when_matches_cross_sub_names():
+    # The permutations compare the names as whole strings, so characters may match across the separating space.
+    # Scoring sub-names pairwise can not see that and is stricter
+    a, b = Person("kari nordmann", "a@a.no"), Person("karino rdmann", "b@b.no")
+    assert a.similar(b, name_matcher="permutations")
+    assert not a.similar(b, name_matcher="token_assignment")
+
+
+def test_similarity_cache(tmp_path):
+    a, b = Person("ola nordmann", "ola@gmail.com"), Person("nordmann ola", "ola.n@gmail.com")
+    cache = SimilarityCache(max_size=2)
+    assert cache.similar(a, b) == a.similar(b)
+    assert cache.similar(a, b) == a.similar(b)
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.similar(b, a)
+    cache.similar(a, a)
+    assert len(cache) == 2  # the least recently used, a vs. b, was evicted
+
+    cache.save(str(tmp_path / "cache.json"))
+    loaded = SimilarityCache.load(str(tmp_path / "cache.json"))
+    loaded.similar(b, a)
+    loaded.similar(a, b)
+    assert (loaded.hits, loaded.misses) == (1, 1)
+    assert len(SimilarityCache.load(str(tmp_path / "missing.json"))) == 0
+
+
+def test_counting_similarity():
+    a, b = Person("ola nordmann", "ola@gmail.com"), Person("kari per nordmann", "kari@hotmail.com")
+    with counting_similarity(SimilarityStats()) as stats:
+        a.similar(b)
+    b.similar(a)  # not counted
+    assert stats.similar_calls == 1
+    assert stats.permutations == 6  # two of kari, per and nordmann
+    assert 0 < stats.quick_ratio_rejections <= stats.permutations
+
+
+def test_identity_key():
+    assert canonical_email(" Kate.McCoy+opening@GoogleMail.com") == "katemccoy@gmail.com"
+    assert canonical_email("kate.mccoy+opening@restore-trd.no") == "kate.mccoy@restore-trd.no"
+    assert canonical_email("not an email") == "notanemail"
+    assert canonical_name("Halvor  Bakken-Smedås") == canonical_name("halvor bakkensmedas") == "halvorbakkensmedas"
+    assert canonical_name("Søren Ærø") == "sorenaero"
+    assert identity_key(Person("kate mccoy", "katemccoy@gmail.com")) == \
+        identity_key(Person("kate  mccóy", "kate.mccoy+1@gmail.com"))
+    # a shared name or a shared mailbox alone is not enough
+    assert identity_key(Person("kate mccoy", "katemccoy@gmail.com")) != \
+        identity_key(Person("kate mccoy", "kate@restore-trd.no"))
+    assert identity_key(Person("kate mccoy", "mccoys@gmail.com")) != \
+        identity_key(Person("barrett mccoy", "mccoys@gmail.com"))
+
+
+def _in_process(code: str, hash_seed: int, stdin: bytes = b"") -> bytes:
+    return subprocess.run([sys.executable, "-c", code], input=stdin, capture_output=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
+                          env={**os.environ, "PYTHONHASHSEED": str(hash_seed)}).stdout
+
+
+def test_pickle_across_hash_seeds():
+    # e.g. sent to the worker processes of a pool started with spawn, as on Windows
+    pickled = _in_process(
+        "import pickle, sys\n"
+        "from datetime import datetime\n"
+        "from form_data import FullRegistration, Person, Registration\n"
+        "sys.stdout.buffer.write(pickle.dumps([\n"
+        "    Person('kate mccoy', 'katemccoy@gmail.com'),\n"
+        "    Registration('kate mccoy', 'katemccoy@gmail.com', datetime(2022, 8, 18), ['a', 'b']),\n"
+        "    FullRegistration('kate mccoy', 'katemccoy@gmail.com', datetime(2022, 8, 18), ['a'], '', True, '', ''),\n"
+        "]))\n", hash_seed=1
+    )
+    assert _in_process(
+        "import pickle, sys\n"
+        "from form_data import Person\n"
+        "people = pickle.loads(sys.stdin.buffer.read())\n"
+        "person = Person('kate mccoy', 'katemccoy@gmail.com')\n"
+        "print(all(other == person and person in {other} and other in {person} for other in people))\n",
+        hash_seed=2, stdin=pickled
+    ).strip() == b"True"
+
+    person, registration, full_registration = pickle.loads(pickled)
+    assert type(registration) is Registration and registration.timeslots == ["a", "b"]
+    assert type(full_registration) is FullRegistration and full_registration.erasmus is True
+    assert full_registration.timestamp == datetime(2022, 8, 18)
@@ -0,0 +1,41 @@
+import pytest
+
+from candidate_index import NGramIndex
+from ngram_matrix import NGramMatrix
+
+
+@pytest.mark.parametrize("similarity_threshold", [0.8, 0.9])
+@pytest.mark.parametrize("memory_budget", [2 ** 16, 64 * 2 ** 20])  # many small blocks, a single block
+def test_pairs_are_lossless(random_people, similarity_threshold, memory_budget):
+    people, others = random_people(11, 120), random_people(12, 80)
+    matrix = NGramMatrix(memory_budget=memory_budget)
+    pairs = set(matrix.pairs(matrix.encode(people), matrix.encode(others), similarity_threshold))
+    similar = {
+        (i, j) for i, a in enumerate(people) for j, b in enumerate(others) if a.similar(b, similarity_threshold)
+    }
+    assert similar <= pairs
+    if similarity_threshold == 0.9:
+        assert len(pairs) < len(people) * len(others) / 2  # and actually leaves people out
+
+
+def test_earlier_pairs(random_people):
+    people = random_people(13, 150)
+    matrix = NGramMatrix(memory_budget=2 ** 16)
+    vectors = matrix.encode(people)
+    pairs = set(matrix.pairs(vectors, vectors, earlier_only=True))
+    assert all(j < i for i, j in pairs)
+    assert {(i, j) for i, j in matrix.pairs(vectors, vectors) if j < i} == pairs
+    assert {(i, j) for i, a in enumerate(people) for j, b in enumerate(people[:i]) if a.similar(b)} <= pairs
+
+
+def test_pairs_agree_with_ngram_index(random_people):
+    # the counts of hashed n-grams are never below those of the n-grams themselves
+    people = random_people(14, 150)
+    index = NGramIndex()
+    for person in people:
+        index.add(person)
+    matrix = NGramMatrix(dimensions=1 << 16)
+    vectors = matrix.encode(people)
+    pairs = set(matrix.pairs(vectors, vectors))
+    shortlisted = {(i, people.index(other)) for i, person in enumerate(people) for other in index.candidates(person)}
+    assert {pair for pair in shortlisted if people[pair[0]].similar(people[pair[1]])} <= pairs
@@ -0,0 +1,130 @@
+import sqlite3
+
+import pytest
+
+from admittance import LimitedTimeslot, OpeningAdmittance, read_entry
+from form_data import Person
+from people_store import PeopleStore
+
+_first = "10:00-11:00"
+_second = "11:00-12:00"
+
+
+def _registrations(*people):
+    return [
+        read_entry(f"18/08/2022 18:04:{i:02}", f"{name.replace(' ', '')}@gmail.com", name, ", ".join(timeslots))
+        for i, (name, timeslots) in enumerate(people)
+    ]
+
+
+def _opening(store, name):
+    admittance = OpeningAdmittance({_first: LimitedTimeslot(1), _second: LimitedTimeslot(2)}, people_store=store,
+                                   opening=name)
+    store.prepare(admittance)
+    return admittance
+
+
+def test_import_and_prepare(tmp_path):
+    with PeopleStore(str(tmp_path / "people.db")) as store:
+        store.import_lists([Person("banned one", "banned@gmail.com")], [Person("kate mccoy", "kate@gmail.com")],
+                           [Person("early bird", "earlybird@gmail.com")])
+        admittance = OpeningAdmittance({_first: LimitedTimeslot(1), _second: LimitedTimeslot(1)})
+        store.prepare(admittance)
+        assert Person("banned one", "banned@gmail.com") in admittance.banned
+        assert admittance.confirmed_duplicates == {Person("kate mccoy", "kate@gmail.com")}
+        assert list(admittance.timeslots[_first].disallowed) == [Person("early bird", "earlybird@gmail.com")]
+        assert not list(admittance.timeslots[_second].disallowed)
+
+
+def test_write_back_across_openings(tmp_path):
+    path = str(tmp_path / "people.db")
+    with PeopleStore(path) as store:
+        first = _opening(store, "first opening")
+        first.auto_admit(_registrations(("early bird", [_first]), ("second bird", [_first, _second]),
+                                        ("late bird", [_second])))
+        assert store.openings() == ["first opening"]
+        assert store.attended() == [Person("early bird", "earlybird@gmail.com")]
+        assert store.attended("first opening", early_slots=2) == list(first.admitted)
+
+        first.ban(Person("late bird", "latebird@gmail.com"))
+        assert store.banned() == [Person("late bird", "latebird@gmail.com")]
+
+    # the next opening disallows the first timeslot to those admitted to it last time, without any lists
+    with PeopleStore(path) as store:
+        second = _opening(store, "second opening")
+        second.auto_admit(_registrations(("early bird", [_first, _second]), ("second bird", [_first]),
+                                         ("late bird", [_first])))
+        assert second.admitted == {
+            Person("early bird", "earlybird@gmail.com"): _second, Person("second bird", "secondbird@gmail.com"): _first
+        }
+        assert store.openings() == ["first opening", "second opening"]
+        assert store.attended() == [Person("second bird", "secondbird@gmail.com")]
+        # admitting again replaces the attendance recorded for the opening
+        second.cancel(Person("second bird", "secondbird@gmail.com"))
+        assert store.attended() == []
+        assert store.attended("first opening") == [Person("early bird", "earlybird@gmail.com")]
+
+    with pytest.raises(ValueError):
+        OpeningAdmittance(people_store=store)
+
+
+def test_admit_opening_again(tmp_path):
+    with PeopleStore(str(tmp_path / "people.db")) as store:
+        assert store.previous_opening() is None
+        first = _opening(store, "first opening")
+        first.auto_admit(_registrations(("early bird", [_first]), ("second bird", [_second])))
+        registrations = _registrations(("early bird", [_first, _second]), ("second bird", [_first]))
+        second = _opening(store, "second opening")
+        second.auto_admit(registrations)
+        assert store.previous_opening("second opening") == "first opening"
+        assert store.previous_opening("third opening") == store.previous_opening() == "second opening"
+
+        # admitted again, say after a crash, the opening looks at the one before it, not at what it recorded itself
+        rerun = _opening(store, "second opening")
+        assert list(rerun.timeslots[_first].disallowed) == [Person("early bird", "earlybird@gmail.com")]
+        rerun.auto_admit(registrations)
+        assert rerun.admitted == second.admitted == {
+            Person("early bird", "earlybird@gmail.com"): _second, Person("second bird", "secondbird@gmail.com"): _first
+        }
+        assert store.openings() == ["first opening", "second opening"]
+        assert list(_opening(store, "first opening").timeslots[_first].disallowed) == []
+
+
+def test_confirm_duplicates(tmp_path):
+    a, b, c, d = (Person(name, f"{name}@gmail.com") for name in "abcd")
+    with PeopleStore(str(tmp_path / "people.db")) as store:
+        store.confirm_duplicates([a, b], [c, d])
+        store.confirm_duplicates([b, c])
+        assert store.duplicate_groups() == [[a, b, c, d]]
+        assert store.confirmed_duplicates() == {a, b, c, d}
+
+
+def test_record_in_one_transaction(tmp_path, monkeypatch):
+    kate = read_entry("18/08/2022 18:04:01", "katemccoy@gmail.com", "Kate Mccoy", _first)
+    kate_again = read_entry("18/08/2022 18:04:02", "katemccoy1@gmail.com", "Kate Mccoy", f"{_first}, {_second}")
+    admittance = OpeningAdmittance({_first: LimitedTimeslot(1), _second: LimitedTimeslot(2)})
+    admittance.confirmed_duplicates = {kate_again.person}
+    admittance.auto_admit([kate, kate_again])
+    with PeopleStore(str(tmp_path / "people.db")) as store:
+        def fail(_):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(store, "_confirm_duplicates", fail)
+            with pytest.raises(sqlite3.OperationalError):
+                store.record("first opening", admittance)
+        # nothing is written if any of it fails
+        assert store.openings() == [] and store.duplicate_groups() == []
+
+        store.record("first opening", admittance)
+        assert store.attended("first opening") == [kate_again.person]
+        assert store.duplicate_groups() == [[kate_again.person, kate.person]]  # in the order they were stored
+
+
+def test_schema_version(tmp_path):
+    path = str(tmp_path / "people.db")
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA user_version = 99")
+    connection.close()
+    with pytest.raises(ValueError):
+        PeopleStore(path)
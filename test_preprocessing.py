@@ -0,0 +1,84 @@
+import random
+from time import perf_counter
+
+import pytest
+
+from admittance import OpeningAdmittance, Timeslot, read_entry
+from allocation import flow_allocation
+from benchmark import write_opening
+from preprocessing import Preprocessed, SweepResult, capacity_grid, input_key
+
+_timeslot_names = ["10:00-11:00", "11:00-12:00", "12:00-13:00"]
+
+
+@pytest.fixture(scope="module")
+def opening(tmp_path_factory):
+    return write_opening(str(tmp_path_factory.mktemp("opening")), 300, seed=4)
+
+
+def test_from_files_cached(opening, tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    preprocessed = Preprocessed.from_files(opening["registrations"], _timeslot_names, opening["banlist"],
+                                           opening["downprioritized"], None, opening["confirmed_duplicates"], cache)
+    assert preprocessed.admittance.processed and not preprocessed.admittance.admitted
+
+    monkeypatch.setattr(OpeningAdmittance, "preprocess", lambda *_: pytest.fail("preprocessed again"))
+    cached = Preprocessed.from_files(opening["registrations"], _timeslot_names, opening["banlist"],
+                                     opening["downprioritized"], None, opening["confirmed_duplicates"], cache)
+    assert cached.key == preprocessed.key
+    assert list(cached.admittance.processed.values()) == list(preprocessed.admittance.processed.values())
+    assert cached.admittance.marked == preprocessed.admittance.marked
+
+    changed = tmp_path / "banlist.csv"
+    changed.write_bytes(open(opening["banlist"], 'rb').read() + b"\n")
+    assert input_key([opening["registrations"], str(changed)]) != input_key([opening["registrations"],
+                                                                            opening["banlist"]])
+    assert input_key([opening["registrations"]], ["a"]) != input_key([opening["registrations"]], ["b"])
+
+
+@pytest.mark.parametrize("allocation", [None, flow_allocation])
+def test_sweep_matches_admit(opening, allocation):
+    preprocessed = Preprocessed.from_files(opening["registrations"], _timeslot_names, opening["banlist"],
+                                           opening["downprioritized"])
+    configurations = capacity_grid({"10:00-11:00": [0, 20, 60], "11:00-12:00": [10, 50], "12:00-13:00": [5, None]})
+    assert len(configurations) == 12
+    for result in preprocessed.sweep(configurations, allocation):
+        admittance = preprocessed.admit(result.capacities, allocation)
+        assert result.spots_taken == {name: timeslot.spots_taken for name, timeslot in admittance.timeslots.items()}
+        assert result.waiting == len(admittance.waiting_list)
+
+    with pytest.raises(ValueError):
+        preprocessed.sweep([{"10:00-11:00": 10}])
+
+
+@pytest.mark.parametrize("allocation", [None, flow_allocation])
+def test_sweep_nobody(allocation):
+    preprocessed = Preprocessed(OpeningAdmittance({name: Timeslot() for name in _timeslot_names}))
+    configurations = capacity_grid({"10:00-11:00": [0, 20], "11:00-12:00": [10], "12:00-13:00": [None]})
+    for result in preprocessed.sweep(configurations, allocation):
+        assert result.spots_taken == {name: 0 for name in _timeslot_names}
+        assert result.waiting == 0
+        admittance = preprocessed.admit(result.capacities, allocation)
+        assert not admittance.admitted and not admittance.waiting_list
+
+
+def test_sweep_result():
+    result = SweepResult({"a": 10, "b": 0, "c": None}, {"a": 5, "b": 0, "c": 7}, 3)
+    assert result.fill_rates == {"a": 0.5}
+    assert result.fill_rate == 0.5
+
+
+def test_sweep_speed():
+    rng = random.Random(0)
+    admittance = OpeningAdmittance({name: Timeslot() for name in _timeslot_names})
+    for i in range(10_000):
+        registration = read_entry(f"18/08/2022 18:{i // 3600 % 60:02}:{i // 60 % 60:02}", f"person{i}@gmail.com",
+                                  f"Person {i}", ", ".join(rng.sample(_timeslot_names, rng.randint(1, 3))))
+        admittance.processed[registration.person] = registration
+    configurations = capacity_grid({name: range(1_000, 5_000, 500) for name in _timeslot_names[:2]}
+                                   | {_timeslot_names[2]: [2_000, 3_000, 4_000]})
+    assert len(configurations) == 192
+    start = perf_counter()
+    results = Preprocessed(admittance).sweep(configurations)
+    assert perf_counter() - start < 5
+    assert all(result.waiting == 10_000 - sum(result.spots_taken.values()) for result in results)
@@ -0,0 +1,121 @@
+import asyncio
+
+from admittance import LimitedTimeslot, OpeningAdmittance
+from form_data import Person
+from loadgen import connect, percentile, run_load
+from service import AdmissionService
+
+
+def _serve(test, admittance=None):
+    async def serve():
+        service = AdmissionService(
+            admittance or OpeningAdmittance({"10:00-11:00": LimitedTimeslot(1), "11:00-12:00": LimitedTimeslot(1)})
+        )
+        server = await service.start(port=0)
+        try:
+            return await test(service, server.sockets[0].getsockname()[1])
+        finally:
+            await service.close()
+
+    return asyncio.run(serve())
+
+
+def test_decisions():
+    admittance = OpeningAdmittance({"10:00-11:00": LimitedTimeslot(1), "11:00-12:00": LimitedTimeslot(1)})
+    admittance.banned.add(Person("banned one", "banned@gmail.com"))
+
+    async def test(service, port):
+        connection = await connect(port=port)
+        try:
+            assert await connection.request("POST", "/registrations", {
+                "name": "Kate Mccoy", "email": "KateMccoy@gmail.com", "timeslots": "10:00-11:00, 11:00-12:00"
+            }) == (200, {"status": "admitted", "timeslot": "10:00-11:00", "flagged": False, "remarks": []})
+            status, decisions = await connection.request("POST", "/registrations", [
+                {"name": "Barrett Ingram", "email": "barrettingram@gmail.com", "timeslots": ["10:00-11:00"]},
+                {"name": "Banned One", "email": "banned@gmail.com", "timeslots": ["11:00-12:00"]},
+                {"name": "Kate McCoy", "email": "kate.mccoy@gmail.com", "timeslots": ["11:00-12:00"]},
+            ])
+            assert status == 200
+            # Kate registering again overwrites her first registration, giving Barrett her spot
+            assert [(decision["status"], decision["timeslot"]) for decision in decisions] == [
+                ("admitted", "10:00-11:00"), ("rejected", None), ("admitted", "11:00-12:00")
+            ]
+            assert [decision["flagged"] for decision in decisions] == [False, True, True]
+
+            assert await connection.request("GET", "/timeslots") == (200, {
+                "timeslots": {"10:00-11:00": {"spots_taken": 1, "capacity": 1},
+                              "11:00-12:00": {"spots_taken": 1, "capacity": 1}},
+                "waiting": 0, "processed": 2,
+            })
+            assert (await connection.request("POST", "/registrations", {"email": "no name"}))[0] == 400
+            assert (await connection.request("GET", "/registrations"))[0] == 405
+            assert (await connection.request("GET", "/elsewhere"))[0] == 404
+        finally:
+            connection.close()
+
+    _serve(test, admittance)
+    # registered in the order they were received
+    assert [registration.email for registration in admittance.processed.values()] == [
+        "barrettingram@gmail.com", "kate.mccoy@gmail.com"
+    ]
+
+
+def test_decisions_on_registering_again():
+    admittance = OpeningAdmittance({"10:00-11:00": LimitedTimeslot(1), "11:00-12:00": LimitedTimeslot(1)})
+    kate = {"name": "Kate Mccoy", "email": "katemccoy@gmail.com", "timeslots": ["10:00-11:00"]}
+    barrett = {"name": "Barrett Ingram", "email": "barrettingram@gmail.com", "timeslots": ["10:00-11:00"]}
+
+    async def test(service, port):
+        connection = await connect(port=port)
+        try:
+            status, decisions = await connection.request("POST", "/registrations", [
+                kate, barrett, dict(kate, email="kate.mccoy@gmail.com"), kate, barrett
+            ])
+            assert status == 200
+            # the same registrations again, exactly or written differently, get the decisions made on them first
+            assert [(decision["status"], decision["timeslot"]) for decision in decisions] == [
+                ("admitted", "10:00-11:00"), ("waiting", None), ("admitted", "10:00-11:00"),
+                ("admitted", "10:00-11:00"), ("waiting", None)
+            ]
+            assert [decision["flagged"] for decision in decisions] == [True, False, True, True, False]
+            assert (await connection.request("GET", "/timeslots"))[1]["processed"] == 2
+        finally:
+            connection.close()
+
+    _serve(test, admittance)
+    assert admittance.timeslots["10:00-11:00"].spots_taken == 1
+    assert admittance.processed_as(Person("kate mccoy", "kate.mccoy@gmail.com")) == Person("kate mccoy",
+                                                                                            "katemccoy@gmail.com")
+    assert admittance.processed_as(Person("banned one", "banned@gmail.com")) is None
+
+
+def test_body_length_checked():
+    async def request(port, content_length):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /registrations HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n".encode("latin-1"))
+        status_line = await reader.readline()
+        await reader.read()  # closed after answering
+        writer.close()
+        return int(status_line.split()[1])
+
+    async def test(service, port):
+        service.max_body = 100
+        return [await request(port, content_length) for content_length in ("101", "-1", "many", "")]
+
+    assert _serve(test) == [413, 400, 400, 400]
+
+
+def test_concurrent_load():
+    async def test(service, port):
+        return await run_load(200, connections=10, batch_size=2, read_ratio=0.5, port=port)
+
+    results = _serve(test)
+    assert results["admitted"] + results["waiting"] + results["rejected"] == 200
+    assert results["admitted"] == 2
+    assert results["post_p99_ms"] >= results["post_p50_ms"] > 0
+
+
+def test_percentile():
+    assert percentile([], 0.99) == 0.0
+    assert percentile([3.0, 1.0, 2.0], 0.5) == 2.0
+    assert percentile([float(i) for i in range(1, 101)], 0.99) == 99.0
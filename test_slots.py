@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from admittance import OpeningAdmittance, LimitedTimeslot
+from form_data import Registration
+from slots import Preferences, SlotRegistry
+
+
+def test_slot_registry():
+    registry = SlotRegistry(["10:00-11:00", "11:00-12:00"])
+    assert registry.index("12:00-13:00") == 2
+    assert registry.find("13:00-14:00") is None and len(registry) == 3
+    preferences = registry.preferences(["12:00-13:00", "10:00-11:00", "12:00-13:00"])
+    assert preferences == Preferences(0b101, (2, 0))
+    assert registry.preferences(("12:00-13:00", "10:00-11:00", "12:00-13:00")) is preferences  # parsed once
+    assert registry.names_of(preferences.mask) == ["10:00-11:00", "12:00-13:00"]
+    assert registry.preferences(["11:00-12:00", "10:00-11:00"]).mask == \
+           registry.preferences(["10:00-11:00", "11:00-12:00"]).mask
+
+
+def test_unknown_timeslots_not_indexed():
+    registry = SlotRegistry(["10:00-11:00"])
+    assert registry.preferences(["13:00-14:00", "10:00-11:00"]) == Preferences(0b1, (0,))
+    assert len(registry) == 1
+    registry.index("13:00-14:00")  # parsed again now that it has an index
+    assert registry.preferences(["13:00-14:00", "10:00-11:00"]) == Preferences(0b11, (1, 0))
+
+
+def test_admittance_slots_bounded():
+    admittance = OpeningAdmittance({"10:00-11:00": LimitedTimeslot(1), "11:00-12:00": LimitedTimeslot(1)})
+    admittance.auto_admit([
+        Registration(f"person {i}", f"person{i}@gmail.com", datetime(2022, 8, 18, 18, i),
+                     [f"made up {i}", "11:00-12:00"])
+        for i in range(50)
+    ])
+    assert admittance.slots.names == ["10:00-11:00", "11:00-12:00"]
+    assert admittance.timeslot_of(Registration("person 0", "person0@gmail.com", None, [])) == "11:00-12:00"
+    assert OpeningAdmittance().slots.names == []  # every admittance has its own
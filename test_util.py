@@ -0,0 +1,92 @@
+import zipfile
+from datetime import datetime
+
+import openpyxl as xl
+import pytest
+
+from admittance import read_people_table, read_registrations, sorted_registrations
+from form_data import Person, Registration
+from util import TableSchema, read_csv, read_table
+
+_headers = ["Timestamp", "Email Address", "Name", "Timeslots"]
+_rows = [
+    ["18/08/2022 18:04:41", "BarrettIngram@gmail.com", " Barrett Ingram", "a, b"],
+    ["18/08/2022 18:04:40", "katemccoy@gmail.com", "Kate Mccoy", "b"],
+]
+_expected = [
+    Registration("barrett ingram", "barrettingram@gmail.com", datetime(2022, 8, 18, 18, 4, 41), ["a", "b"]),
+    Registration("kate mccoy", "katemccoy@gmail.com", datetime(2022, 8, 18, 18, 4, 40), ["b"]),
+]
+
+
+def _write_ods(file_path, rows):
+    # the least of an OpenDocument spreadsheet, with the repeated and trailing empty cells and rows spreadsheets write
+    def cell(value):
+        if isinstance(value, datetime):
+            return f'<table:table-cell office:value-type="date" office:date-value="{value.isoformat()}"/>'
+        return f'<table:table-cell office:value-type="string"><text:p>{value}</text:p></table:table-cell>'
+
+    table_rows = "".join(
+        f"<table:table-row>{''.join(map(cell, row))}"
+        f'<table:table-cell table:number-columns-repeated="1020"/></table:table-row>'
+        for row in rows
+    )
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:spreadsheet>'
+        f'<table:table table:name="Form responses 1">{table_rows}'
+        '<table:table-row table:number-rows-repeated="1048000"><table:table-cell/></table:table-row></table:table>'
+        '<table:table table:name="Other"><table:table-row><table:table-cell office:value-type="string">'
+        '<text:p>not read</text:p></table:table-cell></table:table-row></table:table>'
+        '</office:spreadsheet></office:body></office:document-content>'
+    )
+    with zipfile.ZipFile(file_path, 'w') as spreadsheet:
+        spreadsheet.writestr("mimetype", "application/vnd.oasis.opendocument.spreadsheet")
+        spreadsheet.writestr("content.xml", content)
+
+
+@pytest.mark.parametrize("file_format", ["csv", "xlsx", "ods"])
+def test_read_registrations(tmp_path, file_format):
+    file_path = str(tmp_path / f"registrations.{file_format}")
+    rows = [_headers, *_rows, []]
+    if file_format == "csv":
+        with open(file_path, 'w', encoding="utf-8") as file:
+            file.write("".join(",".join(f'"{value}"' for value in row) + "\n" for row in rows))
+    else:
+        # spreadsheets have their timestamps as dates
+        rows[1] = [datetime(2022, 8, 18, 18, 4, 41), *rows[1][1:]]
+        if file_format == "xlsx":
+            workbook = xl.Workbook()
+            for row in rows:
+                workbook.active.append(row)
+            workbook.save(file_path)
+        else:
+            _write_ods(file_path, rows)
+
+    registrations = read_registrations(file_path)
+    assert registrations == _expected
+    assert [(registration.timestamp, registration.timeslots) for registration in registrations] == [
+        (registration.timestamp, registration.timeslots) for registration in _expected
+    ]
+    assert [registration.timestamp for registration in sorted_registrations(file_path)] == [
+        datetime(2022, 8, 18, 18, 4, 40), datetime(2022, 8, 18, 18, 4, 41)
+    ]
+    assert read_people_table(file_path, name_column="Name", email_column=1) == [
+        Person("barrett ingram", "barrettingram@gmail.com"), Person("kate mccoy", "katemccoy@gmail.com")
+    ]
+
+
+def test_table_schema(tmp_path):
+    file_path = tmp_path / "people.csv"
+    file_path.write_text("email,name,,ignored\nA@b.c,Some One,x,y\nD@e.f\n", encoding="utf-8")
+    assert read_csv(dict, str(file_path), {"name": "name", "email": 0}) == [
+        {"name": "Some One", "email": "A@b.c"}, {"name": "", "email": "D@e.f"}
+    ]
+    schema = TableSchema(Person, {"name": 1, "email": "email"}, {"email": str.lower})
+    assert list(read_table(str(file_path), schema)) == [Person("Some One", "a@b.c"), Person("", "d@e.f")]
+
+    for columns in ({"name": 2}, {"name": "ignored"}, {"name": "missing"}, {"not a name": 0}):
+        with pytest.raises(ValueError):
+            read_csv(dict, str(file_path), columns)
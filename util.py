@@ -1,28 +1,101 @@
 import csv
-from typing import List, Dict, Any, TypeVar, Type
-
-from form_data import Person
+import os.path
+from typing import List, Dict, Any, TypeVar, Type, Callable, Iterator, Optional, Sequence, Union
 
 T = TypeVar('T')
 
+Column = Union[str, int]  # a header, or the index of a column
+
+
+class TableSchema:
+    """
+    How the rows of a table are read into entries: the column each argument of `entry_type` is read from, by header or
+    index, and the converter its value is passed through first, if any. Compiled once for the headers of a table into
+    a function reading its rows, see `compile`
+    """
+    entry_type: Callable[..., Any]
+    columns: Dict[str, Column]
+    converters: Dict[str, Callable[[Any], Any]]
 
-def read_csv(entry_type: Type[T], file_path: str, table_specification: Dict[str, int]) -> List[T]:
-    with open(file_path, encoding="utf-8") as registration_file:
-        table_reader = csv.reader(registration_file)
-        headers = next(table_reader)
+    def __init__(self, entry_type: Callable[..., T], columns: Dict[str, Column],
+                 converters: Optional[Dict[str, Callable[[Any], Any]]] = None):
+        self.entry_type = entry_type
+        self.columns = columns
+        self.converters = converters if converters else {}
 
-        # find index of first empty header
+    def compile(self, headers: Sequence[Any]) -> Callable[[Sequence[Any]], T]:
+        """
+        :param headers: the first row of the table, the columns after the first without a header are not read
+        :return: a function reading an entry from a row of the table
+        :raises ValueError: if a column is not among the headers
+        """
+        headers = ['' if header is None else str(header).strip() for header in headers]
         try:
             first_empty_header = headers.index('')
         except ValueError:
             first_empty_header = len(headers)
 
-        for out_of_bounds, key, index in ((i >= first_empty_header, k, i) for k, i in table_specification.items()):
-            if out_of_bounds:
-                raise ValueError(f"table specification has a column index that is out of bounds: {key}: {index}")
+        indices = []
+        for key, column in self.columns.items():
+            if not key.isidentifier():
+                raise ValueError(f"table specification has a key that is not an argument name: {key!r}")
+            if isinstance(column, str):
+                if column not in headers[:first_empty_header]:
+                    raise ValueError(f"table specification has a header that is not in the table: {key}: {column!r}")
+                column = headers.index(column)
+            elif column >= first_empty_header:
+                raise ValueError(f"table specification has a column index that is out of bounds: {key}: {column}")
+            indices.append(column)
+
+        fields = [(key, index, self.converters.get(key)) for key, index in zip(self.columns, indices)]
+        entry_type = self.entry_type
+        width = max(indices, default=-1) + 1
+
+        def read_row(row: Sequence[Any]) -> T:
+            if len(row) < width:  # spreadsheets leave out the empty cells ending a row
+                row = [*row, *[''] * (width - len(row))]
+            arguments = {}
+            for key, index, converter in fields:
+                arguments[key] = row[index] if converter is None else converter(row[index])
+            return entry_type(**arguments)
+
+        return read_row
+
+
+def iter_rows(file_path: str) -> Iterator[Sequence[Any]]:
+    """
+    The rows of a table, one at a time: a csv file, or the first sheet of an xlsx, ods or xls spreadsheet by the
+    extension of the file. Values of csv files are strings, spreadsheets may also give numbers and datetimes
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        from excel import iter_xlsx_rows
+        return iter_xlsx_rows(file_path)
+    if extension == ".ods":
+        from excel import iter_ods_rows
+        return iter_ods_rows(file_path)
+    if extension == ".xls":
+        from excel import iter_xls_rows
+        return iter_xls_rows(file_path)
+    return _iter_csv_rows(file_path)
+
+
+def _iter_csv_rows(file_path: str) -> Iterator[List[str]]:
+    with open(file_path, encoding="utf-8", newline='') as table_file:
+        yield from csv.reader(table_file)
 
-        return [entry_type(**{k: row[v] for k, v in table_specification.items()}) for row in table_reader]
 
+def read_table(file_path: str, schema: TableSchema) -> Iterator[Any]:
+    """
+    Reads the entries of a table one at a time, in the order they are in the file. The first row holds the headers,
+    empty rows are skipped
+    """
+    rows = iter_rows(file_path)
+    read_row = schema.compile(next(rows, []))
+    for row in rows:
+        if row:
+            yield read_row(row)
 
-        # return [read_entry(*row) for row in reader]
 
+def read_csv(entry_type: Type[T], file_path: str, table_specification: Dict[str, Column]) -> List[T]:
+    return list(read_table(file_path, TableSchema(entry_type, table_specification)))